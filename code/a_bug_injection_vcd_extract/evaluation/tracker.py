@@ -3,6 +3,7 @@ from typing import Optional
 import pandas as pd
 from datetime import datetime
 import os
+import glob
 
 @dataclass
 class MutationRecord:
@@ -43,4 +44,19 @@ class MutationLogger:
     def save_to_csv(self):
         df = self.to_dataframe()
         print('Saving mutation data')
-        df.to_csv(self.log_path, index=False)
\ No newline at end of file
+        df.to_csv(self.log_path, index=False)
+
+    def get_worker_log_path(self, worker_index) -> str:
+        """Return the log path of a worker process, which cannot share this file."""
+        return self.log_path.replace('.csv', f'_worker_{worker_index}.csv')
+
+    def merge_worker_logs(self):
+        """Append the mutations of every worker log to this log, then remove the worker logs."""
+        for worker_log_path in sorted(glob.glob(self.get_worker_log_path('*'))):
+            try:
+                worker_df = pd.read_csv(worker_log_path)
+            except pd.errors.EmptyDataError:
+                worker_df = pd.DataFrame()
+            self.mutations.extend(worker_df.to_dict('records'))
+            os.remove(worker_log_path)
+        self.save_to_csv()
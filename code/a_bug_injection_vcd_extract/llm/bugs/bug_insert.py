@@ -1,6 +1,7 @@
 from vcd_extract.llm.models import LLMModel
 from vcd_extract.llm.parsing.verilog import Verilog, VerilogPartition
 from vcd_extract.llm.parsing.cache import *
+from vcd_extract.llm.parsing.partition_store import PartitionStore
 from vcd_extract.llm.parsing.encoding import extract_llm_output
 from vcd_extract.visualization.server import PipelineWebSocket
 import vcd_extract.visualization.types as wstypes
@@ -26,7 +27,8 @@ class BugInserter:
                  ws_server: PipelineWebSocket=None, 
                  debug=False, 
                  clear_cache=True,
-                 mutation_log_path='mutation_log.csv'):
+                 mutation_log_path='mutation_log.csv',
+                 partition_store: PartitionStore=None):
         super().__init__()
         self.debug = debug
         self.prompt_dir = prompt_dir
@@ -44,6 +46,8 @@ class BugInserter:
         self.ws_server = ws_server
         self.verilog_cache : VerilogCache = None
         self.clear_cache = clear_cache
+        # Partitions shared across workers and runs, not cleared with the cache
+        self.partition_store = partition_store
 
         self.logger = MutationLogger(mutation_log_path)        
     
@@ -115,17 +119,45 @@ class BugInserter:
             self.partition = self.verilog_cache.extract_regions(full_verilog)
             self.debug_log(f'Loaded verilog cache from {cache_file_path}')
         else:
-            self.partition = self.module_splitter.split_verilog(full_verilog, regions=rois)
+            self.partition = self.split_verilog(full_verilog, rois)
             self.verilog_cache = VerilogCache(partition=self.partition)
         
         self.debug_log(self.stringify_regions())
         self.bugs_per_region = [0 for _ in range(len(self.partition))]
         self.num_regions = len(self.partition)
+        # Undo history of this file only, region indices of another partition do not apply
+        self.prev_mut_region = []
+        # Times each region was rolled back or gave no valid mutation
+        self.region_rollbacks = [0 for _ in range(len(self.partition))]
         self.num_attempts = 0
 
         self.ws_update_stats()
         self.ws_send_regions()
     
+    def split_verilog(self, full_verilog : Verilog, rois: list[tuple[int, int]] = None) -> VerilogPartition:
+        if self.partition_store is None:
+            return self.module_splitter.split_verilog(full_verilog, regions=rois)
+
+        def split() -> list[dict]:
+            partition = self.module_splitter.split_verilog(full_verilog, regions=rois)
+            return [
+                {
+                    "start_line": region.start_line,
+                    "end_line": region.end_line,
+                    "description": region.description,
+                }
+                for region in partition
+            ]
+
+        key = PartitionStore.make_key(full_verilog.get_content(), self.module_splitter.get_version(), rois)
+        regions, is_stored = self.partition_store.get_or_create(key, split)
+        self.debug_log(f'{"Loaded" if is_stored else "Stored"} partition {key[:12]} of {full_verilog.name}')
+
+        partition = VerilogPartition(full_verilog)
+        for region in regions:
+            partition.add_region(region["start_line"], region["end_line"], region["description"])
+        return partition
+
     def llm_select_region(self) -> int:
         if self.ws_server:
             self.ws_server.set_current_process('Select Region')
@@ -140,6 +172,7 @@ class BugInserter:
                 'region_length': self.partition[i].num_lines,
                 'num_mutations_attempted': len(all_region_changes),
                 'num_mutations_successful': len(successful_region_changes), 
+                'num_rollbacks': self.region_rollbacks[i],
             })
         
         prompt_file = os.path.join(self.prompt_dir, 'insertion', 'region_selection_prompt.txt')
@@ -149,7 +182,7 @@ class BugInserter:
                 .replace('{ALLOWED_MUTATIONS}', self.allowed_mutations.stringify()) \
                 .replace('{REGION_SELECTION_HISTORY}', json.dumps(selection_history, indent=4))
         
-        llm_output = self.llm_model.call('You are a verification engineer', prompt, RegionSelection)
+        llm_output = self.llm_model.call('You are a verification engineer', prompt, RegionSelection, use_cache=False)
         log_llm(f'bug_{self.num_attempts+1}', '1_select_region', prompt, llm_output)
 
         region_idx = llm_output['region_idx']
@@ -190,6 +223,7 @@ class BugInserter:
                 ws_server=self.ws_server)
 
             if change is None:
+                self.region_rollbacks[region_idx] += 1
                 continue
 
             t1 = time.time()
@@ -229,6 +263,91 @@ class BugInserter:
 
             return full_verilog_content, mutation_desc
 
+    def insert_bugs_batch(self, num_bugs : int, out_file : str = '', mut_recs: list[MutationRecord] = None, max_selections : int = 10) -> tuple[str, list[str]]:
+        """
+        Insert num_bugs bugs with one region selection and one batched mutation
+        request per region, rather than three requests per bug. Regions are
+        selected again until enough valid mutations were applied, at most
+        max_selections times: fewer bugs are inserted if the regions keep
+        giving no valid mutation, and none raises a RuntimeError. Each bug can
+        be undone with undo_mutation, as with insert_bug.
+        """
+        self.ws_send_regions()
+        self.ws_update_stats()
+
+        t0 = time.time()
+
+        changes = []
+        mutation_descs = []
+        num_selections = 0
+        while len(changes) < num_bugs:
+            if num_selections >= max_selections:
+                print(f'Inserted {len(changes)}/{num_bugs} bugs, no valid mutation after {max_selections} region selections')
+                break
+            num_selections += 1
+            region_idx = self.llm_select_region()
+
+            self.debug_log(f'Inserting {num_bugs - len(changes)} bugs into region {region_idx}')
+            region = self.partition[region_idx]
+            region_start_str = region.get_content()
+
+            region_changes = self.region_mutator.mutate_batch(
+                region_idx=region_idx,
+                region=region,
+                cache=self.verilog_cache,
+                num_mutations=num_bugs - len(changes),
+                bug_num=self.num_attempts + 1,
+                ws_server=self.ws_server)
+
+            # Every bug of the batch counts as an attempt, so that bug numbers stay unique
+            self.num_attempts += max(1, len(region_changes))
+
+            if len(region_changes) == 0:
+                # Shown in the selection history so that the next selection can avoid the region
+                self.region_rollbacks[region_idx] += 1
+                continue
+
+            t1 = time.time()
+
+            for change in region_changes:
+                mutation_desc = change.stringify()
+                self.debug_log(f'Mutation description: {mutation_desc}')
+                mutation_descs.append(mutation_desc)
+
+            self.verilog_cache.add_changes(region_changes)
+            self.prev_mut_region.extend([region_idx] * len(region_changes))
+
+            region_mut_str = region.get_content()
+            logging.print_diff(region_start_str, region_mut_str)
+
+            # Log mutations, the generation time of a request is shared by its bugs
+            if mut_recs:
+                gen_time_ms = (t1 - t0) * 1000 / len(region_changes)
+                for change, mut_rec in zip(region_changes, mut_recs[len(changes):]):
+                    mut_rec.mutation_class = change.bug_type
+                    mut_rec.line_number = change.line_idx
+                    mut_rec.original_line = change.old_line
+                    mut_rec.mutated_line = change.new_line
+
+                    mut_rec.generation_time_ms += gen_time_ms
+                    if mut_rec.num_retries > 0:
+                        mut_rec.rollback_time_ms += gen_time_ms
+
+            changes.extend(region_changes)
+            t0 = time.time()
+
+        if len(changes) == 0:
+            raise RuntimeError(f'No valid mutation in {max_selections} region selections')
+
+        full_verilog_content = self.partition.get_full_verilog_content()
+
+        if out_file:
+            with open(out_file, 'w') as out_writer:
+                out_writer.write(full_verilog_content)
+            return '', mutation_descs
+
+        return full_verilog_content, mutation_descs
+
     def undo_mutation(self):
         if len(self.prev_mut_region) == 0:
             self.debug_log('No mutations to undo')
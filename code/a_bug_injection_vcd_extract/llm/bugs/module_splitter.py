@@ -1,10 +1,17 @@
-from vcd_extract.llm.models import LLMModel
+from vcd_extract.llm.models import LLMModel, call_all
 from vcd_extract.llm.parsing.encoding import ModuleDivisionEncoder
 from vcd_extract.llm.parsing.verilog import Verilog, VerilogPartition
 from .mutation import load_mutations
 from pydantic import BaseModel
 import re
 import os.path
+import json
+import hashlib
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 
 class LModuleRegion(BaseModel):
     start_line: int
@@ -21,7 +28,23 @@ class LRegionDescription(BaseModel):
 class LRegionDescriptionList(BaseModel):
     descriptions: list[LRegionDescription]
 
+def get_tokenizer(model_id : str):
+    """Return the tiktoken encoding of the model, None when tiktoken or its encoding files are unavailable."""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_id)
+        except KeyError:
+            # Unknown to tiktoken (e.g. the mock model), count with the GPT-4o encoding
+            return tiktoken.get_encoding('o200k_base')
+    except Exception as e:
+        # The encoding files are downloaded on first use, which fails offline
+        print(f'Cannot load the tokenizer of {model_id}, estimating token counts: {e}')
+        return None
+
 class ModuleSplitter:
+    # Token estimate when tiktoken is not installed
     AVG_TOKENS_PER_WORD = 3
 
     def __init__(self, llm_model : LLMModel, prompt_dir : str, debug=False):
@@ -30,6 +53,7 @@ class ModuleSplitter:
         self.debug = debug
         self.encoder = ModuleDivisionEncoder()
         self.allowed_mutations = load_mutations(os.path.join(prompt_dir, 'mutations'))
+        self.tokenizer = get_tokenizer(llm_model.model_id)
         self.initialize(prompt_dir)
     
     def debug_log(self, *args):
@@ -47,12 +71,20 @@ class ModuleSplitter:
         label_prompt_file = os.path.join(prompt_dir, 'label_regions_prompt.txt')
         with open(label_prompt_file, 'r') as f:
             self.label_prompt = f.read().strip()
+
+    def get_version(self) -> str:
+        """Hash of what the split depends on besides the file: the model, the prompts and the mutation classes."""
+        version = json.dumps([self.llm_model.model_id, self.division_prompt, self.label_prompt,
+                              self.allowed_mutations.stringify()])
+        return hashlib.sha256(version.encode('utf-8')).hexdigest()
     
-    def llm_split_module(self, verilog_chunk : str) -> LModuleSplit:
+    def split_module_request(self, verilog_chunk : str) -> tuple:
         chunk_prompt = self.division_prompt \
             .replace('{VERILOG_CHUNK}', verilog_chunk)
-        
-        llm_output = self.llm_model.call("You are a verilog file splitter", chunk_prompt, LModuleSplit)
+        return ("You are a verilog file splitter", chunk_prompt, LModuleSplit)
+
+    def llm_split_module(self, verilog_chunk : str) -> LModuleSplit:
+        llm_output = self.llm_model.call(*self.split_module_request(verilog_chunk))
         return LModuleSplit(**llm_output)
     
     def llm_label_regions(self, partition: VerilogPartition):
@@ -72,28 +104,57 @@ class ModuleSplitter:
             partition[i].set_description(
                 f'- Summary: {description.summary} \n- Applicable Mutations: {description.mutation_classes or "None"}')
     
+    def count_tokens(self, text : str) -> int:
+        if self.tokenizer is None:
+            return int(len(re.findall(r'\S+', text)) * self.AVG_TOKENS_PER_WORD)
+        return len(self.tokenizer.encode(text, disallowed_special=()))
+
     def split_into_chunks(self, full_verilog : Verilog, max_tokens: int) -> list[Verilog]:
+        """Split the file into consecutive, non-overlapping chunks of at most max_tokens lineated tokens."""
+        if full_verilog.num_lines == 0:
+            return []
+
         current_token_count = 0
+        chunk_start = full_verilog.start_line
         chunks = []
         
         for line_num in range(full_verilog.start_line, full_verilog.end_line+1):
-            line = full_verilog.get_line(line_num)
-            line_token_estimate = int(len(re.findall(r'\S+', line)) * self.AVG_TOKENS_PER_WORD)
+            # Counted as sent, with the line number token
+            line_token_count = self.count_tokens(full_verilog.get_line(line_num, lineate=True) + '\n')
             
-            if current_token_count + line_token_estimate > max_tokens or line_num == full_verilog.end_line:
-                chunks.append(full_verilog.slice(slice_end=line_num))
-                current_token_count = line_token_estimate
-            else:
-                current_token_count += line_token_estimate
+            if current_token_count + line_token_count > max_tokens and line_num > chunk_start:
+                chunks.append(full_verilog.slice(chunk_start, line_num - 1))
+                chunk_start = line_num
+                current_token_count = 0
+            current_token_count += line_token_count
 
+        chunks.append(full_verilog.slice(chunk_start, full_verilog.end_line))
         return chunks
 
+    def get_chunk_content(self,
+                          full_verilog : Verilog,
+                          chunk : Verilog,
+                          is_first : bool,
+                          is_last : bool,
+                          extra_lines : int,
+                          overlap_lines : int) -> str:
+        """
+        Lineated chunk prompt: the chunk, preceded by overlap_lines of the
+        previous chunk, so that a region left out at the end of the previous
+        chunk is split here, and followed by extra_lines of the next chunk.
+        """
+        start_line = chunk.start_line if is_first else max(full_verilog.start_line, chunk.start_line - overlap_lines)
+        end_line = chunk.end_line if is_last else min(full_verilog.end_line, chunk.end_line + extra_lines)
+        return full_verilog.slice(start_line, end_line).get_content(
+            lineate=True, extra_lines=end_line - chunk.end_line, include_eof=is_last, leading_extra_lines=0)
+
     def split_verilog(
         self,
         full_verilog: Verilog,
         regions: list[tuple[int, int]] = None,
         max_tokens=48000,
         extra_lines=10,
+        overlap_lines=40,
     ) -> VerilogPartition:
         partition = VerilogPartition(full_verilog)
 
@@ -101,14 +162,31 @@ class ModuleSplitter:
             chunks = self.split_into_chunks(full_verilog, max_tokens)
             self.debug_log(f'-- Split into {len(chunks)} chunks')
 
-            for i, chunk in enumerate(chunks):
-                self.debug_log(f'---- Parsing Chunk {i+1} / {len(chunks)}')
-                llm_output = self.llm_split_module(chunk.get_content(
-                    lineate=True, extra_lines=extra_lines, include_eof=i == len(chunks)-1
+            # The chunks are independent, an AsyncLLM splits them concurrently
+            requests = [
+                self.split_module_request(self.get_chunk_content(
+                    full_verilog, chunk, i == 0, i == len(chunks)-1, extra_lines, overlap_lines
                 ))
-                region_specs = llm_output.split
+                for i, chunk in enumerate(chunks)
+            ]
+            llm_outputs = call_all(self.llm_model, requests)
+
+            # Regions of the overlap already split by the previous chunk are skipped or trimmed
+            last_end_line = full_verilog.start_line - 1
+            for i, llm_output in enumerate(llm_outputs):
+                self.debug_log(f'---- Parsed Chunk {i+1} / {len(chunks)}')
+                region_specs = sorted(LModuleSplit(**llm_output).split, key=lambda region_spec: region_spec.start_line)
+                is_first_region = i > 0
                 for region_spec in region_specs:
-                    partition.add_region(region_spec.start_line, region_spec.end_line, region_spec.region_description)
+                    start_line, end_line = region_spec.start_line, min(region_spec.end_line, full_verilog.end_line)
+                    if end_line <= last_end_line:
+                        continue
+                    if start_line <= last_end_line or is_first_region:
+                        # The first region of a chunk also takes the lines left out at the end of the previous one
+                        start_line = last_end_line + 1
+                    partition.add_region(start_line, end_line, region_spec.region_description)
+                    last_end_line = end_line
+                    is_first_region = False
             
         else:
             for region_spec in regions:
@@ -22,6 +22,17 @@ class LineMutation(BaseModel):
     mutated: str
     summary: str
 
+class MutationCandidate(BaseModel):
+    justification: str
+    line: int
+    mutation: str
+    mutated: str
+    summary: str
+
+class MutationBatch(BaseModel):
+    rollback: bool
+    candidates: list[MutationCandidate]
+
 def even_subset(lst, k):
     if k <= 0:
         return []
@@ -54,12 +65,17 @@ class RegionMutator:
         selection_prompt_file = os.path.join(prompt_dir, 'insertion', 'mutation_selection_prompt.txt')
         insertion_prompt_file = os.path.join(prompt_dir, 'insertion', 'mutation_insertion_prompt.txt')
         insertion_dep_prompt_file = os.path.join(prompt_dir, 'insertion', 'mutation_insertion_prompt_dependent.txt')
+        batch_prompt_file = os.path.join(prompt_dir, 'insertion', 'mutation_batch_prompt.txt')
         with open(selection_prompt_file, 'r') as sf:
             self.sel_prompt = sf.read().strip()
         with open(insertion_prompt_file, 'r') as mf:
             self.ins_iso_prompt = mf.read().strip()
         with open(insertion_dep_prompt_file, 'r') as mf:
             self.ins_dep_prompt = mf.read().strip()
+        with open(batch_prompt_file, 'r') as bf:
+            self.batch_prompt = bf.read().strip()
+        self.mutation_instructions = '\n'.join(
+            f'#### {mutation.name}\n{mutation.get_instructions().strip()}\n' for mutation in self.allowed_mutations)
     
     def llm_select_mutation(self, 
                             verilog_region : Verilog, 
@@ -74,7 +90,9 @@ class RegionMutator:
             .replace('{PREVIOUS_BUGS_FAILED}', '\n\n'.join(previous_bugs_failed)) \
             .replace('{VERILOG_REGION}', verilog_region.get_content(lineate=True))
         
-        llm_response = self.llm_model.call("You are a verilog bug inserter", prompt, output_schema=MutationSelection)
+        # Sampled, a retry after a rollback must not get the cached answer back
+        llm_response = self.llm_model.call("You are a verilog bug inserter", prompt, output_schema=MutationSelection,
+                                           use_cache=False)
         log_llm(f'bug_{self.bug_num}', '2_select_mutation', prompt, llm_response)
 
         return MutationSelection(**llm_response)
@@ -108,7 +126,8 @@ class RegionMutator:
                 .replace('{PREVIOUS_BUGS_SUCCESS}', '\n\n'.join(previous_bugs_success)) \
                 .replace('{PREVIOUS_BUGS_FAILED}', '\n\n'.join(previous_bugs_failed))
         
-        llm_response = self.llm_model.call("You are a verilog bug inserter", prompt, output_schema=LineMutation)
+        llm_response = self.llm_model.call("You are a verilog bug inserter", prompt, output_schema=LineMutation,
+                                           use_cache=False)
         log_llm(f'bug_{self.bug_num}', '3_mutate_line', prompt, llm_response)
 
         return LineMutation(**llm_response)
@@ -165,3 +184,99 @@ class RegionMutator:
         change = region.apply_change(line_num, mutated_line, mutation_type, mutation_summary,
                                      comment=f'BUG_{bug_num}: Inserted {mutation_type} bug')
         return change
+
+    def llm_mutate_batch(self,
+                         verilog_region : Verilog,
+                         region_bugs : list[VerilogChange],
+                         num_mutations : int) -> MutationBatch:
+        previous_bugs_success = even_subset([bug.stringify() for bug in region_bugs if bug.valid], 6)
+        previous_bugs_failed = even_subset([bug.stringify() for bug in region_bugs if not bug.valid], 6)
+
+        prompt = self.batch_prompt \
+            .replace('{NUM_MUTATIONS}', str(num_mutations)) \
+            .replace('{ALLOWED_MUTATIONS}', self.allowed_mutations.stringify()) \
+            .replace('{MUTATION_INSTRUCTIONS}', self.mutation_instructions) \
+            .replace('{PREVIOUS_BUGS_SUCCESS}', '\n\n'.join(previous_bugs_success)) \
+            .replace('{PREVIOUS_BUGS_FAILED}', '\n\n'.join(previous_bugs_failed)) \
+            .replace('{VERILOG_REGION}', verilog_region.get_content(lineate=True))
+
+        llm_response = self.llm_model.call("You are a verilog bug inserter", prompt, output_schema=MutationBatch,
+                                           use_cache=False)
+        log_llm(f'bug_{self.bug_num}', '2_mutate_batch', prompt, llm_response)
+
+        return MutationBatch(**llm_response)
+
+    def validate_candidate(self,
+                           region : Verilog,
+                           candidate : MutationCandidate,
+                           region_bugs : list[VerilogChange],
+                           taken_lines : set[int]) -> str:
+        """Return why a batched candidate cannot be applied, an empty string if it can."""
+        if candidate.line < region.start_line or candidate.line > region.end_line:
+            return f'line {candidate.line} is outside of the region ({region.start_line}-{region.end_line})'
+        if candidate.line in taken_lines:
+            return f'line {candidate.line} is already mutated'
+        if self.allowed_mutations.find_by_name(candidate.mutation.strip()) is None:
+            return f'unknown mutation {candidate.mutation}'
+        mutated_line = candidate.mutated.strip()
+        if len(mutated_line) == 0 or '\n' in mutated_line:
+            return 'the mutated line is empty or spans several lines'
+        old_line = region.get_line(candidate.line)
+        if mutated_line == old_line.strip():
+            return 'the mutated line is unchanged'
+        for bug in region_bugs:
+            if not bug.valid and bug.line_idx == candidate.line and bug.old_line == old_line and \
+               bug.new_line.split('//')[0].strip() == mutated_line.split('//')[0].strip():
+                return f'the same mutation of line {candidate.line} already failed'
+        return ''
+
+    def mutate_batch(self,
+                     region_idx: int,
+                     region: Verilog,
+                     cache: VerilogCache,
+                     num_mutations: int,
+                     bug_num: int = 0,
+                     ws_server: PipelineWebSocket=None) -> list[VerilogChange]:
+        """
+        Insert up to num_mutations bugs on distinct lines of the region with a
+        single request, instead of a mutation selection and a line mutation per
+        bug. Candidates are validated against the region's history before they
+        are applied, the invalid ones are dropped.
+        """
+        self.bug_num = bug_num
+
+        if ws_server:
+            ws_server.set_current_process('Mutate Line')
+
+        region_bugs = cache.get_changes_in_region(region_idx, show_invalid=True)
+        batch_output = self.llm_mutate_batch(region, region_bugs, num_mutations)
+        if batch_output.rollback:
+            self.debug_log('Cannot apply mutation in given region. Rolling back...')
+            return []
+
+        # Lines holding a valid bug are not mutated again
+        taken_lines = set(bug.line_idx for bug in region_bugs if bug.valid)
+        changes = []
+        for candidate in batch_output.candidates:
+            if len(changes) == num_mutations:
+                break
+            reason = self.validate_candidate(region, candidate, region_bugs, taken_lines)
+            if reason:
+                self.debug_log(f'Dropped {candidate.mutation} in Line {candidate.line}: {reason}')
+                continue
+            mutation_type = candidate.mutation.strip()
+            self.debug_log(f'Selected mutation {mutation_type} in Line {candidate.line}: {candidate.justification}')
+            if ws_server:
+                ws_server.mutate_line(
+                    mutated_line=wstypes.VerilogLine(
+                        lineNumber=candidate.line,
+                        before=region.get_line(candidate.line),
+                        after=candidate.mutated,
+                        justification=candidate.summary,
+                    )
+                )
+            change = region.apply_change(candidate.line, candidate.mutated, mutation_type, candidate.summary,
+                                         comment=f'BUG_{bug_num + len(changes)}: Inserted {mutation_type} bug')
+            taken_lines.add(candidate.line)
+            changes.append(change)
+        return changes
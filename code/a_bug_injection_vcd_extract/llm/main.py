@@ -34,6 +34,9 @@ def main():
         "gpt": [
             "gpt-4o-mini",
             "gpt-3.5-turbo",
+        ],
+        "mock": [
+            "mock",
         ]
     }
     
@@ -55,7 +58,10 @@ def main():
     else:
         model_size = args.size
     
-    gpt = GPT(model_id=model_size)
+    if model_name == "mock":
+        gpt = MockLLM(model_id=model_size)
+    else:
+        gpt = GPT(model_id=model_size)
     gpt.initialize()
 
     pipeline_ws = PipelineWebSocket()
@@ -1,5 +1,8 @@
 from .utils import LLMModel
 from .gpt import GPT
 from .llama import LLAMA
+from .mock import MockLLM
+from .async_llm import AsyncLLM, call_all
+from .response_cache import ResponseCache
 
-__all__ = ['LLMModel', 'GPT', 'LLAMA']
\ No newline at end of file
+__all__ = ['LLMModel', 'GPT', 'LLAMA', 'MockLLM', 'AsyncLLM', 'call_all', 'ResponseCache']
\ No newline at end of file
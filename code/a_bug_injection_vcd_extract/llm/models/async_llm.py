@@ -0,0 +1,90 @@
+import vcd_extract.llm.models.utils as mutils
+import asyncio
+import threading
+import time
+from pydantic import BaseModel
+from typing import Union
+
+class RateLimiter:
+    """Spaces the start of requests to at most requests_per_minute, across threads (0 for no limit)."""
+    def __init__(self, requests_per_minute: float = 0):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.interval == 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+class AsyncLLM(mutils.LLMModel):
+    """
+    Wraps an LLMModel so that it can be called from many threads or coroutines
+    at once: at most max_concurrency requests are in flight and requests start
+    at most requests_per_minute times a minute.
+
+    call() blocks like the wrapped model, so an AsyncLLM can be handed to
+    BugInserter and the others as is. acall() and call_all() run independent
+    requests concurrently.
+    """
+    def __init__(self, llm_model: mutils.LLMModel, max_concurrency: int = 4, requests_per_minute: float = 0):
+        super().__init__(llm_model.model_id)
+        self.llm_model = llm_model
+        self.max_concurrency = max_concurrency
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.rate_limiter = RateLimiter(requests_per_minute)
+
+    def initialize(self, **kwargs):
+        self.llm_model.initialize(**kwargs)
+
+    def call(self,
+             role : str,
+             prompt : str,
+             output_schema: BaseModel = None,
+             history: list[dict] = None,
+             use_cache: bool = True) -> Union[str, dict]:
+        # Only pass what was given, LLAMA.call only takes the role and prompt
+        kwargs = {}
+        if output_schema is not None:
+            kwargs['output_schema'] = output_schema
+        if history is not None:
+            kwargs['history'] = history
+        if not use_cache:
+            kwargs['use_cache'] = use_cache
+        elif hasattr(self.llm_model, 'get_cached'):
+            # Cache hits do not count against the limits
+            cached_response = self.llm_model.get_cached(role, prompt, output_schema, history)
+            if cached_response is not None:
+                return cached_response
+
+        with self.semaphore:
+            self.rate_limiter.acquire()
+            return self.llm_model.call(role, prompt, **kwargs)
+
+    async def acall(self,
+                    role : str,
+                    prompt : str,
+                    output_schema: BaseModel = None,
+                    history: list[dict] = None,
+                    use_cache: bool = True) -> Union[str, dict]:
+        return await asyncio.to_thread(self.call, role, prompt, output_schema, history, use_cache)
+
+    async def acall_all(self, requests: list[tuple]) -> list[Union[str, dict]]:
+        return await asyncio.gather(*[self.acall(*request) for request in requests])
+
+    def call_all(self, requests: list[tuple]) -> list[Union[str, dict]]:
+        """Run (role, prompt[, output_schema[, history]]) requests concurrently, results in request order."""
+        if len(requests) <= 1 or self.max_concurrency <= 1:
+            return [self.call(*request) for request in requests]
+        return asyncio.run(self.acall_all(requests))
+
+def call_all(llm_model: mutils.LLMModel, requests: list[tuple]) -> list[Union[str, dict]]:
+    """Run independent requests concurrently with an AsyncLLM, one after another with any other model."""
+    if isinstance(llm_model, AsyncLLM):
+        return llm_model.call_all(requests)
+    return [llm_model.call(*request) for request in requests]
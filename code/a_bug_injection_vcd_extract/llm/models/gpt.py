@@ -1,4 +1,5 @@
 import vcd_extract.llm.models.utils as mutils
+from vcd_extract.llm.models.response_cache import ResponseCache
 import sys
 from typing import Union
 from pydantic import BaseModel
@@ -7,17 +8,38 @@ from openai import OpenAI
 sys.modules.keys()
 
 class GPT(mutils.LLMModel):
-    def __init__(self, model_id='gpt-4o-mini'):
+    def __init__(self, model_id='gpt-4o-mini', cache: ResponseCache = None, temperature=1):
         super().__init__(model_id)
+        self.cache = cache
+        self.temperature = temperature
 
     def initialize(self):
         self.client = OpenAI(api_key=mutils.get_api_key('gpt'))
+
+    def get_cached(self,
+                   role : str,
+                   prompt : str,
+                   output_schema: BaseModel = None,
+                   history: list[dict] = None) -> Union[str, dict, None]:
+        """Return the cached response to a request, None if there is none."""
+        if self.cache is None:
+            return None
+        return self.cache.get(self.cache.make_key(self.model_id, role, prompt, output_schema, history, self.temperature))
     
     def call(self, 
              role : str, 
              prompt : str, 
              output_schema: BaseModel = None,
-             history: list[dict] = None) -> Union[str, dict]:
+             history: list[dict] = None,
+             use_cache: bool = True) -> Union[str, dict]:
+        # Callers that want a new sample on every call set use_cache=False
+        cache_key = None
+        if self.cache is not None and use_cache:
+            cache_key = self.cache.make_key(self.model_id, role, prompt, output_schema, history, self.temperature)
+            cached_response = self.cache.get(cache_key)
+            if cached_response is not None:
+                return cached_response
+
         response_format = output_schema if output_schema else {"type": "text"}
 
         if history:
@@ -35,7 +57,7 @@ class GPT(mutils.LLMModel):
             response = self.client.beta.chat.completions.parse(
                 model=self.model_id,
                 messages=messages,
-                temperature=1,
+                temperature=self.temperature,
                 max_tokens=10000,
                 top_p=1,
                 frequency_penalty=0,
@@ -48,6 +70,10 @@ class GPT(mutils.LLMModel):
 
 
         if output_schema:
-            return dict(response.choices[0].message.parsed)
+            result = dict(response.choices[0].message.parsed)
         else:
-            return response.choices[0].message.content
\ No newline at end of file
+            result = response.choices[0].message.content
+
+        if cache_key is not None:
+            self.cache.put(cache_key, result)
+        return result
\ No newline at end of file
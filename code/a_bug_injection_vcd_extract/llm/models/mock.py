@@ -0,0 +1,171 @@
+import vcd_extract.llm.models.utils as mutils
+import hashlib
+import random
+import re
+import threading
+import time
+from pydantic import BaseModel
+from typing import Union
+
+class MockLLM(mutils.LLMModel):
+    """
+    Offline, deterministic stand-in for GPT. It answers the bug generation
+    prompts (module splitting, region labeling, region selection, mutation
+    selection and line mutation) with schema-valid outputs read off the prompt,
+    after a configurable latency. The same seed and request always give the
+    same response, so the pipeline overhead can be profiled and concurrency
+    load-tested without an API key or a GPU.
+    """
+    # "[12:] code" or "[12 (extra):] code", see Verilog.get_content(lineate=True)
+    LINE_PATTERN = re.compile(r'^\[(\d+)( \(extra\))?:\] ?(.*)$', re.MULTILINE)
+    # "1. name: description", see MutationList.stringify
+    MUTATION_PATTERN = re.compile(r'^\d+\. (\w+): ', re.MULTILINE)
+    REGION_PATTERN = re.compile(r'^Region (\d+) \t', re.MULTILINE)
+    LABEL_REGION_PATTERN = re.compile(r'^Region (\d+):$', re.MULTILINE)
+    MUTATED_LINE_PATTERN = re.compile(r'mutation:\n```\n(.*?)\n```', re.DOTALL)
+    # See prompts/insertion/mutation_batch_prompt.txt
+    BATCH_SIZE_PATTERN = re.compile(r'up to (\d+) candidate mutations')
+    OPERATOR_SWAPS = [("1'b1", "1'b0"), ("1'b0", "1'b1"), ('==', '!='), ('!=', '=='),
+                      (' & ', ' | '), (' | ', ' & '), (' + ', ' - '), (' - ', ' + '),
+                      ('&&', '||'), ('||', '&&')]
+
+    def __init__(self, model_id='mock', latency: float = 0.0, jitter: float = 0.0, seed: int = 0, region_lines: int = 20):
+        super().__init__(model_id)
+        self.latency = latency
+        self.jitter = jitter
+        self.seed = seed
+        self.region_lines = region_lines
+        self.num_calls = 0
+        self.lock = threading.Lock()
+
+    def call(self,
+             role : str,
+             prompt : str,
+             output_schema: BaseModel = None,
+             history: list[dict] = None,
+             use_cache: bool = True) -> Union[str, dict]:
+        with self.lock:
+            self.num_calls += 1
+
+        digest = hashlib.sha256(f'{self.seed}\0{self.model_id}\0{role}\0{prompt}\0{history}'.encode('utf-8')).digest()
+        rng = random.Random(digest)
+        if self.latency > 0:
+            time.sleep(self.latency * (1 + self.jitter * (2 * rng.random() - 1)))
+
+        if output_schema is None:
+            return f'Mock response {digest.hex()[:8]}'
+
+        schema_name = output_schema.__name__
+        if schema_name == 'LModuleSplit':
+            return self.split_module(prompt)
+        if schema_name == 'LRegionDescriptionList':
+            return self.label_regions(prompt, rng)
+        if schema_name == 'RegionSelection':
+            return self.select_region(prompt, rng)
+        if schema_name == 'MutationSelection':
+            return self.select_mutation(prompt, rng)
+        if schema_name == 'LineMutation':
+            return self.mutate_line(prompt)
+        if schema_name == 'MutationBatch':
+            return self.mutate_batch(prompt, rng)
+        return self.default_output(output_schema)
+
+    def get_numbered_lines(self, prompt : str) -> list[tuple[int, str]]:
+        """Return the (line number, line) of the last lineated block of the prompt, without the extra lines."""
+        blocks = []
+        previous_end = -1
+        for match in self.LINE_PATTERN.finditer(prompt):
+            if len(blocks) == 0 or match.start() != previous_end + 1:
+                blocks.append([])
+            previous_end = match.end()
+            if match.group(2) is None:
+                blocks[-1].append((int(match.group(1)), match.group(3)))
+        return blocks[-1] if len(blocks) > 0 else []
+
+    def get_mutations(self, prompt : str) -> list[str]:
+        return self.MUTATION_PATTERN.findall(prompt)
+
+    def split_module(self, prompt : str) -> dict:
+        line_nums = [line_num for line_num, _ in self.get_numbered_lines(prompt)]
+        split = []
+        for i in range(0, len(line_nums), self.region_lines):
+            region = line_nums[i:i + self.region_lines]
+            split.append({'start_line': region[0],
+                          'end_line': region[-1],
+                          'region_description': f'Lines {region[0]} to {region[-1]}'})
+        return {'split': split}
+
+    def label_regions(self, prompt : str, rng : random.Random) -> dict:
+        mutations = self.get_mutations(prompt)
+        descriptions = []
+        for region_idx in self.LABEL_REGION_PATTERN.findall(prompt):
+            descriptions.append({'summary': f'Region {region_idx}',
+                                 'mutation_classes': rng.sample(mutations, min(2, len(mutations)))})
+        return {'descriptions': descriptions}
+
+    def select_region(self, prompt : str, rng : random.Random) -> dict:
+        num_regions = len(self.REGION_PATTERN.findall(prompt))
+        region_idx = rng.randrange(num_regions) if num_regions > 0 else 0
+        return {'justification': 'Mock region selection', 'region_idx': region_idx}
+
+    def select_mutation(self, prompt : str, rng : random.Random) -> dict:
+        lines = [(line_num, line) for line_num, line in self.get_numbered_lines(prompt) if len(line.strip()) > 0]
+        mutations = self.get_mutations(prompt)
+        if len(lines) == 0 or len(mutations) == 0:
+            return {'rollback': True, 'justification': 'Nothing to mutate', 'line': 0, 'mutation': ''}
+        # Prefer lines that mutate_line can actually change
+        swappable = [line for line in lines if any(old in line[1] for old, _ in self.OPERATOR_SWAPS)]
+        line_num, _ = rng.choice(swappable or lines)
+        return {'rollback': False,
+                'justification': 'Mock mutation selection',
+                'line': line_num,
+                'mutation': rng.choice(mutations)}
+
+    def mutate_line(self, prompt : str) -> dict:
+        match = self.MUTATED_LINE_PATTERN.search(prompt)
+        return self.swap_operator(match.group(1) if match else '')
+
+    def mutate_batch(self, prompt : str, rng : random.Random) -> dict:
+        match = self.BATCH_SIZE_PATTERN.search(prompt)
+        num_mutations = int(match.group(1)) if match else 1
+        lines = [(line_num, line) for line_num, line in self.get_numbered_lines(prompt) if len(line.strip()) > 0]
+        mutations = self.get_mutations(prompt)
+        if len(lines) == 0 or len(mutations) == 0:
+            return {'rollback': True, 'candidates': []}
+        # Prefer lines that swap_operator can actually change
+        swappable = [line for line in lines if any(old in line[1] for old, _ in self.OPERATOR_SWAPS)]
+        lines = swappable or lines
+        candidates = []
+        for line_num, line in rng.sample(lines, min(num_mutations, len(lines))):
+            line_mutation = self.swap_operator(line)
+            candidates.append({'justification': 'Mock mutation selection',
+                               'line': line_num,
+                               'mutation': rng.choice(mutations),
+                               'mutated': line_mutation['mutated'],
+                               'summary': line_mutation['summary']})
+        return {'rollback': False, 'candidates': candidates}
+
+    def swap_operator(self, line : str) -> dict:
+        for old, new in self.OPERATOR_SWAPS:
+            if old in line:
+                mutated = line.replace(old, new, 1)
+                return {'justification': 'Mock mutation',
+                        'mutated': mutated,
+                        'summary': f'Replaced {old.strip()} with {new.strip()}'}
+        if len(line.strip()) == 0:
+            return {'justification': 'Nothing to mutate', 'mutated': line, 'summary': 'Unchanged'}
+        # No operator to swap, comment the line out so the mutation still changes it
+        indent = line[:len(line) - len(line.lstrip())]
+        return {'justification': 'No operator to swap',
+                'mutated': f'{indent}// {line.strip()}',
+                'summary': 'Commented out the line'}
+
+    def default_output(self, output_schema: BaseModel) -> dict:
+        """Output of any other schema, from the type of every field."""
+        fields = output_schema.model_fields if hasattr(output_schema, 'model_fields') else output_schema.__fields__
+        defaults = {str: 'mock', int: 0, float: 0.0, bool: False}
+        output = {}
+        for name, field in fields.items():
+            annotation = field.annotation if hasattr(field, 'annotation') else field.outer_type_
+            output[name] = defaults[annotation] if annotation in defaults else []
+        return output
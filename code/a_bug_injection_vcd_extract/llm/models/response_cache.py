@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from contextlib import closing
+from typing import Union
+
+class ResponseCache:
+    """
+    Disk-backed cache of LLM responses in an SQLite database, keyed by the hash
+    of everything that determines a response: model, role, prompt, history,
+    output schema and temperature. When the stored responses go over max_mb,
+    the least recently used ones are evicted.
+
+    Like the job ledger, only the database path is kept and every operation
+    opens a short-lived connection, so the cache can be shared by threads and
+    pool workers.
+    """
+    def __init__(self, db_path: str, max_mb: float = 256, timeout: float = 60.0):
+        self.db_path = db_path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.timeout = timeout
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @staticmethod
+    def make_key(model_id: str,
+                 role: str,
+                 prompt: str,
+                 output_schema=None,
+                 history: list[dict] = None,
+                 temperature: float = None) -> str:
+        if output_schema is None:
+            schema = None
+        elif hasattr(output_schema, 'model_json_schema'):
+            schema = output_schema.model_json_schema()
+        else:
+            schema = output_schema.schema()
+        key = json.dumps([model_id, role, prompt, schema, history, temperature], sort_keys=True)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Union[str, dict, None]:
+        """Return the cached response, None on a miss. Nested schema objects come back as dicts."""
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, response: Union[str, dict]):
+        # Parsed responses may hold nested pydantic models
+        response_json = json.dumps(response, default=lambda o: o.model_dump() if hasattr(o, 'model_dump') else o.dict())
+        size = len(response_json.encode('utf-8'))
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                         (key, response_json, size, time.time()))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+        evicted_keys = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if total_size <= self.max_bytes:
+                break
+            evicted_keys.append((key,))
+            total_size -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", evicted_keys)
+
+    def clear(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM responses")
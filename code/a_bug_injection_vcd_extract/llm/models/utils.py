@@ -30,5 +30,6 @@ class LLMModel:
              role : str, 
              prompt : str, 
              output_schema: BaseModel = None, 
-             history: list[dict] = None) -> Union[str, dict]:
+             history: list[dict] = None,
+             use_cache: bool = True) -> Union[str, dict]:
         return ''
@@ -0,0 +1,73 @@
+import os
+import json
+import fcntl
+import hashlib
+from contextlib import contextmanager
+from typing import Callable
+
+PARTITION_STORE_VERSION = 1
+
+class PartitionStore:
+    """
+    Content-addressed store of module partitions (the start line, end line and
+    description of every region), one JSON file per key. The key hashes the
+    file content with everything else the split depends on, so a file is only
+    split by the LLM once whatever the campaign, and a changed file or prompt
+    gets a new key.
+
+    Splitting a key holds an exclusive file lock on it: processes that need the
+    same partition wait for the first one to store it instead of splitting
+    again.
+    """
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(verilog_content: str, splitter_version: str, rois: list[tuple[int, int]] = None) -> str:
+        key = json.dumps([PARTITION_STORE_VERSION,
+                          hashlib.sha256(verilog_content.encode('utf-8')).hexdigest(),
+                          splitter_version,
+                          [list(roi) for roi in rois] if rois else None])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.store_dir, f'{key}.json')
+
+    @contextmanager
+    def lock(self, key: str):
+        with open(os.path.join(self.store_dir, f'{key}.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, key: str) -> list[dict]:
+        """Return the stored regions, None if the key is not stored."""
+        path = self.get_path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)['regions']
+
+    def put(self, key: str, regions: list[dict]):
+        path = self.get_path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': PARTITION_STORE_VERSION, 'regions': regions}, f, indent=4)
+        os.replace(tmp_path, path)
+
+    def get_or_create(self, key: str, create: Callable[[], list[dict]]) -> tuple[list[dict], bool]:
+        """Return the stored regions of key, created and stored under the lock on a miss, and whether it was a hit."""
+        regions = self.get(key)
+        if regions is not None:
+            return regions, True
+        with self.lock(key):
+            # Another process may have stored it while we waited
+            regions = self.get(key)
+            if regions is not None:
+                return regions, True
+            regions = create()
+            self.put(key, regions)
+            return regions, False
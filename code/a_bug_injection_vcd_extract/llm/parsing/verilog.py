@@ -1,5 +1,6 @@
 from __future__ import annotations
 from vcd_extract.llm.parsing.history import *
+from typing import Iterable
 
 def comment_verilog_line(old_line: str, comment: str):
     if old_line.lstrip().startswith("//"):
@@ -41,12 +42,21 @@ class Verilog:
             self.load_from_content(f.read(), start_line, end_line)
     
     def load_from_content(self, content: str, start_line, end_line):
-        self.content = content
+        # Edits only change self.lines, the content is joined again when it is read
+        self._content = content
         self.lines = content.splitlines()
+        # Lines set since the last merge into a VerilogPartition's full verilog
+        self.dirty_lines: set[int] = set()
         self.start_line = start_line or 1
         self.end_line = end_line or self.start_line + len(self.lines) - 1
         self.num_lines = len(self.lines)
     
+    @property
+    def content(self) -> str:
+        if self._content is None:
+            self._content = '\n'.join(self.lines)
+        return self._content
+
     def __lineate(self, line: str, line_num: int, is_extra=False) -> str:
         line_num_str = f'{line_num} (extra)' if is_extra else str(line_num)
         line = self.line_encoding.replace('*', line_num_str) + ' ' + line
@@ -67,15 +77,20 @@ class Verilog:
         return Verilog(name=self.name, content=slice_content, line_encoding=self.line_encoding,
                        start_line=slice_start, end_line=slice_end)
 
-    def update(self, other: Verilog):
+    def update(self, other: Verilog, line_nums: Iterable[int]=None):
+        # Line lists compared directly, get_line clamps every index
+        if line_nums is None:
+            line_nums = range(other.start_line, other.start_line + len(other.lines))
         changes = [
             VerilogChange(
                 line_idx=line_num, 
-                old_line=self.get_line(line_num), 
-                new_line=other.get_line(line_num)
+                old_line=self.lines[line_num - self.start_line], 
+                new_line=other.lines[line_num - other.start_line]
             ) 
-            for line_num in range(other.start_line, other.end_line+1)
-            if self.get_line(line_num) != other.get_line(line_num)
+            for line_num in sorted(line_nums)
+            if 0 <= line_num - other.start_line < len(other.lines) and
+               0 <= line_num - self.start_line < len(self.lines) and
+               self.lines[line_num - self.start_line] != other.lines[line_num - other.start_line]
         ]
         self.apply_batch_change(changes)
     
@@ -104,14 +119,14 @@ class Verilog:
         print(f'Changing line {line_idx} in ({self.start_line}-{self.end_line}) -- diff = {diff}')
 
         self.lines[diff] = new_line
-        self.content = '\n'.join(self.lines)
+        self._content = None
+        self.dirty_lines.add(line_idx)
 
     def undo(self) -> bool:
         change = self.history.undo()
         if not change:
             return False
         self.set_line(change.line_idx, change.old_line)
-        self.content = '\n'.join(self.lines)
         return True
 
     def redo(self) -> bool:
@@ -119,19 +134,21 @@ class Verilog:
         if not change:
             return False
         self.set_line(change.line_idx, change.new_line)
-        self.content = '\n'.join(self.lines)
         return True
     
     def set_description(self, description : str):
         self.description = description
 
-    def get_content(self, lineate=False, extra_lines: int=0, include_eof=False) -> str:
+    def get_content(self, lineate=False, extra_lines: int=0, include_eof=False, leading_extra_lines: int=None) -> str:
         conditional_eof = f'\n{self.EOF_TOKEN}' if include_eof else ''
         if lineate:
+            # extra lines at both ends unless the number of leading ones is given
+            if leading_extra_lines is None:
+                leading_extra_lines = extra_lines
             new_lines = self.lines.copy()
             for i in range(len(new_lines)):
                 line_num = self.start_line + i
-                is_extra = i < extra_lines or len(new_lines) - i <= extra_lines
+                is_extra = i < leading_extra_lines or len(new_lines) - i <= extra_lines
                 new_lines[i] = self.__lineate(new_lines[i], line_num, is_extra)
             return '\n'.join(new_lines) + conditional_eof
         else:
@@ -161,6 +178,8 @@ class VerilogPartition:
 
     def __setitem__(self, idx: int, value: Verilog):
         assert isinstance(value, Verilog), "Assigned value must be a Verilog instance."
+        # Any of its lines may differ from the full verilog
+        value.dirty_lines.update(range(value.start_line, value.start_line + len(value.lines)))
         self.regions[idx] = value
 
     def __delitem__(self, idx: int):
@@ -173,8 +192,11 @@ class VerilogPartition:
         return iter(self.regions)
 
     def get_full_verilog(self) -> Verilog:
+        # Only the lines edited since the last call are merged
         for region in self.regions:
-            self.full_verilog.update(region)
+            if region.dirty_lines:
+                self.full_verilog.update(region, region.dirty_lines)
+                region.dirty_lines.clear()
         return self.full_verilog
     
     def get_full_verilog_content(self) -> str:
@@ -0,0 +1,54 @@
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over a set of keywords. search(text) tells whether
+    any keyword is a substring of text, in one pass over text whatever the
+    number of keywords, where any(keyword in text for keyword in keywords)
+    scans text once per keyword.
+    """
+
+    def __init__(self, keywords: list):
+        self.goto = [{}]  # state -> {character: next state}
+        self.fail = [0]
+        self.output = [False]  # a keyword ends at this state
+        self.match_all = False
+
+        for keyword in keywords:
+            if len(keyword) == 0:
+                # The empty string is a substring of every text
+                self.match_all = True
+                continue
+            state = 0
+            for character in keyword:
+                if character not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(False)
+                    self.goto[state][character] = len(self.goto) - 1
+                state = self.goto[state][character]
+            self.output[state] = True
+
+        # Failure links in breadth first order, so that the link of a state's
+        # parent is known before the state's own
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for character, next_state in self.goto[state].items():
+                fail_state = self.fail[state]
+                while fail_state != 0 and character not in self.goto[fail_state]:
+                    fail_state = self.fail[fail_state]
+                self.fail[next_state] = self.goto[fail_state].get(character, 0)
+                self.output[next_state] = self.output[next_state] or self.output[self.fail[next_state]]
+                queue.append(next_state)
+
+    def search(self, text: str) -> bool:
+        """Return True if any keyword is a substring of text."""
+        if self.match_all:
+            return True
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for character in text:
+            while state != 0 and character not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(character, 0)
+            if output[state]:
+                return True
+        return False
@@ -1,13 +1,109 @@
 import os
-import anytree
+import json
+import math
+import hashlib
+from bisect import bisect_left
 from vcd_extract.utils import verible_verilog_syntax
+from vcd_extract.utils.keyword_matcher import KeywordMatcher
+from vcd_extract.workflows.workflow_utils import NestablePool
+
+# Bumped whenever the extracted module db changes, so that stale cache entries are ignored
+MODULE_DB_CACHE_VERSION = 1
+# Only the tree is used, built from lightweight nodes
+PARSE_OPTIONS = {"gen_tree": True, "skip_null": True, "gen_tokens": False, "light_tree": True}
+
+
+class TreeIndex:
+    """
+    Pre-order index of a Verible syntax tree, built in one pass. The subtree
+    of the node at position i spans positions [i, ends[i]), so the nodes of a
+    subtree with a given tag are found by bisecting the positions of that tag
+    instead of walking the subtree again.
+
+    Tags are matched by substring (e.g. "kDataType" also matches
+    "kDataTypePrimitive"), as the previous string matching on the nodes did.
+    """
+
+    def __init__(self, tree, source_code: bytes = None):  # type: ignore
+        self.source_code = source_code
+        self.nodes = []
+        self.ends = []
+        self.positions = {}  # id(node) -> position
+        self.tag_positions = {}  # tag -> sorted positions
+        self._strings = {}
+        self._matching_tags = {}
+
+        stack = [(tree, True)]
+        while len(stack) > 0:
+            node, enter = stack.pop()
+            if not enter:
+                self.ends[node] = len(self.nodes)
+                continue
+            position = len(self.nodes)
+            self.nodes.append(node)
+            self.ends.append(position + 1)
+            self.positions[id(node)] = position
+            tag = getattr(node, "tag", None)
+            if tag is not None:
+                self.tag_positions.setdefault(tag, []).append(position)
+            stack.append((position, False))
+            for child in reversed(getattr(node, "children", ())):
+                stack.append((child, True))
+
+    def subtree(self, node) -> tuple:
+        """Return the (start, end) positions of the subtree of a node, or of a node position."""
+        position = node if isinstance(node, int) else self.positions[id(node)]
+        return position, self.ends[position]
+
+    def iter_subtree(self, node):
+        """Yield the nodes of a subtree in pre-order, like anytree.RenderTree."""
+        start, end = self.subtree(node)
+        for position in range(start, end):
+            yield self.nodes[position]
+
+    def find(self, key: str, start: int = 0, end: int = None) -> list:  # type: ignore
+        """Return the positions in [start, end) of the nodes whose tag contains key, in pre-order."""
+        end = len(self.nodes) if end is None else end
+        if key not in self._matching_tags:
+            self._matching_tags[key] = [tag for tag in self.tag_positions if key in tag]
+        found = []
+        for tag in self._matching_tags[key]:
+            tag_positions = self.tag_positions[tag]
+            found += tag_positions[bisect_left(tag_positions, start):bisect_left(tag_positions, end)]
+        return sorted(found)
+
+    def has(self, node, key: str) -> bool:
+        tag = getattr(node, "tag", None)
+        return tag is not None and key in tag
+
+    def string(self, node) -> str:
+        """Same as str(node), computed once per node."""
+        if id(node) not in self._strings:
+            tag = getattr(node, "tag", None)
+            if tag is None:
+                string = "null"
+            else:
+                tag = tag if tag == repr(tag)[1:-1] else repr(tag)
+                string = f"[{tag}]"
+                if isinstance(node, verible_verilog_syntax.TokenNode) or \
+                        (isinstance(node, verible_verilog_syntax.LightNode) and node.is_token):
+                    string += f" @({node.start}-{node.end})"
+                    text = self.source_code[node.start:node.end].decode("utf-8") \
+                        if self.source_code and node.end <= len(self.source_code) else ""
+                    if node.tag != text:
+                        string += f" '{repr(text)[1:-1]}'"
+            self._strings[id(node)] = string
+        return self._strings[id(node)]
+
 
 class SignalSelector:
     def __init__(self, verible_verilog_syntax_path: str,
                  design_path: str,
                  input_signals_list_path: str,
                  output_signals_list_path: str,
-                 debug=False):
+                 debug=False,
+                 njobs: int = 1,
+                 cache_dir: str = ""):
 
         self.parser = verible_verilog_syntax.VeribleVerilogSyntax(
             executable=verible_verilog_syntax_path
@@ -18,6 +114,10 @@ class SignalSelector:
         self.output_signals_list_path = output_signals_list_path
 
         self.debug = debug
+        # Files are parsed by njobs processes, and the module db of every file
+        # is cached in cache_dir under the hash of its content
+        self.njobs = njobs
+        self.cache_dir = cache_dir
 
     def _get_design_files(self):
         self.design_files = []
@@ -28,97 +128,146 @@ class SignalSelector:
 
     def construct_module_db(self):
         self._get_design_files()
-        design_files_data = self.parser.parse_files(self.design_files,
-                                                    options={
-                                                        "gen_tree": True,
-                                                        "skip_null": True,
-                                                        "gen_tokens": True
-                                                    }
-                                                    )
 
+        file_module_dbs = {}
+        file_hashes = {}
+        for file_path in self.design_files:
+            if len(self.cache_dir) > 0:
+                file_hashes[file_path] = self._get_file_hash(file_path)
+                file_module_db = self._load_cached_module_db(file_hashes[file_path])
+                if file_module_db is not None:
+                    file_module_dbs[file_path] = file_module_db
+        parse_files = [file_path for file_path in self.design_files if file_path not in file_module_dbs]
+        print(f"Parsing {len(parse_files)} of {len(self.design_files)} design files, "
+              f"{len(self.design_files) - len(parse_files)} cached")
+
+        if self.njobs > 1 and len(parse_files) > 1:
+            # A few shards per process keep the pool busy when files differ in size
+            nshards = min(len(parse_files), self.njobs * 4)
+            shard_size = math.ceil(len(parse_files) / nshards)
+            shards = [parse_files[i:i + shard_size] for i in range(0, len(parse_files), shard_size)]
+            with NestablePool(min(self.njobs, len(shards))) as pool:
+                results = pool.starmap(_parse_shard, [(self.parser.executable, shard) for shard in shards])
+        else:
+            results = [_parse_shard(self.parser.executable, parse_files)] if len(parse_files) > 0 else []
+
+        for shard_results in results:
+            for file_path, file_module_db, error in shard_results:
+                file_module_dbs[file_path] = file_module_db
+                if error is not None:
+                    print(f"Error: {file_path} with error: {error}")
+                elif len(self.cache_dir) > 0:
+                    self._save_cached_module_db(file_hashes[file_path], file_module_db)
+
+        # Merged in file order, so that a module declared twice resolves as before
         self.module_db = {}
-        for file_path, file_data in design_files_data.items():
-            try:
-                # for each source file, extract data from each declared module
-                for prefix, _, node in anytree.RenderTree(file_data.tree):
-                    if "kModuleDeclaration" in str(node):
-                        current_module = node
-                        if "kModuleHeader" in str(node.children[0]):
-                            if "SymbolIdentifier" in str(node.children[0].children[1]):
-                                module_name = str(node.children[0].children[1]).split(
-                                    " ")[-1].strip("\'")
-                                # print("Module name: ", module_name)
-                                self.module_db[module_name] = None
-
-                        data_dec_sub_trees = []
-
-                        # Look for all data declaration subtress
-                        for current_module_prefix, _, current_module_node in anytree.RenderTree(current_module):
-                            if "kDataDeclaration" in str(current_module_node):
-                                data_dec_sub_trees.append(current_module_node)
-
-                        # A dict to store the variable name and its type
-                        type_var_db = {}
-
-                        for data_dec_sub_tree in data_dec_sub_trees:
-                            # kInstantiationType
-                            type_tree = data_dec_sub_tree.children[0].children[0]
-                            # kGateInstanceRegisterVariableList
-                            varible_list_tree = data_dec_sub_tree.children[0].children[1]
-
-                            # iterate through type tree to find the variable type
-                            for _, _, type_tree_node in anytree.RenderTree(type_tree):
-                                if "kDataType" in str(type_tree_node):
-                                    if "kDataTypePrimitive" in str(type_tree_node.children[0]):
-                                        found_type = str(type_tree_node.children[0].children[0]).split(" ")[
-                                            0].strip("[]")
-                                        if found_type not in type_var_db:
-                                            type_var_db[found_type] = []
-                                            # print("Primitive type: ", found_type)
-                                    else:
-                                        for _, _, type_tree_node_children in anytree.RenderTree(type_tree_node):
-                                            if "kQualifiedId" in str(type_tree_node_children):
-                                                found_type = ""
-                                                for child_node in type_tree_node_children.children:
-                                                    if "kUnqualifiedId" in str(child_node):
-                                                        found_type += str(child_node.children[0]).split(
-                                                            " ")[-1].strip("\'")
-                                                    else:
-                                                        found_type += str(child_node).split(" ")[
-                                                            0].strip("[]")
-                                                if found_type not in type_var_db:
-                                                    type_var_db[found_type] = [
-                                                    ]
-                                                break
-                                            elif "kUnqualifiedId" in str(type_tree_node_children):
-                                                if "SymbolIdentifier" in str(type_tree_node_children.children[0]):
-                                                    found_type = str(type_tree_node_children.children[0]).split(
-                                                        " ")[-1].strip("\'")
-                                                    if found_type not in type_var_db:
-                                                        type_var_db[found_type] = [
-                                                        ]
-                                                    break
-
-                            # iterate through variable list tree to find the variable name
-                            for varible_list_tree_prefix, _, varible_list_tree_node in anytree.RenderTree(varible_list_tree):
-                                if "kRegisterVariable" in str(varible_list_tree_node):
-                                    if "SymbolIdentifier" in str(varible_list_tree_node.children[0]):
-                                        found_var = str(varible_list_tree_node.children[0]).split(
-                                            " ")[-1].strip("\'")
-                                        type_var_db[found_type].append(
-                                            found_var)
-                                if "kGateInstance" in str(varible_list_tree_node):
-                                    if "SymbolIdentifier" in str(varible_list_tree_node.children[0]):
-                                        found_var = str(varible_list_tree_node.children[0]).split(
+        for file_path in self.design_files:
+            if file_path in file_module_dbs:
+                self.module_db.update(file_module_dbs[file_path])
+
+    @staticmethod
+    def _get_file_hash(file_path: str) -> str:
+        digest = hashlib.sha256(f"{MODULE_DB_CACHE_VERSION}\0".encode("utf-8"))
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _load_cached_module_db(self, file_hash: str) -> dict:
+        cache_path = f"{self.cache_dir}/{file_hash}.json"
+        if not os.path.exists(cache_path):
+            return None  # type: ignore
+        try:
+            with open(cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None  # type: ignore
+
+    def _save_cached_module_db(self, file_hash: str, file_module_db: dict):
+        cache_path = f"{self.cache_dir}/{file_hash}.json"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(file_module_db, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Could not cache the module db at {cache_path}: {e}")
+
+    @staticmethod
+    def _extract_module_db(index: "TreeIndex", module_db: dict):
+        """
+        Add {module name: {type: [variables]}} for the modules of one file to
+        module_db. Every declaration is found through the tag index of the
+        file, so each node is visited and stringified at most once.
+        """
+        # for each source file, extract data from each declared module
+        for module_position in index.find("kModuleDeclaration"):
+            current_module = index.nodes[module_position]
+            if index.has(current_module.children[0], "kModuleHeader"):
+                if index.has(current_module.children[0].children[1], "SymbolIdentifier"):
+                    module_name = index.string(current_module.children[0].children[1]).split(
+                        " ")[-1].strip("\'")
+                    module_db[module_name] = None
+
+            # Look for all data declaration subtrees
+            data_dec_sub_trees = [index.nodes[position] for position in index.find(
+                "kDataDeclaration", *index.subtree(module_position))]
+
+            # A dict to store the variable name and its type
+            type_var_db = {}
+
+            for data_dec_sub_tree in data_dec_sub_trees:
+                # kInstantiationType
+                type_tree = data_dec_sub_tree.children[0].children[0]
+                # kGateInstanceRegisterVariableList
+                varible_list_tree = data_dec_sub_tree.children[0].children[1]
+
+                # iterate through type tree to find the variable type
+                for type_position in index.find("kDataType", *index.subtree(type_tree)):
+                    type_tree_node = index.nodes[type_position]
+                    if index.has(type_tree_node.children[0], "kDataTypePrimitive"):
+                        found_type = index.string(type_tree_node.children[0].children[0]).split(" ")[
+                            0].strip("[]")
+                        if found_type not in type_var_db:
+                            type_var_db[found_type] = []
+                    else:
+                        for type_tree_node_children in index.iter_subtree(type_tree_node):
+                            if index.has(type_tree_node_children, "kQualifiedId"):
+                                found_type = ""
+                                for child_node in type_tree_node_children.children:
+                                    if index.has(child_node, "kUnqualifiedId"):
+                                        found_type += index.string(child_node.children[0]).split(
                                             " ")[-1].strip("\'")
-                                        type_var_db[found_type].append(
-                                            found_var)
+                                    else:
+                                        found_type += index.string(child_node).split(" ")[
+                                            0].strip("[]")
+                                if found_type not in type_var_db:
+                                    type_var_db[found_type] = []
+                                break
+                            elif index.has(type_tree_node_children, "kUnqualifiedId"):
+                                if index.has(type_tree_node_children.children[0], "SymbolIdentifier"):
+                                    found_type = index.string(type_tree_node_children.children[0]).split(
+                                        " ")[-1].strip("\'")
+                                    if found_type not in type_var_db:
+                                        type_var_db[found_type] = []
+                                    break
 
-                        # Add to self.module_db
-                        self.module_db[module_name] = type_var_db
-            except Exception as e:
-                print(f"Error: {file_path} with error: {e}")
-                continue
+                # iterate through variable list tree to find the variable name
+                for varible_list_tree_node in index.iter_subtree(varible_list_tree):
+                    if index.has(varible_list_tree_node, "kRegisterVariable"):
+                        if index.has(varible_list_tree_node.children[0], "SymbolIdentifier"):
+                            found_var = index.string(varible_list_tree_node.children[0]).split(
+                                " ")[-1].strip("\'")
+                            type_var_db[found_type].append(found_var)
+                    if index.has(varible_list_tree_node, "kGateInstance"):
+                        if index.has(varible_list_tree_node.children[0], "SymbolIdentifier"):
+                            found_var = index.string(varible_list_tree_node.children[0]).split(
+                                " ")[-1].strip("\'")
+                            type_var_db[found_type].append(found_var)
+
+            # Add to module_db
+            module_db[module_name] = type_var_db
 
     def print_module_db(self):
         for module_name, module_data in self.module_db.items():
@@ -142,20 +291,17 @@ class SignalSelector:
                     print(f"Error: {module_name} with error: {e}")
                     continue
 
-        self.pruned_signal_list = []
+        declared_vars_matcher = KeywordMatcher(declared_vars)
+        exclude_keywords_matcher = KeywordMatcher(exclude_keywords)
+        include_keywords_matcher = KeywordMatcher(include_keywords)
+
+        # Signals keep the order of the input list, each signal once
         with open(self.input_signals_list_path, 'r') as f:
             lines = f.readlines()
-            self.pruned_signal_list = [line for line in lines if any(
-                var in line for var in declared_vars)]
-            
-            self.pruned_signal_list = [line for line in self.pruned_signal_list if not any(
-                keyword in line for keyword in exclude_keywords)]
-            
-            self.pruned_signal_list = self.pruned_signal_list + [line for line in lines if any(
-                keyword in line for keyword in include_keywords)]
-            
-        # Make a set to remove duplicates
-        self.pruned_signal_list = list(set(self.pruned_signal_list))
+        self.pruned_signal_list = list(dict.fromkeys(
+            line for line in lines
+            if (declared_vars_matcher.search(line) and not exclude_keywords_matcher.search(line))
+            or include_keywords_matcher.search(line)))
 
         # Export the signal_list and pruned_signals to two separate files
         with open(self.output_signals_list_path, 'w') as f:
@@ -167,3 +313,27 @@ class SignalSelector:
             raise FileNotFoundError(
                 f"Pruned signals failed to generate at {self.output_signals_list_path}")
         print(f"Pruned signals generated at {self.output_signals_list_path}")
+
+
+def _parse_shard(executable: str, file_paths: list) -> list:
+    """
+    Parse a shard of design files with one verible-verilog-syntax run and
+    return (file path, module db of the file, error) for every file. Files
+    are read from the output one at a time, so only one tree is held at once.
+    """
+    parser = verible_verilog_syntax.VeribleVerilogSyntax(executable=executable)
+
+    results = []
+    for file_path, file_data in parser.iter_parse_files(file_paths, options=PARSE_OPTIONS):
+        file_module_db = {}
+        if file_data.tree is None:
+            # Not cached, so that the errors are reported again on the next run
+            results.append((file_path, file_module_db, "no syntax tree"))
+            continue
+        try:
+            SignalSelector._extract_module_db(
+                TreeIndex(file_data.tree, file_data.source_code), file_module_db)
+            results.append((file_path, file_module_db, None))
+        except Exception as e:
+            results.append((file_path, file_module_db, str(e)))
+    return results
@@ -0,0 +1,76 @@
+import os
+import time
+import argparse
+from io import StringIO
+from contextlib import redirect_stdout
+
+import vcdvcd
+
+from vcd_extract.utils.vcd_parser import VCDParser
+
+
+def parse_with_vcdvcd(vcd_path: str, signals: list) -> str:
+    with StringIO() as buf, redirect_stdout(buf):
+        vcdvcd.VCDVCD(vcd_path=vcd_path, callbacks=vcdvcd.PrintDumpsStreamParserCallbacks(),
+                      signals=signals)
+        return buf.getvalue()
+
+
+def parse_with_native(vcd_path: str, signals: list) -> str:
+    with VCDParser(vcd_path, signals=signals) as parser:
+        return parser.dumps()
+
+
+def time_parser(parse, vcd_path: str, signals: list, repeat: int) -> tuple:
+    """Return (best time in seconds, output) over repeat runs."""
+    best_time = None
+    output = ""
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        output = parse(vcd_path, signals)
+        elapsed_time = time.perf_counter() - start_time
+        best_time = elapsed_time if best_time is None else min(best_time, elapsed_time)
+    return best_time, output
+
+
+def benchmark(vcd_path: str, signals: list, repeat: int = 3) -> dict:
+    """
+    Time vcdvcd and the native parser on one VCD, and check that both produce
+    the same output.
+    """
+    size_mb = os.path.getsize(vcd_path) / (1024 * 1024)
+    vcdvcd_time, vcdvcd_output = time_parser(parse_with_vcdvcd, vcd_path, signals, repeat)
+    native_time, native_output = time_parser(parse_with_native, vcd_path, signals, repeat)
+    return {"vcd_path": vcd_path,
+            "size_mb": size_mb,
+            "vcdvcd_mb_s": size_mb / vcdvcd_time,
+            "native_mb_s": size_mb / native_time,
+            "speedup": vcdvcd_time / native_time,
+            "identical": vcdvcd_output == native_output}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the native VCD parser against vcdvcd (e.g. on OpenTitan and MESI dumps)")
+    parser.add_argument('--vcd', type=str, nargs='+', required=True,
+                        help="VCD files to parse")
+    parser.add_argument('--signals', type=str, default="",
+                        help="Target signals file, all signals are parsed if not given")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Number of runs per parser, the best one is reported")
+    args = parser.parse_args()
+
+    signals = []
+    if len(args.signals) > 0:
+        with open(args.signals, "r") as f:
+            signals = [line.strip() for line in f if len(line.strip()) > 0]
+
+    print(f"{'VCD':<60} {'MB':>10} {'vcdvcd MB/s':>12} {'native MB/s':>12} {'speedup':>8} {'identical':>10}")
+    for vcd_path in args.vcd:
+        result = benchmark(vcd_path, signals, args.repeat)
+        print(f"{os.path.basename(result['vcd_path']):<60} {result['size_mb']:>10.1f} {result['vcdvcd_mb_s']:>12.1f} "
+              f"{result['native_mb_s']:>12.1f} {result['speedup']:>8.2f} {str(result['identical']):>10}")
+
+
+if __name__ == "__main__":
+    main()
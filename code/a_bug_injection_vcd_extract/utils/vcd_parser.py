@@ -0,0 +1,479 @@
+import os
+import re
+import json
+import hashlib
+import math
+import mmap
+import stat
+from array import array
+from decimal import Decimal
+
+from vcd_extract.workflows.workflow_utils import NestablePool
+
+# Size of the blocks the value change section is split into, cut at line boundaries
+BLOCK_SIZE = 64 * 1024 * 1024
+# Smallest value change section parsed in parallel, and smallest chunk given to a worker
+MIN_CHUNK_SIZE = 16 * 1024 * 1024
+
+_HASH = ord("#")
+_VALUE = frozenset(b"01xXzZ")
+_VECTOR_VALUE_CHANGE = frozenset(b"bBrR")
+_TIMESCALE_FACTORS = {"s": "1e0", "ms": "1e-3", "us": "1e-6", "ns": "1e-9", "ps": "1e-12", "fs": "1e-15"}
+
+
+def binary_string_to_hex(value: bytes) -> str:
+    """
+    Same as vcdvcd.binary_string_to_hex, on bytes: the hex value of a binary
+    string, or its first character that is not 0/1 (e.g. "x").
+    """
+    others = value.translate(None, b"01")
+    if len(others) > 0:
+        return chr(others[0])
+    return format(int(value, 2), "x")
+
+
+class VCDParser:
+    """
+    VCD parser that produces the same output as vcdvcd with
+    PrintDumpsStreamParserCallbacks, several times faster.
+
+    The file is memory mapped and split into large blocks at line boundaries.
+    After the header, only the identifier codes of the selected signals are
+    tracked, and a value is only formatted when it changes. Per-signal
+    time/value arrays are built on the first call to tv().
+
+    A FIFO or any other non-seekable file is read as a stream instead, which
+    only allows one pass over the value changes.
+
+    With header_cache_dir, the signal table built from the header is cached
+    under the hash of the header and of the target signals. All seeds of the
+    same build share their header, so after the first extraction the header
+    is only hashed, not parsed.
+    """
+
+    def __init__(self, vcd_path: str, signals: list = None, block_size: int = BLOCK_SIZE, header_cache_dir: str = ""):  # type: ignore
+        self.vcd_path = vcd_path
+        self.block_size = block_size
+        self.target_signals = list(signals) if signals else []
+        self.header_cache_dir = header_cache_dir
+
+        # Header content, with the same meaning as the VCDVCD attributes
+        self.signals = []
+        self.references_to_ids = {}
+        self.timescale = {}
+        self.sizes = {}  # identifier code -> size of its first selected declaration
+        self.first_references = {}  # identifier code -> first selected reference
+
+        self._tvs = None
+        self._consumed = False
+        self._file = open(vcd_path, "rb")
+        self._mmap = None
+        file_stat = os.fstat(self._file.fileno())
+        if stat.S_ISREG(file_stat.st_mode) and file_stat.st_size > 0:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._stream_remainder = b""
+        self.body_offset = self._read_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def _read_header(self) -> int:
+        """Parse the header and return the offset of the value change section."""
+        if self._mmap is not None:
+            end = self._mmap.find(b"$enddefinitions")
+            if end == -1:
+                raise ValueError(f"No $enddefinitions in {self.vcd_path}")
+            end = self._mmap.find(b"\n", end)
+            end = len(self._mmap) if end == -1 else end + 1
+            header = self._mmap[:end]
+        else:
+            header = b""
+            while True:
+                end = header.find(b"$enddefinitions")
+                if end != -1 and header.find(b"\n", end) != -1:
+                    end = header.find(b"\n", end) + 1
+                    break
+                block = self._file.read(self.block_size)
+                if len(block) == 0:
+                    raise ValueError(f"No $enddefinitions in {self.vcd_path}")
+                header += block
+            header, self._stream_remainder = header[:end], header[end:]
+
+        if len(self.header_cache_dir) > 0:
+            self._load_or_parse_header(header)
+        else:
+            self._parse_header(header.decode("utf-8").split("\n"))
+        return end
+
+    def _load_or_parse_header(self, header: bytes):
+        # $date and $version differ between seeds, only the timescale and the definitions are hashed
+        digest = hashlib.sha256()
+        timescale_start = header.find(b"$timescale")
+        if timescale_start != -1:
+            digest.update(header[timescale_start:header.find(b"$end", timescale_start)])
+        digest.update(b"\0")
+        scope_start = header.find(b"$scope")
+        digest.update(header[scope_start:] if scope_start != -1 else header)
+        digest.update(b"\0")
+        digest.update("\n".join(self.target_signals).encode("utf-8"))
+        cache_path = f"{self.header_cache_dir}/{digest.hexdigest()}.json"
+
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r") as f:
+                    cache = json.load(f)
+                self.signals = cache["signals"]
+                self.references_to_ids = dict((reference, identifier_code.encode("utf-8"))
+                                              for reference, identifier_code in cache["references_to_ids"].items())
+                self.sizes = dict((identifier_code.encode("utf-8"), size)
+                                  for identifier_code, size in cache["sizes"].items())
+                self.first_references = dict((identifier_code.encode("utf-8"), reference)
+                                             for identifier_code, reference in cache["first_references"].items())
+                self.timescale = dict((key, value if key == "unit" else Decimal(value))
+                                      for key, value in cache["timescale"].items())
+                return
+            except (OSError, ValueError, KeyError):
+                pass
+
+        self._parse_header(header.decode("utf-8").split("\n"))
+
+        try:
+            os.makedirs(self.header_cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"signals": self.signals,
+                           "references_to_ids": dict((reference, identifier_code.decode("utf-8"))
+                                                     for reference, identifier_code in self.references_to_ids.items()),
+                           "sizes": dict((identifier_code.decode("utf-8"), size)
+                                         for identifier_code, size in self.sizes.items()),
+                           "first_references": dict((identifier_code.decode("utf-8"), reference)
+                                                    for identifier_code, reference in self.first_references.items()),
+                           "timescale": dict((key, str(value)) for key, value in self.timescale.items())}, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Could not cache the header of {self.vcd_path}: {e}")
+
+    def _parse_header(self, lines: list):
+        signals_set = set(self.target_signals)
+        all_signals = len(self.target_signals) == 0
+        hier = []
+        lines = iter(lines)
+        for line in lines:
+            line = line.strip()
+            if "$scope" in line:
+                hier.append(line.split()[2])
+            elif "$upscope" in line:
+                hier.pop()
+            elif "$var" in line:
+                ls = line.split()
+                size, identifier_code = ls[2], ls[3]
+                name = "".join(ls[4:-1])
+                path = ".".join(hier)
+                reference = f"{path}.{name}" if path else name
+                if reference in signals_set or all_signals:
+                    identifier_code = identifier_code.encode("utf-8")
+                    self.signals.append(reference)
+                    if identifier_code not in self.sizes:
+                        self.sizes[identifier_code] = int(size)
+                        self.first_references[identifier_code] = reference
+                    self.references_to_ids[reference] = identifier_code
+            elif "$timescale" in line:
+                while "$end" not in line:
+                    line += " " + next(lines).strip()
+                timescale = " ".join(line.split()[1:-1])
+                magnitude = Decimal(re.findall(r"(\d+(\.\d+)?)|$", timescale)[0][0])
+                unit = re.findall(r"s|ms|us|ns|ps|fs|$", timescale)[0]
+                factor = _TIMESCALE_FACTORS[unit]
+                self.timescale = {"timescale": magnitude * Decimal(factor),
+                                  "magnitude": magnitude,
+                                  "unit": unit,
+                                  "factor": Decimal(factor)}
+            elif "$comment" in line:
+                while "$end" not in line:
+                    line = next(lines)
+
+    def _blocks(self, start: int = None, end: int = None):  # type: ignore
+        """
+        Yield the value change section, or the [start, end) part of a memory
+        mapped file, in blocks that end at a line boundary.
+        """
+        if self._mmap is not None:
+            position = self.body_offset if start is None else start
+            length = len(self._mmap) if end is None else end
+            while position < length:
+                block_end = self._mmap.find(b"\n", min(position + self.block_size, length - 1), length)
+                block_end = length if block_end == -1 else block_end + 1
+                yield self._mmap[position:block_end]
+                position = block_end
+            return
+
+        if self._consumed:
+            raise RuntimeError(f"{self.vcd_path} is a stream and was already parsed")
+        self._consumed = True
+        remainder = self._stream_remainder
+        while True:
+            block = self._file.read(self.block_size)
+            if len(block) == 0:
+                if len(remainder) > 0:
+                    yield remainder
+                return
+            block = remainder + block
+            end = block.rfind(b"\n") + 1
+            remainder = block[end:]
+            yield block[:end]
+
+    def get_print_references(self) -> list:
+        """Return the references printed as columns, in the vcdvcd order."""
+        if len(self.target_signals) > 0:
+            return self.target_signals
+        return sorted(self.first_references.values())
+
+    def get_widths(self, references: list) -> dict:
+        """Return {reference: column width}, computed like vcdvcd."""
+        widths = {}
+        for i, reference in enumerate(references, 1):
+            size = self.sizes[self.references_to_ids[reference]]
+            widths[reference] = max(size // 4, int(math.floor(math.log10(i))) + 1)
+        return widths
+
+    def dumps_header(self, references: list, widths: dict) -> list:
+        lines = ["0 time"]
+        for i, reference in enumerate(references, 1):
+            lines.append(f"{i} {reference}")
+        lines.append("")
+        lines.append("0 " + "".join(f"{i:>{widths[reference]}d} " for i, reference in enumerate(references, 1)))
+        lines.append("=" * (sum(widths.values()) + len(widths) + 1))
+        return lines
+
+    def get_columns(self, references: list, widths: dict) -> dict:
+        """Return {identifier code: [(column, width)]} for the printed references."""
+        columns = {}
+        for position, reference in enumerate(references):
+            columns.setdefault(self.references_to_ids[reference], []).append(
+                (position, widths[reference]))
+        return columns
+
+    def dumps(self, njobs: int = 1, min_chunk_size: int = MIN_CHUNK_SIZE) -> str:
+        """
+        Return exactly what vcdvcd prints with PrintDumpsStreamParserCallbacks
+        (deltas=True) for the selected signals: the numbered signal list, a
+        separator line, then one line per time step where a signal changed.
+
+        With njobs > 1, a memory mapped file larger than min_chunk_size is
+        parsed in chunks by worker processes (see dumps_parallel).
+        """
+        references = self.get_print_references()
+        widths = self.get_widths(references)
+        lines = self.dumps_header(references, widths)
+        columns = self.get_columns(references, widths)
+        row = ["x".rjust(widths[reference]) for reference in references]
+
+        if njobs > 1 and self._mmap is not None and len(self._mmap) - self.body_offset > min_chunk_size:
+            rows = self.dumps_parallel(columns, row, njobs, min_chunk_size)
+            if len(rows) > 0:
+                lines.append(rows)
+        else:
+            lines += self._format_rows(self._blocks(), columns, row)
+        lines.append("")
+        return "\n".join(lines)
+
+    def get_chunk_boundaries(self, nchunks: int, min_chunk_size: int) -> list:
+        """
+        Split the value change section into at most nchunks (start, end) ranges.
+        Every chunk but the first starts on a "#time" line.
+        """
+        length = len(self._mmap)
+        chunk_size = max((length - self.body_offset) // nchunks, min_chunk_size)
+        boundaries = [self.body_offset]
+        while True:
+            boundary = self._mmap.find(b"\n#", boundaries[-1] + chunk_size)
+            if boundary == -1:
+                break
+            boundaries.append(boundary + 1)
+        boundaries.append(length)
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    def dumps_parallel(self, columns: dict, row: list, njobs: int, min_chunk_size: int = MIN_CHUNK_SIZE) -> str:
+        """
+        Format the value change rows with a pool of njobs workers.
+
+        A chunk only knows the values that change inside it, so the chunks are
+        parsed twice: first for the last value of every signal in each chunk,
+        from which the values at the start of each chunk are carried forward,
+        then to format the rows of each chunk from its start values.
+        """
+        chunks = self.get_chunk_boundaries(njobs * 4, min_chunk_size)
+        # Not daemonic, since the caller may itself be a pool worker
+        with NestablePool(njobs, initializer=_init_chunk_worker,
+                          initargs=(self.vcd_path, self.target_signals, columns, self.header_cache_dir)) as pool:
+            last_values = pool.map(_get_chunk_last_values, chunks[:-1])
+
+            start_rows = [list(row)]
+            for chunk_last_values in last_values:
+                row = list(row)
+                for identifier_code, value in chunk_last_values.items():
+                    for position, width in columns[identifier_code]:
+                        row[position] = value.rjust(width)
+                start_rows.append(row)
+
+            chunk_texts = pool.starmap(_format_chunk, zip(chunks, start_rows))
+        return "\n".join(text for text in chunk_texts if len(text) > 0)
+
+    def _format_rows(self, blocks, columns: dict, row: list) -> list:
+        """
+        Return the rows printed for a part of the value change section, starting
+        from the formatted values in row. A part other than the first starts on
+        a "#time" line, so its rows are the same as in a serial parse.
+        """
+        lines = []
+        time = 0
+        changed = False
+        in_comment = False
+        for block in blocks:
+            for line in block.split(b"\n"):
+                if len(line) == 0:
+                    continue
+                if in_comment:
+                    in_comment = b"$end" not in line
+                    continue
+                first = line[0]
+                if first == _HASH:
+                    if changed:
+                        lines.append(" ".join([str(time)] + row))
+                    changes = line.split()
+                    time = int(changes[0][1:])
+                    changed = False
+                    # Scalar value changes on the same line as the time
+                    for change in changes[1:]:
+                        if change[0] in _VALUE:
+                            identifier_columns = columns.get(change[1:])
+                            if identifier_columns is not None:
+                                changed = True
+                                value = chr(change[0])
+                                for position, width in identifier_columns:
+                                    row[position] = value.rjust(width)
+                        elif change[0] in _VECTOR_VALUE_CHANGE:
+                            raise Exception("Vector value changes have to be on a separate line!")
+                elif first in _VECTOR_VALUE_CHANGE:
+                    value, identifier_code = line[1:].split()
+                    identifier_columns = columns.get(identifier_code)
+                    if identifier_columns is not None:
+                        changed = True
+                        value = binary_string_to_hex(value)
+                        for position, width in identifier_columns:
+                            row[position] = value.rjust(width)
+                elif first in _VALUE:
+                    identifier_columns = columns.get(line[1:].strip())
+                    if identifier_columns is not None:
+                        changed = True
+                        value = chr(first)
+                        for position, width in identifier_columns:
+                            row[position] = value.rjust(width)
+                elif b"$comment" in line:
+                    in_comment = b"$end" not in line
+
+        if changed:
+            lines.append(" ".join([str(time)] + row))
+        return lines
+
+    def get_last_values(self, blocks, columns: dict) -> dict:
+        """Return {identifier code: last formatted value} of the signals changing in blocks."""
+        last_values = {}
+        for value, identifier_code in self._iter_changes(blocks, columns):
+            last_values[identifier_code] = value
+        return dict((identifier_code, binary_string_to_hex(value)) for identifier_code, value in last_values.items())
+
+    def _iter_changes(self, blocks, identifier_codes):
+        """Yield (raw value, identifier code) of the changes of the given signals."""
+        in_comment = False
+        for block in blocks:
+            for line in block.split(b"\n"):
+                if len(line) == 0:
+                    continue
+                if in_comment:
+                    in_comment = b"$end" not in line
+                    continue
+                first = line[0]
+                if first == _HASH:
+                    for change in line.split()[1:]:
+                        if change[1:] in identifier_codes:
+                            yield change[:1], change[1:]
+                elif first in _VECTOR_VALUE_CHANGE:
+                    value, identifier_code = line[1:].split()
+                    if identifier_code in identifier_codes:
+                        yield value, identifier_code
+                elif first in _VALUE:
+                    identifier_code = line[1:].strip()
+                    if identifier_code in identifier_codes:
+                        yield line[:1], identifier_code
+                elif b"$comment" in line:
+                    in_comment = b"$end" not in line
+
+    def tv(self, reference: str) -> tuple:
+        """
+        Return (times, values) of a selected signal. The arrays of every
+        selected signal are built on the first call.
+        """
+        if self._tvs is None:
+            self._tvs = self._build_tvs()
+        return self._tvs[self.references_to_ids[reference]]
+
+    def _build_tvs(self) -> dict:
+        tvs = dict((identifier_code, (array("q"), [])) for identifier_code in self.sizes)
+        time = 0
+        in_comment = False
+        for block in self._blocks():
+            for line in block.split(b"\n"):
+                if len(line) == 0:
+                    continue
+                if in_comment:
+                    in_comment = b"$end" not in line
+                    continue
+                first = line[0]
+                if first == _HASH:
+                    changes = line.split()
+                    time = int(changes[0][1:])
+                    changes = [(change[:1], change[1:]) for change in changes[1:]]
+                elif first in _VECTOR_VALUE_CHANGE:
+                    changes = [tuple(line[1:].split())]
+                elif first in _VALUE:
+                    changes = [(line[:1], line[1:].strip())]
+                else:
+                    in_comment = b"$comment" in line and b"$end" not in line
+                    continue
+                for value, identifier_code in changes:
+                    if identifier_code in tvs:
+                        tvs[identifier_code][0].append(time)
+                        tvs[identifier_code][1].append(value.decode("utf-8"))
+        return tvs
+
+
+# Parser of a pool worker in VCDParser.dumps_parallel, with the columns of the printed references
+_chunk_parser: VCDParser = None  # type: ignore
+_chunk_columns: dict = {}
+
+
+def _init_chunk_worker(vcd_path: str, signals: list, columns: dict, header_cache_dir: str = ""):
+    global _chunk_parser, _chunk_columns
+    _chunk_parser = VCDParser(vcd_path, signals=signals, header_cache_dir=header_cache_dir)
+    _chunk_columns = columns
+
+
+def _get_chunk_last_values(chunk: tuple) -> dict:
+    start, end = chunk
+    return _chunk_parser.get_last_values(_chunk_parser._blocks(start, end), _chunk_columns)
+
+
+def _format_chunk(chunk: tuple, start_row: list) -> str:
+    start, end = chunk
+    return "\n".join(_chunk_parser._format_rows(_chunk_parser._blocks(start, end), _chunk_columns, start_row))
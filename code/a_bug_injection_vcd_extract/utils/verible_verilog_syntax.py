@@ -14,6 +14,7 @@
 """Wrapper for ``verible-verilog-syntax --export_json``"""
 
 import collections
+import io
 import json
 import re
 import subprocess
@@ -307,6 +308,35 @@ class TokenNode(LeafNode):
     return " ".join(parts)
 
 
+class LightNode:
+  """Lightweight syntax tree node, built with the ``light_tree`` option.
+
+  Plain struct with the ``tag`` and ``children`` of a branch node, or the
+  ``tag``, ``start`` and ``end`` of a token node. There are no parent links
+  nor anytree helpers, which makes large trees much cheaper to build and
+  keep. Null nodes have no tag.
+  """
+  __slots__ = ("tag", "children", "start", "end")
+
+  def __init__(self, tag: Optional[str] = None, children: Optional[List["LightNode"]] = None,
+               start: Optional[int] = None, end: Optional[int] = None):
+    self.tag = tag
+    self.children = children if children is not None else []
+    self.start = start
+    self.end = end
+
+  @property
+  def is_token(self) -> bool:
+    return self.start is not None
+
+  def __repr__(self) -> str:
+    if self.tag is None:
+      return "null"
+    if self.is_token:
+      return f"[{self.tag}] @({self.start}-{self.end})"
+    return f"[{self.tag}]"
+
+
 class Token:
   """Token data
 
@@ -377,6 +407,25 @@ class VeribleVerilogSyntax:
   def __init__(self, executable: str = "verible-verilog-syntax"):
     self.executable = executable
 
+  @staticmethod
+  def _transform_light_tree(tree, skip_null: bool) -> Optional[LightNode]:
+    def transform(tree):
+      if tree is None:
+        return None
+      if "children" in tree:
+        children = [
+          transform(child) or LightNode()
+            for child in tree["children"]
+            if not (skip_null and child is None)
+        ]
+        return LightNode(tree["tag"], children=children)
+      return LightNode(tree["tag"], start=tree["start"], end=tree["end"])
+
+    if "children" not in tree:
+      return None
+
+    return transform(tree)
+
   @staticmethod
   def _transform_tree(tree, data: SyntaxData, skip_null: bool) -> RootNode:
     def transform(tree):
@@ -417,14 +466,19 @@ class VeribleVerilogSyntax:
     return [Error(t["line"], t["column"], t["phase"], t.get("message", None))
         for t in tokens]
 
-  def _parse(self, paths: List[str], input_: str = None,
-             options: Dict[str, Any] = None) -> Dict[str, SyntaxData]:
-    """Common implementation of parse_* methods"""
+  def _iter_parse(self, paths: List[str], input_: str = None,
+                  options: Dict[str, Any] = None) -> Iterable[tuple]:
+    """Common implementation of parse_* methods.
+
+    The JSON output is decoded one file at a time while the tool is still
+    running, so only one file's JSON and trees are held here at once.
+    """
     options = {
       "gen_tree": True,
       "skip_null": False,
       "gen_tokens": False,
       "gen_rawtokens": False,
+      "light_tree": False,
       **(options or {}),
     }
 
@@ -436,42 +490,81 @@ class VeribleVerilogSyntax:
     if options["gen_rawtokens"]:
       args.append("-printrawtokens")
 
-    proc = subprocess.run([self.executable, *args , *paths],
+    if input_ is not None:
+      # Small input from a string, feeding stdin while reading stdout would need a thread
+      proc = subprocess.run([self.executable, *args , *paths],
+          stdout=subprocess.PIPE,
+          input=input_,
+          encoding="utf-8",
+          check=False)
+      for file_path, file_json in _iter_json_members(io.StringIO(proc.stdout)):
+        yield file_path, self._transform_file(file_path, file_json, input_, options)
+      return
+
+    proc = subprocess.Popen([self.executable, *args , *paths],
         stdout=subprocess.PIPE,
-        input=input_,
-        encoding="utf-8",
-        check=False)
-
-    json_data = json.loads(proc.stdout)
-    data = {}
-    for file_path, file_json in json_data.items():
-      file_data = SyntaxData()
+        encoding="utf-8")
+    try:
+      for file_path, file_json in _iter_json_members(proc.stdout):
+        yield file_path, self._transform_file(file_path, file_json, input_, options)
+    finally:
+      proc.stdout.close()
+      if proc.poll() is None:
+        proc.kill()
+      proc.wait()
 
-      if file_path == "-":
-        file_data.source_code = input_.encode("utf-8")
+  @staticmethod
+  def _transform_file(file_path: str, file_json: Dict[str, Any], input_: str,
+                      options: Dict[str, Any]) -> SyntaxData:
+    file_data = SyntaxData()
+
+    if file_path == "-":
+      file_data.source_code = input_.encode("utf-8")
+    else:
+      with open(file_path, "rb") as f:
+        file_data.source_code = f.read()
+
+    if "tree" in file_json:
+      if options["light_tree"]:
+        file_data.tree = VeribleVerilogSyntax._transform_light_tree(
+            file_json["tree"], options["skip_null"])
       else:
-        with open(file_path, "rb") as f:
-          file_data.source_code = f.read()
-
-      if "tree" in file_json:
         file_data.tree = VeribleVerilogSyntax._transform_tree(
             file_json["tree"], file_data, options["skip_null"])
 
-      if "tokens" in file_json:
-        file_data.tokens = VeribleVerilogSyntax._transform_tokens(
-            file_json["tokens"], file_data)
+    if "tokens" in file_json:
+      file_data.tokens = VeribleVerilogSyntax._transform_tokens(
+          file_json["tokens"], file_data)
+
+    if "rawtokens" in file_json:
+      file_data.rawtokens = VeribleVerilogSyntax._transform_tokens(
+          file_json["rawtokens"], file_data)
+
+    if "errors" in file_json:
+      file_data.errors = VeribleVerilogSyntax._transform_errors(
+                         file_json["errors"])
 
-      if "rawtokens" in file_json:
-        file_data.rawtokens = VeribleVerilogSyntax._transform_tokens(
-            file_json["rawtokens"], file_data)
+    return file_data
 
-      if "errors" in file_json:
-        file_data.errors = VeribleVerilogSyntax._transform_errors(
-                           file_json["errors"])
+  def _parse(self, paths: List[str], input_: str = None,
+             options: Dict[str, Any] = None) -> Dict[str, SyntaxData]:
+    return dict(self._iter_parse(paths, input_=input_, options=options))
+
+  def iter_parse_files(self, paths: List[str], options: Dict[str, Any] = None) \
+                       -> Iterable[tuple]:
+    """Parse multiple SystemVerilog files, yielding the results file by file.
 
-      data[file_path] = file_data
+    Unlike ``parse_files``, a file's results can be dropped before the next
+    file is decoded, which keeps memory bounded on large designs.
+
+    Args:
+      paths: list of paths to files to parse.
+      options: dict with parsing options, as in ``parse_files``.
 
-    return data
+    Yields:
+      (file name, SyntaxData) tuples, in the order of the tool output.
+    """
+    yield from self._iter_parse(paths, options = options)
 
   def parse_files(self, paths: List[str], options: Dict[str, Any] = None) \
                   -> Dict[str, SyntaxData]:
@@ -485,6 +578,7 @@ class VeribleVerilogSyntax:
           skip_null (boolean): null nodes won't be stored in a tree if True.
           gen_tokens (boolean): whether to generate tokens list.
           gen_rawtokens (boolean): whether to generate raw token list.
+          light_tree (boolean): build the tree from LightNode structs.
         By default only ``gen_tree`` is True.
 
     Returns:
@@ -504,6 +598,7 @@ class VeribleVerilogSyntax:
           skip_null (boolean): null nodes won't be stored in a tree if True.
           gen_tokens (boolean): whether to generate tokens list.
           gen_rawtokens (boolean): whether to generate raw token list.
+          light_tree (boolean): build the tree from LightNode structs.
         By default only ``gen_tree`` is True.
 
     Returns:
@@ -523,9 +618,81 @@ class VeribleVerilogSyntax:
           skip_null (boolean): null nodes won't be stored in a tree if True.
           gen_tokens (boolean): whether to generate tokens list.
           gen_rawtokens (boolean): whether to generate raw token list.
+          light_tree (boolean): build the tree from LightNode structs.
         By default only ``gen_tree`` is True.
 
     Returns:
       Parsing results in SyntaxData object.
     """
     return self._parse(["-"], input_=string, options=options).get("-", None)
+
+
+def _iter_json_members(stream, read_size: int = 1 << 20) -> Iterable[tuple]:
+  """Yield the (key, value) members of the top-level JSON object of a stream.
+
+  Members are decoded as soon as they have been read in full, so only one of
+  them is in memory at a time. Concatenated top-level objects are accepted.
+  """
+  decoder = json.JSONDecoder()
+  buffer = ""
+  position = 0
+  eof = False
+  in_object = False
+
+  while True:
+    while position < len(buffer) and buffer[position] in " \t\r\n,":
+      position += 1
+    if position == len(buffer):
+      if eof:
+        if in_object:
+          raise ValueError("Unterminated JSON object in verible-verilog-syntax output")
+        return
+      data = stream.read(read_size)
+      eof = len(data) == 0
+      buffer = buffer[position:] + data
+      position = 0
+      continue
+
+    if not in_object:
+      if buffer[position] != "{":
+        raise ValueError(f"Unexpected {buffer[position]!r} in verible-verilog-syntax output")
+      in_object = True
+      position += 1
+      continue
+    if buffer[position] == "}":
+      in_object = False
+      position += 1
+      continue
+
+    try:
+      key, end = decoder.raw_decode(buffer, position)
+      while end < len(buffer) and buffer[end] in " \t\r\n":
+        end += 1
+      if end == len(buffer) or buffer[end] != ":":
+        raise json.JSONDecodeError("Expecting ':' delimiter", buffer, end)
+      end += 1
+      while end < len(buffer) and buffer[end] in " \t\r\n":
+        end += 1
+      value, end = decoder.raw_decode(buffer, end)
+      if end == len(buffer) and not eof:
+        # A number could go on in the next read
+        raise json.JSONDecodeError("Member may be truncated", buffer, end)
+    except json.JSONDecodeError:
+      if eof:
+        raise
+      # Read at least as much again as is pending, so that large members are
+      # decoded a logarithmic number of times
+      buffer = buffer[position:]
+      position = 0
+      chunks = []
+      pending = max(read_size, len(buffer))
+      while pending > 0 and not eof:
+        data = stream.read(read_size)
+        eof = len(data) == 0
+        chunks.append(data)
+        pending -= len(data)
+      buffer += "".join(chunks)
+      continue
+
+    yield key, value
+    position = end
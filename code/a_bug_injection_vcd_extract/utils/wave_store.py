@@ -0,0 +1,159 @@
+import os
+import json
+import zipfile
+
+# Compressed store of extracted signal activities, an alternative to the .txt output
+WAVE_STORE_EXTENSION = ".vcw"
+WAVE_STORE_VERSION = 1
+INDEX_NAME = "index.json"
+
+
+def _chunk_member(chunk_id: int, column: int) -> str:
+    return f"chunks/{chunk_id}/{column}"
+
+
+def _encode_changes(values: list) -> bytes:
+    """Encode the values of one column as "row value" lines, only where the value changes."""
+    changes = []
+    previous = None
+    for row, value in enumerate(values):
+        if value != previous:
+            changes.append(f"{row} {value}")
+            previous = value
+    return "\n".join(changes).encode("utf-8")
+
+
+def _decode_changes(blob: bytes, nrows: int) -> list:
+    values = [None] * nrows
+    changes = blob.decode("utf-8").split("\n") if len(blob) > 0 else []
+    for i, change in enumerate(changes):
+        row, value = change.split(" ", 1)
+        end = int(changes[i + 1].split(" ", 1)[0]) if i + 1 < len(changes) else nrows
+        values[int(row):end] = [value] * (end - int(row))
+    return values
+
+
+def write_wave_store(store_path: str, signal_activities: list, signal_list: list = [], chunk_rows: int = 1024):
+    """
+    Write the signal activities printed by vcdvcd ("time v1 v2 ..." lines) to a
+    compressed wave store.
+
+    The store is a zip file holding an index (signal names, and the first/last
+    time of every chunk) and, for every chunk of chunk_rows rows and every
+    column, the value changes of that column deflated on their own. A time
+    range or a subset of signals can then be read without decompressing the
+    rest of the store.
+
+    Args:
+        store_path (str): path of the .vcw file
+        signal_activities (list): activity lines, time first
+        signal_list (list): numbered signal list lines ("0 time", "1 tb.dut.a", ...)
+        chunk_rows (int): number of rows per chunk
+    """
+    rows = [line.split() for line in signal_activities if len(line.strip()) > 0]
+    signals = [line.split(" ", 1)[1] for line in signal_list if " " in line]
+    ncolumns = len(rows[0]) if len(rows) > 0 else len(signals)
+
+    index = {"version": WAVE_STORE_VERSION,
+             "signals": signals,
+             "columns": ncolumns,
+             "rows": len(rows),
+             "chunk_rows": chunk_rows,
+             "chunks": []}
+
+    tmp_path = f"{store_path}.tmp"
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as store:
+        for chunk_id, start in enumerate(range(0, len(rows), chunk_rows)):
+            chunk = rows[start:start + chunk_rows]
+            if any(len(row) != ncolumns for row in chunk):
+                raise ValueError(
+                    f"Rows {start} to {start + len(chunk)} of {store_path} do not have {ncolumns} columns")
+            for column in range(ncolumns):
+                store.writestr(_chunk_member(chunk_id, column),
+                               _encode_changes([row[column] for row in chunk]))
+            index["chunks"].append({"id": chunk_id,
+                                    "first_row": start,
+                                    "rows": len(chunk),
+                                    "time_min": int(chunk[0][0]),
+                                    "time_max": int(chunk[-1][0])})
+        store.writestr(INDEX_NAME, json.dumps(index))
+    os.replace(tmp_path, store_path)
+
+
+class WaveStore:
+    """
+    Reader of a .vcw wave store. Rows are returned as the same whitespace
+    separated lines as the .txt output, so that they can be loaded the same way.
+    """
+
+    def __init__(self, store_path: str):
+        self.store_path = store_path
+        self.store = zipfile.ZipFile(store_path, "r")
+        self.index = json.loads(self.store.read(INDEX_NAME))
+        if self.index["version"] != WAVE_STORE_VERSION:
+            raise ValueError(
+                f"Unsupported wave store version {self.index['version']} in {store_path}")
+        # Column of every signal name, looked up for each requested signal
+        self.signal_columns = {signal: column for column, signal in enumerate(self.signals)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.store.close()
+
+    @property
+    def signals(self) -> list:
+        return self.index["signals"]
+
+    @property
+    def row_count(self) -> int:
+        return self.index["rows"]
+
+    def _get_columns(self, signals: list = None) -> list:  # type: ignore
+        """Return the column numbers of the signals (names or numbers), time first."""
+        if signals is None:
+            return list(range(self.index["columns"]))
+        columns = [0]
+        for signal in signals:
+            column = signal if isinstance(signal, int) else self.signal_columns[signal]
+            if column != 0:
+                columns.append(column)
+        return columns
+
+    def _read_chunk(self, chunk: dict, columns: list) -> list:
+        values = [_decode_changes(self.store.read(_chunk_member(chunk["id"], column)), chunk["rows"])
+                  for column in columns]
+        return [list(row) for row in zip(*values)]
+
+    def read_rows(self,
+                  begin_time: int = None,  # type: ignore
+                  end_time: int = None,  # type: ignore
+                  signals: list = None,  # type: ignore
+                  last_rows: int = None  # type: ignore
+                  ) -> list:
+        """
+        Return the activity lines within [begin_time, end_time] for a subset of
+        signals. Only the chunks overlapping the time range are decompressed,
+        and with last_rows only the chunks needed for the last rows are.
+        """
+        columns = self._get_columns(signals)
+        chunks = [chunk for chunk in self.index["chunks"]
+                  if (begin_time is None or chunk["time_max"] >= begin_time)
+                  and (end_time is None or chunk["time_min"] <= end_time)]
+
+        rows = []
+        for chunk in reversed(chunks):
+            chunk_rows = [row for row in self._read_chunk(chunk, columns)
+                          if (begin_time is None or int(row[0]) >= begin_time)
+                          and (end_time is None or int(row[0]) <= end_time)]
+            rows = chunk_rows + rows
+            if last_rows is not None and len(rows) >= last_rows:
+                break
+
+        if last_rows is not None:
+            rows = rows[-last_rows:] if last_rows > 0 else []
+        return [" ".join(row) for row in rows]
@@ -0,0 +1,216 @@
+import re
+import difflib
+
+# Runtime selector of the woven mutants, set with +BUG_ID=k (0 or absent runs the original design)
+BUG_ID_VARIABLE = "bug_id_sel"
+BUG_ID_DECLARATION = [
+    f"  integer {BUG_ID_VARIABLE};",
+    f"  initial if (!$value$plusargs(\"BUG_ID=%d\", {BUG_ID_VARIABLE})) {BUG_ID_VARIABLE} = 0;",
+]
+
+# Single-line continuous or procedural assignment, optionally behind a case item label
+STATEMENT_RE = re.compile(
+    r"^(?P<indent>\s*)(?P<label>(?:[\w.']+\s*:\s*)?)(?P<assign>assign\s+)?"
+    r"(?P<lhs>[^=;?<>!()]+?)\s*(?P<op><=|=)\s*(?P<rhs>[^;]+);\s*(?P<comment>//.*)?$")
+LVALUE_RE = re.compile(r"[\w.$']+|\{.*\}")
+KEYWORDS = {"if", "else", "for", "while", "case", "return", "localparam", "parameter", "logic",
+            "wire", "reg", "integer", "int", "bit", "byte", "genvar", "typedef", "assert", "input",
+            "output", "inout", "var", "automatic", "static", "const", "unsigned", "signed"}
+COMMENT_ONLY_RE = re.compile(r"^\s*(//.*)?$")
+MODULE_RE = re.compile(r"\b(macro)?module\b")
+IMPORT_RE = re.compile(r"\bimport\b")
+
+
+def parse_statement(line: str):
+    """
+    Return the parts of a weavable assignment line as a dict, or None if the
+    line is anything else (declaration, condition, multi-line statement, ...).
+    """
+    match = STATEMENT_RE.match(line.rstrip("\n"))
+    if match is None:
+        return None
+    statement = match.groupdict()
+    lhs = statement["lhs"].strip()
+    if len(lhs) == 0 or lhs.split()[0] in KEYWORDS:
+        return None
+    # The left hand side must be a single lvalue, e.g. "a.b[3:0]" but not "state_e state_q"
+    if not LVALUE_RE.fullmatch(re.sub(r"\[[^\]]*\]", "", lhs).strip()):
+        return None
+    statement["lhs"] = lhs
+    statement["rhs"] = statement["rhs"].strip()
+    statement["comment"] = statement["comment"] if statement["comment"] else ""
+    return statement
+
+
+def find_module_header_ends(lines: list) -> list:
+    """
+    Return the index of the line that ends each module header, i.e. the line
+    with the ";" closing "module name #(...) (...);". The ";" of package
+    imports in the header ("module name import pkg::*; #(...) (...);") do not
+    end it.
+    """
+    header_ends = []
+    in_block_comment = False
+    in_header = False
+    in_import = False
+    depth = 0
+    for line_idx, line in enumerate(lines):
+        i = 0
+        while i < len(line):
+            if in_block_comment:
+                end = line.find("*/", i)
+                if end == -1:
+                    break
+                in_block_comment = False
+                i = end + 2
+                continue
+            if line.startswith("//", i):
+                break
+            if line.startswith("/*", i):
+                in_block_comment = True
+                i += 2
+                continue
+            if line[i] == "\"":
+                end = line.find("\"", i + 1)
+                i = len(line) if end == -1 else end + 1
+                continue
+            if not in_header:
+                match = MODULE_RE.match(line, i)
+                if match:
+                    in_header = True
+                    in_import = False
+                    depth = 0
+                    i = match.end()
+                    continue
+            else:
+                match = IMPORT_RE.match(line, i) if depth == 0 else None
+                if match:
+                    in_import = True
+                    i = match.end()
+                    continue
+                if line[i] == "(":
+                    depth += 1
+                elif line[i] == ")":
+                    depth -= 1
+                elif line[i] == ";" and depth == 0:
+                    if in_import:
+                        in_import = False
+                    else:
+                        header_ends.append(line_idx)
+                        in_header = False
+            i += 1
+    return header_ends
+
+
+def get_line_changes(original_lines: list, mutant_lines: list):
+    """
+    Return {line index: mutated line} if the mutant only replaces lines of the
+    original one for one, otherwise None.
+    """
+    changes = {}
+    matcher = difflib.SequenceMatcher(
+        None, original_lines, mutant_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if tag != "replace" or (i2 - i1) != (j2 - j1):
+            return None
+        for offset in range(i2 - i1):
+            changes[i1 + offset] = mutant_lines[j1 + offset]
+    return changes
+
+
+def is_weavable_change(original_line: str, mutated_line: str) -> bool:
+    original = parse_statement(original_line)
+    if original is None:
+        return False
+    # Removing a procedural assignment is woven as a null statement
+    if COMMENT_ONLY_RE.match(mutated_line.rstrip("\n")):
+        return original["assign"] is None
+    mutated = parse_statement(mutated_line)
+    if mutated is None or mutated["label"].strip() != original["label"].strip():
+        return False
+    if original["assign"] is not None:
+        # A continuous assignment can only select between right hand sides of the same net
+        return mutated["assign"] is not None and mutated["lhs"] == original["lhs"]
+    return mutated["assign"] is None
+
+
+def weave_line(original_line: str, variants: list) -> str:
+    """
+    Merge the mutated versions of a line into one statement that selects the
+    variant with BUG_ID_VARIABLE at runtime.
+
+    Args:
+        original_line (str): line of the original design
+        variants (list): (bug_id, mutated line) pairs
+    """
+    original = parse_statement(original_line)
+    indent, label, comment = original["indent"], original["label"], original["comment"]
+    newline = "\n" if original_line.endswith("\n") else ""
+
+    if original["assign"] is not None:
+        selection = ""
+        for bug_id, mutated_line in variants:
+            mutated = parse_statement(mutated_line)
+            selection += f"({BUG_ID_VARIABLE} == {bug_id}) ? ({mutated['rhs']}) : "
+        woven = f"{indent}{label}assign {original['lhs']} = {selection}({original['rhs']});"
+    else:
+        branches = []
+        for bug_id, mutated_line in variants:
+            mutated = parse_statement(mutated_line)
+            statement = ";" if mutated is None else f"{mutated['lhs']} {mutated['op']} {mutated['rhs']};"
+            branches.append(f"if ({BUG_ID_VARIABLE} == {bug_id}) {statement}")
+        branches.append(
+            f"{original['lhs']} {original['op']} {original['rhs']};")
+        woven = f"{indent}{label}{' else '.join(branches)}"
+
+    if len(comment) > 0:
+        woven = f"{woven} {comment}"
+    return woven + newline
+
+
+def weave_mutants(original_lines: list, mutants: list):
+    """
+    Weave several mutants of the same file into one source. Mutant k (starting
+    at 1) is active when the simulation runs with +BUG_ID=k.
+
+    Only mutants that replace single-line assignments can be woven. The others
+    are returned so that they can be simulated on their own.
+
+    Args:
+        original_lines (list): lines of the original file
+        mutants (list): (key, lines of the mutated file) pairs
+
+    Returns:
+        tuple: (woven lines or None, [(bug_id, key)] of the woven mutants, [keys] of the rejected mutants)
+    """
+    line_variants = {}
+    woven_keys = []
+    rejected_keys = []
+    for key, mutant_lines in mutants:
+        changes = get_line_changes(original_lines, mutant_lines)
+        if not changes or not all(is_weavable_change(original_lines[line_idx], mutated_line)
+                                  for line_idx, mutated_line in changes.items()):
+            rejected_keys.append(key)
+            continue
+        bug_id = len(woven_keys) + 1
+        woven_keys.append((bug_id, key))
+        for line_idx, mutated_line in changes.items():
+            line_variants.setdefault(line_idx, []).append(
+                (bug_id, mutated_line))
+
+    header_ends = find_module_header_ends(original_lines)
+    if len(woven_keys) == 0 or len(header_ends) == 0:
+        return None, [], rejected_keys + [key for _, key in woven_keys]
+
+    woven_lines = list(original_lines)
+    for line_idx, variants in line_variants.items():
+        woven_lines[line_idx] = weave_line(original_lines[line_idx], variants)
+
+    # Declare the selector right after every module header, bottom-up to keep the indices valid
+    for line_idx in reversed(header_ends):
+        woven_lines[line_idx + 1:line_idx + 1] = [
+            f"{line}\n" for line in BUG_ID_DECLARATION]
+
+    return woven_lines, woven_keys, rejected_keys
@@ -0,0 +1,85 @@
+import os
+import json
+import hashlib
+
+
+def hash_sources(source_paths: list, extensions: tuple = (".v", ".sv", ".svh", ".vh", ".f", ".core")) -> str:
+    """
+    Hash the content of a set of source files and folders. Files are visited in
+    sorted order and their relative paths are part of the hash, so two trees
+    only match if they have the same files with the same content.
+
+    Args:
+        source_paths (list): files or folders to hash
+        extensions (tuple): file extensions to include when walking folders
+
+    Returns:
+        str: sha256 hex digest of the source set
+    """
+    digest = hashlib.sha256()
+    for source_path in sorted(source_paths):
+        if os.path.isfile(source_path):
+            files = [(os.path.basename(source_path), source_path)]
+        else:
+            files = []
+            for root, dirs, filenames in os.walk(source_path):
+                dirs.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith(extensions):
+                        full_path = os.path.join(root, filename)
+                        files.append(
+                            (os.path.relpath(full_path, source_path), full_path))
+
+        for relative_path, full_path in files:
+            digest.update(relative_path.encode("utf-8"))
+            digest.update(b"\0")
+            with open(full_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            digest.update(b"\0")
+
+    return digest.hexdigest()
+
+
+class BuildCache:
+    """
+    Stamp that records which source set the build in a workspace was compiled
+    from. If the sources of the next bug hash to the same value (rerun of the
+    same bug, identical mutant, or the original design), the existing build is
+    reused and only the simulation runs.
+
+    Builds are not shared between workspaces: simulator images embed the
+    absolute paths of the workspace they were compiled in.
+    """
+
+    def __init__(self, stamp_path: str):
+        self.stamp_path = stamp_path
+
+    def load(self) -> dict:
+        if not os.path.exists(self.stamp_path):
+            return {}
+        try:
+            with open(self.stamp_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def is_valid(self, source_hash: str, build_dir: str) -> bool:
+        """Return True if build_dir holds a build of the sources hashing to source_hash."""
+        stamp = self.load()
+        return (stamp.get("source_hash") == source_hash
+                and stamp.get("build_dir") == build_dir
+                and os.path.exists(build_dir))
+
+    def record(self, source_hash: str, build_dir: str):
+        stamp_dir = os.path.dirname(self.stamp_path)
+        if stamp_dir and not os.path.exists(stamp_dir):
+            os.makedirs(stamp_dir, exist_ok=True)
+        tmp_path = f"{self.stamp_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"source_hash": source_hash, "build_dir": build_dir}, f)
+        os.replace(tmp_path, self.stamp_path)
+
+    def invalidate(self):
+        if os.path.exists(self.stamp_path):
+            os.remove(self.stamp_path)
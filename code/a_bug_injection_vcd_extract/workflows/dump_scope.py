@@ -0,0 +1,133 @@
+import os
+import re
+import shutil
+
+from vcd_extract.workflows.fsdb import get_signal_scopes
+
+
+def read_target_signals(target_signals_path: str) -> list:
+    """Return the non-empty lines of a target signals file."""
+    with open(target_signals_path, "r") as f:
+        return [line.strip() for line in f if len(line.strip()) > 0]
+
+
+def get_dump_scopes(target_signals: list) -> list:
+    """
+    Return every scope holding a target signal in dotted form, e.g.
+    "tb.dut.u_core.state_q[3:0]" -> "tb.dut.u_core". Each scope is dumped with
+    depth 1, so nested scopes are kept instead of dumping whole subtrees.
+    """
+    return [scope.lstrip("/").replace("/", ".") for scope in get_signal_scopes(target_signals, minimal=False)]
+
+
+def build_ucli_dump_script(scopes: list,
+                           dump_file: str = "waves.fsdb",
+                           depth: int = 1,
+                           begin_time: int = None,  # type: ignore
+                           end_time: int = None,  # type: ignore
+                           time_unit: str = "ns"
+                           ) -> str:
+    """
+    Return a VCS UCLI script that dumps only the given scopes to an FSDB, then
+    runs the simulation to the end. Outside of [begin_time, end_time] the dump
+    is switched off.
+
+    Args:
+        scopes (list): dotted scopes to dump
+        dump_file (str): FSDB file name, relative to the run folder
+        depth (int): levels dumped below each scope (0 for the whole subtree)
+        begin_time (int): start dumping at this time, None to dump from the start
+        end_time (int): stop dumping at this time, None to dump until the end
+        time_unit (str): unit of begin_time and end_time
+    """
+    lines = ["# Generated by the vcd_extract workflow from the target signals, do not edit",
+             f"fsdbDumpfile {{{dump_file}}}"]
+    for scope in scopes:
+        # Braces keep generate block indices away from TCL command substitution
+        lines.append(f"fsdbDumpvars {depth} {{{scope}}}")
+
+    current_time = 0
+    if begin_time is not None and begin_time > 0:
+        lines.append("fsdbDumpoff")
+        lines.append(f"run {begin_time}{time_unit}")
+        lines.append("fsdbDumpon")
+        current_time = begin_time
+    if end_time is not None and end_time > current_time:
+        lines.append(f"run {end_time - current_time}{time_unit}")
+        lines.append("fsdbDumpoff")
+
+    lines.append("run")
+    lines.append("quit")
+    return "\n".join(lines) + "\n"
+
+
+def build_dumpvars_include(scopes: list,
+                           dump_file: str = "simulate.vcd",
+                           depth: int = 1,
+                           begin_time: int = None,  # type: ignore
+                           end_time: int = None  # type: ignore
+                           ) -> str:
+    """
+    Return a Verilog snippet to `include in the testbench module in place of
+    its own $dumpfile/$dumpvars block. Times are in the testbench time unit.
+    """
+    lines = ["// Generated by the vcd_extract workflow from the target signals, do not edit",
+             "initial begin",
+             f"  $dumpfile(\"{dump_file}\");"]
+    current_time = 0
+    if begin_time is not None and begin_time > 0:
+        lines.append(f"  #{begin_time};")
+        current_time = begin_time
+    for scope in scopes:
+        lines.append(f"  $dumpvars({depth}, {scope});")
+    if len(scopes) == 0:
+        # No scope given: dump the whole design
+        lines.append("  $dumpvars;")
+    if end_time is not None and end_time > current_time:
+        lines.append(f"  #{end_time - current_time};")
+        lines.append("  $dumpoff;")
+    lines.append("end")
+    return "\n".join(lines) + "\n"
+
+
+def find_dump_include(search_path: str, include_name: str) -> str:
+    """
+    Return the first Verilog source under search_path that `includes
+    include_name, "" if none does. The testbench has to include the file
+    written by install_dump_script for the generated $dumpvars to take effect.
+    """
+    include_re = re.compile(r'^\s*`include\s+"(?:[^"]*/)?' + re.escape(include_name) + '"', re.MULTILINE)
+    for root, _, files in os.walk(search_path):
+        for name in sorted(files):
+            if not name.endswith((".v", ".sv", ".vh", ".svh")):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "r", errors="ignore") as f:
+                if include_re.search(f.read()):
+                    return path
+    return ""
+
+
+def install_dump_script(script_path: str, content: str):
+    """
+    Write a generated dump script over script_path. The file that was there
+    first is kept as <script_path>.orig so that it can be restored.
+    """
+    original_path = f"{script_path}.orig"
+    if os.path.exists(script_path) and not os.path.exists(original_path):
+        shutil.copy2(script_path, original_path)
+
+    if os.path.exists(script_path):
+        with open(script_path, "r") as f:
+            if f.read() == content:
+                return
+    with open(script_path, "w") as f:
+        f.write(content)
+
+
+def restore_dump_script(script_path: str):
+    """Put back the file replaced by install_dump_script, if any."""
+    original_path = f"{script_path}.orig"
+    if os.path.exists(original_path):
+        shutil.copy2(original_path, script_path)
+        os.remove(original_path)
@@ -2,6 +2,7 @@ import os
 import subprocess
 import multiprocessing
 import time
+import hashlib
 import signal
 
 import logging
@@ -10,10 +11,17 @@ import vcdvcd
 from contextlib import redirect_stdout
 from io import StringIO
 
-from vcd_extract.workflows.workflow_utils import find_full_path, combine_ranges, copy_file, copy_folder, check_config_overlaps
+from vcd_extract.workflows.workflow_utils import find_full_path, combine_ranges, copy_file, copy_folder, check_config_overlaps, NestablePool
+from vcd_extract.workflows.scheduler import JobScheduler, init_worker, run_worker, phase
+from vcd_extract.workflows.ledger import JobLedger, SIMULATED, EXTRACTED, FAILED
+from vcd_extract.workflows.build_cache import BuildCache, hash_sources
+from vcd_extract.utils.wave_store import write_wave_store, WAVE_STORE_EXTENSION
+from vcd_extract.utils.vcd_parser import VCDParser
+from vcd_extract.workflows.dump_scope import read_target_signals, get_dump_scopes, build_dumpvars_include, find_dump_include, install_dump_script
 
 from vcd_extract.llm.models import *
 from vcd_extract.llm.bugs.bug_insert import BugInserter
+from vcd_extract.llm.parsing.partition_store import PartitionStore
 
 import traceback
 
@@ -54,6 +62,35 @@ class FabScalar:
         self.sim_and_extract_config = sim_and_extract_config
         self.sim_timeout = self.sim_and_extract_config["sim_timeout"]
 
+        # Format of the extracted signal activities: "txt", or "vcw" for the compressed wave store
+        extract_config = self.sim_and_extract_config["extract"]
+        self.output_format = extract_config["output_format"] if "output_format" in extract_config else "txt"
+        self.wave_store_chunk_rows = extract_config["wave_store_chunk_rows"] if "wave_store_chunk_rows" in extract_config else 1024
+        # VCD parser used for extraction: "vcdvcd", or "native" for the built-in parser with the same output
+        self.vcd_parser = extract_config["vcd_parser"] if "vcd_parser" in extract_config else "vcdvcd"
+        # Worker processes of the native parser for one VCD, chunks are only split off large dumps
+        self.vcd_parser_njobs = extract_config["vcd_parser_njobs"] if "vcd_parser_njobs" in extract_config else 1
+        # Cache the signal table of the native parser, shared by all seeds with the same VCD header
+        self.vcd_header_cache = extract_config["vcd_header_cache"] if "vcd_header_cache" in extract_config else False
+        # Caches kept with the data of the run, dot folders are skipped by the data processing
+        self.vcd_header_cache_dir = f"{self.data_path}/.vcd_header_cache" if self.vcd_header_cache else ""
+        self.llm_cache_dir = f"{self.data_path}/.llm_cache"
+
+        # Skip the compile of a benchmark folder while the core sources do not change. With
+        # incremental_compile, a changed source set is recompiled without make clean first.
+        build_cache_config = self.sim_and_extract_config["build_cache"] if "build_cache" in self.sim_and_extract_config else {}
+        self.use_build_cache = build_cache_config["enabled"] if "enabled" in build_cache_config else False
+        self.incremental_compile = build_cache_config["incremental_compile"] if "incremental_compile" in build_cache_config else False
+
+        # Dump only the scopes of the target signals during simulation. The FabScalar
+        # testbench has to be changed once to include the generated $dumpvars file in
+        # place of its own $dumpfile/$dumpvars block: `include "dump_scope.vh" (the
+        # include_path name). The file is written to each benchmark folder, the
+        # directory the simulator compiles from. A run fails if no testbench includes it.
+        self.dump_scope_config = self.sim_and_extract_config["dump_scope"] if "dump_scope" in self.sim_and_extract_config else {}
+        self.dump_scope = self.dump_scope_config["enabled"] if "enabled" in self.dump_scope_config else False
+        self.dump_include_checked = set()  # design instances whose testbench includes the dump file
+
         if logger:
             self.logger = logger
         else:
@@ -66,6 +103,13 @@ class FabScalar:
         self.bug_detected = True
         self.reload_bug_inserter = False
         self.failed_to_insert_bug_names = []
+        # Ask for all the bugs of a try in batched requests (set in generate_bugs)
+        self.batch_bugs = False
+        self.partition_store: PartitionStore = None  # type: ignore
+
+        # Job ledger of the insert_and_extract campaign (set in insert_and_extract)
+        self.ledger: JobLedger = None  # type: ignore
+        self.retry_failed = False
 
     def extract_vcd(self,
                     vcd_path: str,
@@ -97,8 +141,12 @@ class FabScalar:
                 f"Extracting VCD for {current_label} in folder {folder} (rerun {rerun_index})")
             with StringIO() as buf, redirect_stdout(buf):
                 try:
-                    vcdvcd.VCDVCD(vcd_path=vcd_path, callbacks=vcdvcd_callbacks,
-                                  signals=target_signals)
+                    if self.vcd_parser == "native":
+                        with VCDParser(vcd_path, signals=target_signals, header_cache_dir=self.vcd_header_cache_dir) as parser:
+                            buf.write(parser.dumps(njobs=self.vcd_parser_njobs))
+                    else:
+                        vcdvcd.VCDVCD(vcd_path=vcd_path, callbacks=vcdvcd_callbacks,
+                                      signals=target_signals)
                 except Exception as e:
                     # Write to a file values from buf.getvalue()
                     with open(f"{self.data_path}/{current_label}/error.txt", "w") as f:
@@ -115,22 +163,27 @@ class FabScalar:
 
                 # Limit to N lines before failure
                 signal_activities = signal_activities[-line_limit:]
+                signal_list = vcdvcd_output.split("\n")[:signal_list_indices-2]
 
                 # Join the signal activities into a string
-                signal_activities = "\n".join(signal_activities)
+                final_output = "\n".join(signal_activities)
 
-                # Combine the signal list and signal activities
-                final_output = f"{signal_activities}"
-
-                # Delete the vcdvcd_output, signal_activities, and buf to save memory
-                del vcdvcd_output, signal_activities, buf
+                # Delete the vcdvcd_output and buf to save memory
+                del vcdvcd_output, buf
 
             # Write the file
             try:
-                final_output_path = f"{self.data_path}/{current_label}/{folder}_run_{rerun_index}.txt"
-                print(f"Writing to {final_output_path}")
-                with open(final_output_path, "w") as f:
-                    f.write(final_output)
+                if self.output_format == "vcw":
+                    final_output_path = f"{self.data_path}/{current_label}/{folder}_run_{rerun_index}{WAVE_STORE_EXTENSION}"
+                    print(f"Writing to {final_output_path}")
+                    write_wave_store(final_output_path, signal_activities,
+                                     signal_list=signal_list,
+                                     chunk_rows=self.wave_store_chunk_rows)
+                else:
+                    final_output_path = f"{self.data_path}/{current_label}/{folder}_run_{rerun_index}.txt"
+                    print(f"Writing to {final_output_path}")
+                    with open(final_output_path, "w") as f:
+                        f.write(final_output)
             except Exception as e:
                 print(f"Error when writing to {final_output_path}: {e}")
                 return f"Error: {e}"
@@ -141,8 +194,12 @@ class FabScalar:
 
             with StringIO() as buf, redirect_stdout(buf):
                 try:
-                    vcdvcd.VCDVCD(vcd_path=vcd_path, callbacks=vcdvcd_callbacks,
-                                  signals=target_signals)
+                    if self.vcd_parser == "native":
+                        with VCDParser(vcd_path, signals=target_signals, header_cache_dir=self.vcd_header_cache_dir) as parser:
+                            buf.write(parser.dumps(njobs=self.vcd_parser_njobs))
+                    else:
+                        vcdvcd.VCDVCD(vcd_path=vcd_path, callbacks=vcdvcd_callbacks,
+                                      signals=target_signals)
                 except Exception as e:
                     # Write to a file values from buf.getvalue()
                     with open(f"{self.data_path}/{current_label}/error.txt", "w") as f:
@@ -172,33 +229,78 @@ class FabScalar:
         # Return success message
         return f"Successfully extracted VCD for {current_label}"
 
+    def get_dump_include(self, full_design: bool = False) -> str:
+        """
+        Return the $dumpvars include for the benchmark testbenches: the scopes of
+        the target signals, or the whole design when the signal list is extracted.
+        """
+        scopes = [] if full_design else get_dump_scopes(
+            read_target_signals(self.target_signals_path))
+        return build_dumpvars_include(scopes,
+                                      depth=self.dump_scope_config["depth"] if "depth" in self.dump_scope_config else 1,
+                                      begin_time=self.dump_scope_config["begin_time"] if "begin_time" in self.dump_scope_config else None,
+                                      end_time=self.dump_scope_config["end_time"] if "end_time" in self.dump_scope_config else None)
+
     def run_sim_and_extract(self,
                             design_instance_path: str,
                             current_label: str,
                             reruns: int = 1,
                             extract_vcd_bool: bool = False,
                             extract_signal_list: bool = False,
-                            generate_bugs_worker_mode: bool = False
+                            generate_bugs_worker_mode: bool = False,
+                            ledger_key: tuple = None  # type: ignore
                             ):
 
         error = {"code": -1, "message": "Error", "failed_ip_log_path": None}
 
+        # Only run the reruns that the ledger does not have as complete
+        rerun_indices = list(range(reruns))
+        if self.ledger is not None and ledger_key is not None:
+            label, index, training = ledger_key
+            rerun_indices = self.ledger.incomplete_reruns(
+                label, index, training, self.retry_failed)
+            if len(rerun_indices) < reruns:
+                print(
+                    f"Resuming {current_label}: running reruns {rerun_indices} of {reruns}")
+
         # Create a folder for the current label
         if not os.path.exists(f"{self.data_path}/{current_label}"):
             os.makedirs(f"{self.data_path}/{current_label}")
-        else:  # Clear the folder
+        elif len(rerun_indices) == reruns:  # Clear the folder, unless completed reruns are kept
             subprocess.run(
                 f"rm -rf {self.data_path}/{current_label}/*", shell=True)
 
         # Important design paths
         sim_path = f"{design_instance_path}/simulation/benchmarks"
 
+        # Hash of the core sources, the same for every rerun and benchmark of this bug
+        source_hash = hash_sources(
+            [f"{design_instance_path}/cores/core-MDQ"]) if self.use_build_cache else ""
+
+        # The dump include is compiled into the testbench, so it is part of the build hash
+        dump_include = self.get_dump_include(
+            full_design=extract_signal_list or generate_bugs_worker_mode) if self.dump_scope else ""
+        include_path = self.dump_scope_config["include_path"] if "include_path" in self.dump_scope_config else "dump_scope.vh"
+        if len(dump_include) > 0 and design_instance_path not in self.dump_include_checked:
+            include_name = os.path.basename(include_path)
+            if len(find_dump_include(design_instance_path, include_name)) == 0:
+                error["code"] = -1
+                error["message"] = (f"dump_scope is enabled, but no testbench in {design_instance_path} includes {include_name}. "
+                                    f"Replace the $dumpfile/$dumpvars block of the testbench with `include \"{include_name}\"")
+                print(error["message"])
+                self.update_ledger(ledger_key, FAILED, message=error["message"])
+                return error
+            self.dump_include_checked.add(design_instance_path)
+        if len(dump_include) > 0 and self.use_build_cache:
+            source_hash = hashlib.sha256(
+                f"{source_hash}{dump_include}".encode("utf-8")).hexdigest()
+
         # Initialize timeout tracker
-        timeout_tracker = []
+        timeout_tracker = {}
 
-        for rerun in range(reruns):
-            timeout_tracker.append(
-                dict([(folder, False)for folder in os.listdir(sim_path)]))
+        for rerun in rerun_indices:
+            timeout_tracker[rerun] = dict(
+                [(folder, False)for folder in os.listdir(sim_path)])
             skip_extract_vcd = False
             for _, folder in enumerate(os.listdir(sim_path)):
                 folder_full_path = f"{sim_path}/{folder}"
@@ -208,6 +310,8 @@ class FabScalar:
                 except Exception as e:
                     error["code"] = -1
                     error["message"] = f"Error: {e}"
+                    self.update_ledger(ledger_key, FAILED,
+                                       rerun=rerun, message=error["message"])
                     return error
 
                 clean_cmd = f"make clean"
@@ -215,58 +319,79 @@ class FabScalar:
                 run_cmd = f"make run_nc_vcd"
                 vcd_path = f"{folder_full_path}/simulate.vcd"
 
-                # clean
-                try:
-                    subprocess.run(f"{clean_cmd}", shell=True, check=True)
-                except subprocess.CalledProcessError as e:
-                    print(f"Error during cleaning: {e}")
-                    error["code"] = -1
-                    error["message"] = f"Error during cleaning: {e}"
-                    return error
+                if len(dump_include) > 0:
+                    install_dump_script(f"{folder_full_path}/{include_path}", dump_include)
 
-                # compile
-                try:
-                    subprocess.run(f"{compile_cmd}", shell=True, check=True)
-                except subprocess.CalledProcessError as e:
-                    print(f"Error during compilation: {e}")
-                    error["code"] = -1
-                    error["message"] = f"Error during compilation: {e}"
-                    return error
+                # compile, unless this folder was already built from the same sources
+                build_cache = BuildCache(f"{folder_full_path}/.build_stamp.json")
+                if self.use_build_cache and build_cache.is_valid(source_hash, folder_full_path):
+                    print(f"Sources did not change since the last build of {folder}. Skipping compilation.")
+                else:
+                    build_cache.invalidate()
+                    with phase("compile"):
+                        # clean, unless the simulator can recompile incrementally
+                        try:
+                            if not self.incremental_compile:
+                                subprocess.run(f"{clean_cmd}", shell=True, check=True)
+                        except subprocess.CalledProcessError as e:
+                            print(f"Error during cleaning: {e}")
+                            error["code"] = -1
+                            error["message"] = f"Error during cleaning: {e}"
+                            self.update_ledger(ledger_key, FAILED,
+                                               rerun=rerun, message=error["message"])
+                            return error
+
+                        # compile
+                        try:
+                            subprocess.run(f"{compile_cmd}", shell=True, check=True)
+                        except subprocess.CalledProcessError as e:
+                            print(f"Error during compilation: {e}")
+                            error["code"] = -1
+                            error["message"] = f"Error during compilation: {e}"
+                            self.update_ledger(ledger_key, FAILED,
+                                               rerun=rerun, message=error["message"])
+                            return error
+
+                    if self.use_build_cache:
+                        build_cache.record(source_hash, folder_full_path)
 
                 # simulate
-                start_time = time.time()
-                p = subprocess.Popen(
-                    run_cmd, shell=True, preexec_fn=os.setpgrp)
+                with phase("simulate"):
+                    start_time = time.time()
+                    p = subprocess.Popen(
+                        run_cmd, shell=True, preexec_fn=os.setpgrp)
+
+                    try:
+                        while p.poll() is None:
+                            time.sleep(0.1)
+                            if time.time() - start_time > self.sim_timeout:
+                                print(
+                                    f"Process {p.pid} exceeded timeout. Killing it...")
+                                timeout_tracker[rerun][folder] = True
+                                # kill the child process and its children
+                                os.killpg(os.getpgid(p.pid), signal.SIGTERM)
+                                if os.path.exists(vcd_path):  # remove the vcd file
+                                    os.remove(vcd_path)
+                                # exit out of the loop
+                                break
+
+                    except KeyboardInterrupt:
+                        print("KeyboardInterrupt detected. Killing process...")
+                        os.killpg(os.getpgid(p.pid), signal.SIGTERM)
+                        return
+
+                    # sleep for another 10 seconds
+                    time.sleep(10)
+
+                    # Check if p is still running
+                    if p.poll() is None:
+                        print(f"Process {p.pid} is still running. Killing it...")
+                        os.killpg(os.getpgid(p.pid), signal.SIGKILL)
+                        timeout_tracker[rerun][folder] = True
+                    else:
+                        print(f"Process {p.pid} completed successfully.")
 
-                try:
-                    while p.poll() is None:
-                        time.sleep(0.1)
-                        if time.time() - start_time > self.sim_timeout:
-                            print(
-                                f"Process {p.pid} exceeded timeout. Killing it...")
-                            timeout_tracker[rerun][folder] = True
-                            # kill the child process and its children
-                            os.killpg(os.getpgid(p.pid), signal.SIGTERM)
-                            if os.path.exists(vcd_path):  # remove the vcd file
-                                os.remove(vcd_path)
-                            # exit out of the loop
-                            break
-
-                except KeyboardInterrupt:
-                    print("KeyboardInterrupt detected. Killing process...")
-                    os.killpg(os.getpgid(p.pid), signal.SIGTERM)
-                    return
-
-                # sleep for another 10 seconds
-                time.sleep(10)
-
-                # Check if p is still running
-                if p.poll() is None:
-                    print(f"Process {p.pid} is still running. Killing it...")
-                    os.killpg(os.getpgid(p.pid), signal.SIGKILL)
-                    timeout_tracker[rerun][folder] = True
-                else:
-                    print(f"Process {p.pid} completed successfully.")
+                self.update_ledger(ledger_key, SIMULATED, rerun=rerun)
 
                 if self.verbose:
                     print(
@@ -295,18 +420,28 @@ class FabScalar:
                             f"Verified extraction from {current_label} does not cause any errors. Skipping extraction for the rest of the folders.")
                 elif not generate_bugs_worker_mode and timeout_tracker[rerun][folder] == False:
                     print("Extracting VCD for the purpose of insert and extract")
-                    msg = self.extract_vcd(vcd_path=vcd_path, current_label=current_label,
-                                           folder=folder, rerun_index=rerun, line_limit=line_limit, extract_vcd_bool=extract_vcd_bool)
+                    with phase("extract", input_path=vcd_path):
+                        msg = self.extract_vcd(vcd_path=vcd_path, current_label=current_label,
+                                               folder=folder, rerun_index=rerun, line_limit=line_limit, extract_vcd_bool=extract_vcd_bool)
                 if os.path.exists(vcd_path):
                     os.remove(vcd_path)
                     if self.verbose:
                         print(f"Removed {vcd_path}")
 
+            # Complete once an output file was written, a rerun where every benchmark timed out has no data
+            output_paths = [f"{self.data_path}/{current_label}/{folder}_run_{rerun}{extension}"
+                            for folder in timeout_tracker[rerun] for extension in [".txt", WAVE_STORE_EXTENSION]]
+            if any(os.path.exists(output_path) for output_path in output_paths):
+                self.update_ledger(ledger_key, EXTRACTED, rerun=rerun)
+            else:
+                self.update_ledger(ledger_key, FAILED, rerun=rerun,
+                                   message=f"No output extracted, {len([v for v in timeout_tracker[rerun].values() if v])} of {len(timeout_tracker[rerun])} benchmarks timed out")
+
         try:
             total_trackers = sum([len(timeout_tracker[i])
-                                 for i in range(reruns)])
+                                 for i in timeout_tracker])
             total_timeouts = sum(
-                [len([v for v in timeout_tracker[i].values() if v == True]) for i in range(reruns)])
+                [len([v for v in timeout_tracker[i].values() if v == True]) for i in timeout_tracker])
         except Exception as e:
             error["code"] = -4
             error["message"] = f"Error calculating timeouts: {e}"
@@ -316,9 +451,9 @@ class FabScalar:
             error["code"] = -2
             error["message"] = f"Bug not detected for {current_label}"
         # return -3 means some folders have timed out -> bug might not be detected
-        elif (total_trackers - total_timeouts) < self.acceptance_threshold * reruns:
+        elif (total_trackers - total_timeouts) < self.acceptance_threshold * len(timeout_tracker):
             print(
-                f"Warning: {total_timeouts} out of {total_trackers} folders timed out. Bug might not be detected for {current_label}. The threshold is {self.acceptance_threshold} * {reruns} = {self.acceptance_threshold * reruns}")
+                f"Warning: {total_timeouts} out of {total_trackers} folders timed out. Bug might not be detected for {current_label}. The threshold is {self.acceptance_threshold} * {len(timeout_tracker)} = {self.acceptance_threshold * len(timeout_tracker)}")
 
             error["code"] = -3
             error["message"] = f"Bug might not be detected for {current_label}"
@@ -327,6 +462,14 @@ class FabScalar:
             error["message"] = f"Simulation completed successfully for {current_label}"
         return error
 
+    def update_ledger(self, ledger_key: tuple, state: str, rerun: int = None, message: str = ""):  # type: ignore
+        """Record the state of a (label, index, training) setting if a ledger is in use."""
+        if self.ledger is None or ledger_key is None:
+            return
+        label, index, training = ledger_key
+        self.ledger.set_state(label, index, training, state,
+                              rerun=rerun, message=message)
+
     def generator(self,
                   design_file,
                   output_dir,
@@ -347,6 +490,25 @@ class FabScalar:
             self.reload_bug_inserter = False
 
         design_extension = design_file.split('.')[-1]
+        if self.batch_bugs:
+            # A batch may insert fewer bugs than asked, the caller undoes and logs only those
+            num_changes = len(self.bug_inserter.prev_mut_region)
+            try:
+                outpath = str(os.path.join(
+                    output_dir, design_name + f".{design_extension}"))
+                _, mutation_descs = self.bug_inserter.insert_bugs_batch(
+                    num_bugs, out_file=outpath)
+                for i, mutation_desc in enumerate(mutation_descs):
+                    print(f"-- Inserted bug {i+1}/{num_bugs} -> {mutation_desc}")
+            except Exception as e:
+                print(f"Bug Generation Error: {e}")
+                traceback.print_exc()
+                # Roll back the bugs applied before the error, the mutated file was not written
+                for _ in range(len(self.bug_inserter.prev_mut_region) - num_changes):
+                    self.bug_inserter.undo_mutation()
+                return 0
+            return len(mutation_descs)
+
         for i in range(num_bugs):
             try:
                 outpath = str(os.path.join(
@@ -358,6 +520,7 @@ class FabScalar:
                 print(f"Bug Generation Error: {e}")
                 traceback.print_exc()
                 continue
+        return num_bugs
 
     def generate_bugs_worker(self, label: str,
                              area_config: dict,
@@ -371,7 +534,8 @@ class FabScalar:
         llm_dir_path = f"{self.root_path}/vcd_extract/llm"
         prompt_dir = f"{llm_dir_path}/prompts"
         self.bug_inserter = BugInserter(
-            self.gpt, prompt_dir, debug=True, clear_cache=clear_bug_inserter_cache)
+            self.gpt, prompt_dir, debug=True, clear_cache=clear_bug_inserter_cache,
+            partition_store=self.partition_store)
 
         # Original instance path
         original_instance_path = f"{self.root_path}/designs/{self.design_name}"
@@ -467,13 +631,18 @@ class FabScalar:
                 # Generate bugs with LLMs
                 # Take the current_bug_filepath and add mutations to it
                 print(f"Try {curr_try+1} for {current_label}.")
-                bug_gen_results = self.generator(
+                num_inserted = self.generator(
                     design_file=current_bug_filepath,
                     output_dir=bugdb_label_path,
                     num_bugs=num_bugs_per_try,
                     model="gpt",
                     debug=self.verbose)
 
+                if num_inserted == 0:
+                    print(f"No bug inserted for {current_label}")
+                    curr_try += 1
+                    continue
+
                 # Put the mutated file in the design instance path
                 copy_file(source_file=current_bug_filepath,
                           target_file=instance_filepath)
@@ -507,7 +676,7 @@ class FabScalar:
                             msg = f"Error for {current_label}. Error message: {result_message}"
                     else:
                         msg = f"Error for {current_label}. Error message: {result_message}"
-                    for _ in range(num_bugs_per_try):
+                    for _ in range(num_inserted):
                         self.bug_inserter.undo_mutation()
                 elif result_code == 0:  # simulation completed successfully
                     self.bug_detected = True
@@ -601,12 +770,14 @@ class FabScalar:
             return
 
         # Put the mutated file in the design instance path
-        copy_file(source_file=current_bug_filepath,
-                  target_file=instance_filepath)
+        with phase("inject"):
+            copy_file(source_file=current_bug_filepath,
+                      target_file=instance_filepath)
 
         # Run simulation
         result = self.run_sim_and_extract(design_instance_path=design_instance_path,
-                                          current_label=current_label, reruns=reruns, extract_vcd_bool=True, extract_signal_list=extract_signal_list)
+                                          current_label=current_label, reruns=reruns, extract_vcd_bool=True, extract_signal_list=extract_signal_list,
+                                          ledger_key=(label, index, training))
 
         if result is not None:
             result_code = result["code"]
@@ -654,11 +825,31 @@ class FabScalar:
         num_retries = generate_bugs_config["retry"]
         overwrite = generate_bugs_config["overwrite"]
         clear_bug_inserter_cache = generate_bugs_config["clear_bug_inserter_cache"]
+        # Module partitions are split by the LLM once, then shared across workers and campaigns
+        partition_store = generate_bugs_config["partition_store"] if "partition_store" in generate_bugs_config else False
+        partition_store_dir = generate_bugs_config["partition_store_dir"] if "partition_store_dir" in generate_bugs_config else ""
+        if partition_store:
+            self.partition_store = PartitionStore(partition_store_dir or f"{self.root_path}/.partition_store")
         bugs = generate_bugs_config["bugs"]
 
-        # initialize gpt and bug inserter
-        self.gpt = GPT(model_id="gpt-4o-mini")
-        self.gpt.initialize()
+        # initialize gpt and bug inserter, independent requests run concurrently within the request limits
+        llm_max_concurrency = generate_bugs_config["llm_max_concurrency"] if "llm_max_concurrency" in generate_bugs_config else 4
+        llm_requests_per_minute = generate_bugs_config["llm_requests_per_minute"] if "llm_requests_per_minute" in generate_bugs_config else 0
+        # Responses to repeated prompts (module splitting, region labels) are reused across runs
+        llm_cache = generate_bugs_config["llm_cache"] if "llm_cache" in generate_bugs_config else False
+        llm_cache_max_mb = generate_bugs_config["llm_cache_max_mb"] if "llm_cache_max_mb" in generate_bugs_config else 256
+        response_cache = ResponseCache(f"{self.llm_cache_dir}/responses.db", max_mb=llm_cache_max_mb) if llm_cache else None
+        # "mock" answers offline with MockLLM, to benchmark bug generation without API calls
+        llm_backend = generate_bugs_config["llm_backend"] if "llm_backend" in generate_bugs_config else "gpt"
+        mock_llm_latency = generate_bugs_config["mock_llm_latency"] if "mock_llm_latency" in generate_bugs_config else 0.0
+        self.batch_bugs = generate_bugs_config["batch_bugs"] if "batch_bugs" in generate_bugs_config else False
+        if llm_backend == "mock":
+            gpt = MockLLM(latency=mock_llm_latency)
+        else:
+            gpt = GPT(model_id="gpt-4o-mini", cache=response_cache)
+        gpt.initialize()
+        self.gpt = AsyncLLM(gpt, max_concurrency=llm_max_concurrency,
+                            requests_per_minute=llm_requests_per_minute)
 
         for label, areas_config in bugs.items():
             # check if the training ranges in the area config overlap, if so, raise an error
@@ -673,7 +864,18 @@ class FabScalar:
                     label, area_config, num_retries, num_bugs_per_try, overwrite, clear_bug_inserter_cache)
 
     def insert_and_extract(self, insert_bugs_config: dict):
-        worker_pool = multiprocessing.Pool(self.njobs)
+        # Ledger of every rerun, used to skip completed work when resuming
+        resume = insert_bugs_config["resume"] if "resume" in insert_bugs_config else False
+        self.retry_failed = insert_bugs_config["retry_failed"] if "retry_failed" in insert_bugs_config else False
+        self.ledger = JobLedger(f"{self.data_path}/job_ledger.db")
+        if not resume:
+            self.ledger.clear()
+
+        # Every phase of every job goes through one scheduler shared by all workers
+        scheduler_config = self.sim_and_extract_config["scheduler"] if "scheduler" in self.sim_and_extract_config else {}
+        scheduler = JobScheduler.from_config(scheduler_config, self.njobs)
+        worker_pool = NestablePool(self.njobs, initializer=init_worker,
+                                   initargs=(self, scheduler))
         bugs = insert_bugs_config["bugs"]
         for label, areas_config in bugs.items():
             # check if the training ranges in the area config overlap, if so, raise an error
@@ -701,6 +903,18 @@ class FabScalar:
                 print(training_settings)
                 print(testing_settings)
                 combined_settings = training_settings + testing_settings
+
+                # Only schedule the settings that still have incomplete reruns
+                for _, _, index, training in combined_settings:
+                    reruns = area_config["training_reruns"] if training else area_config["testing_reruns"]
+                    self.ledger.register(label, index, training, reruns)
+                num_settings = len(combined_settings)
+                combined_settings = [setting for setting in combined_settings
+                                     if not self.ledger.is_complete(label, setting[2], setting[3], self.retry_failed)]
+                if resume and len(combined_settings) < num_settings:
+                    print(
+                        f"Resuming {label}: skipping {num_settings - len(combined_settings)} completed settings")
+
                 if len(combined_settings) == 0:
                     print(
                         f"No training or testing ranges found for {label}. Skipping...")
@@ -713,12 +927,14 @@ class FabScalar:
                     if setting == last_setting:
                         setting = tuple(setting + [True])
                         worker_pool.apply_async(
-                            self.insert_and_extract_worker, setting)
+                            run_worker, ("insert_and_extract_worker",) + setting)
                     else:
                         setting = tuple(setting + [False])
                         worker_pool.apply_async(
-                            self.insert_and_extract_worker, setting)
+                            run_worker, ("insert_and_extract_worker",) + setting)
 
         # Wait for worker to finish
         worker_pool.close()
         worker_pool.join()
+
+        print(f"Job ledger: {self.ledger.summary()}")
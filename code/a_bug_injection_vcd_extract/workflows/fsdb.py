@@ -0,0 +1,155 @@
+import os
+import re
+import json
+import shlex
+import subprocess
+
+
+def parse_fsdb_summary(summary_text: str) -> dict:
+    """
+    Parse the output of "fsdb2vcd <fsdb> -summary".
+
+    Example lines:
+        scale unit              : 100ps
+        min xtag                : (0 0)
+        max xtag                : (0 40964)
+
+    Returns:
+        dict: scale_unit ("100ps"), unit ("ps"), time_tag_min and time_tag_max
+    """
+    summary = {"scale_unit": None, "unit": None,
+               "time_tag_min": 0, "time_tag_max": None}
+    for line in summary_text.split("\n"):
+        if "scale unit" in line:
+            summary["scale_unit"] = line.split(":")[-1].strip()
+            # Get the last two characters of the scale unit
+            summary["unit"] = summary["scale_unit"][-2:]
+        elif "max xtag" in line or "min xtag" in line:
+            # get the last number of the xtag pair, e.g. (0 40964) -> 40964
+            time_tag = int(line.split(":")[-1].strip().split(" ")[-1].replace(")", ""))
+            summary["time_tag_max" if "max xtag" in line else "time_tag_min"] = time_tag
+
+    if summary["unit"] is None or summary["time_tag_max"] is None:
+        raise ValueError(f"Could not parse fsdb2vcd summary: {summary_text}")
+    return summary
+
+
+def get_fsdb_summary(fsdb_path: str, verbose: bool = False) -> dict:
+    """
+    Return the parsed summary of an FSDB file. The summary is cached next to
+    the FSDB and reused as long as the file size and modification time match.
+    """
+    stat = os.stat(fsdb_path)
+    cache_path = f"{fsdb_path}.summary.json"
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r") as f:
+                cache = json.load(f)
+            if cache["size"] == stat.st_size and cache["mtime"] == stat.st_mtime:
+                return cache["summary"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    fsdb_summary = subprocess.run(
+        [f"fsdb2vcd {fsdb_path} -summary"], shell=True, check=True, capture_output=True)
+    summary_text = fsdb_summary.stderr.decode("utf-8")
+    if verbose:
+        print(summary_text)
+    summary = parse_fsdb_summary(summary_text)
+
+    try:
+        with open(cache_path, "w") as f:
+            json.dump({"size": stat.st_size, "mtime": stat.st_mtime,
+                      "summary": summary}, f)
+    except OSError as e:
+        print(f"Could not cache the summary of {fsdb_path}: {e}")
+    return summary
+
+
+def get_time_window(summary: dict,
+                    time_tag_before_failure_percent: float,
+                    time_tag_before_failure_min: int,
+                    time_tag_before_failure_max: int) -> tuple:
+    """
+    Return the (begin, end) time tags of the window before the failure, i.e.
+    the last time_tag_before_failure_percent of the simulation, clamped by the
+    min and max window sizes.
+    """
+    time_tag_max = summary["time_tag_max"]
+    time_tag_interval = int(
+        time_tag_max * time_tag_before_failure_percent / 100)
+    time_tag_start = time_tag_max - time_tag_interval
+
+    if time_tag_interval < time_tag_before_failure_min:
+        begin_time_tag = 0
+    elif time_tag_interval < time_tag_before_failure_max:
+        begin_time_tag = time_tag_start
+    else:
+        begin_time_tag = time_tag_max - time_tag_before_failure_max
+
+    return begin_time_tag, time_tag_max
+
+
+def get_signal_scopes(target_signals: list, separator: str = "/", minimal: bool = True) -> list:
+    """
+    Return the smallest set of scopes that contains every target signal, e.g.
+    "tb.dut.u_core.state_q[3:0]" -> "/tb/dut/u_core". Scopes nested inside
+    another scope of the set are dropped, unless minimal is False.
+    """
+    scopes = set()
+    for signal in target_signals:
+        # Drop the bit range and the signal name
+        reference = re.sub(r"\[[^\]]*\]$", "", signal.strip())
+        if len(reference) == 0 or "." not in reference:
+            continue
+        scopes.add(reference.rsplit(".", 1)[0])
+
+    minimal_scopes = []
+    for scope in sorted(scopes):
+        if not minimal or not any(scope.startswith(f"{parent}.") for parent in minimal_scopes):
+            minimal_scopes.append(scope)
+
+    return [separator + scope.replace(".", separator) for scope in minimal_scopes]
+
+
+def build_fsdb2vcd_cmd(fsdb_path: str,
+                       vcd_path: str,
+                       summary: dict,
+                       begin_time_tag: int,
+                       end_time_tag: int = None,  # type: ignore
+                       scaling_adjustment: int = 1,
+                       scopes: list = [],
+                       scope_flag: str = "-s"
+                       ) -> str:
+    """Return the fsdb2vcd command converting only the given window and scopes."""
+    unit = summary["unit"]
+    fsdb2vcd_cmd = f"fsdb2vcd {fsdb_path} -o {vcd_path} -bt {begin_time_tag * scaling_adjustment}{unit}"
+    if end_time_tag is not None:
+        fsdb2vcd_cmd = f"{fsdb2vcd_cmd} -et {end_time_tag * scaling_adjustment}{unit}"
+    for scope in scopes:
+        # Generate block scopes contain brackets, keep them away from the shell
+        fsdb2vcd_cmd = f"{fsdb2vcd_cmd} {scope_flag} {shlex.quote(scope)}"
+    return fsdb2vcd_cmd
+
+
+def release_fifo_reader(converter: subprocess.Popen, fifo_path: str, extraction_done, poll_interval: float = 0.5):
+    """
+    Watchdog for a converter writing into a FIFO. Once the converter has exited,
+    open and close the FIFO for writing until the extraction is done: a reader
+    still blocked in open() (e.g. fsdb2vcd failed before opening its output)
+    then sees an empty stream instead of hanging forever.
+
+    Args:
+        converter (subprocess.Popen): process writing into the FIFO
+        fifo_path (str): path of the FIFO
+        extraction_done (threading.Event): set by the reader when it is finished
+    """
+    converter.wait()
+    while not extraction_done.is_set():
+        try:
+            fd = os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+            os.close(fd)
+        except OSError:
+            # No reader yet, or the FIFO is already gone
+            pass
+        extraction_done.wait(poll_interval)
@@ -0,0 +1,104 @@
+import os
+import time
+import sqlite3
+from contextlib import closing
+
+# Job states, in the order a job goes through them
+PENDING = "pending"
+SIMULATED = "simulated"
+EXTRACTED = "extracted"
+FAILED = "failed"
+
+STATES = [PENDING, SIMULATED, EXTRACTED, FAILED]
+
+
+class JobLedger:
+    """
+    Durable record of the state of every (label, index, training, rerun) job of
+    an insert_and_extract campaign, kept in an SQLite database so that an
+    interrupted campaign can be restarted with only the unfinished work.
+
+    The ledger only stores the database path and opens a short-lived
+    connection for every operation, so it can be handed to pool workers and
+    updated from several processes at once.
+    """
+
+    def __init__(self, db_path: str, timeout: float = 60.0):
+        self.db_path = db_path
+        self.timeout = timeout
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    label TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    training INTEGER NOT NULL,
+                    rerun INTEGER NOT NULL,
+                    state TEXT NOT NULL,
+                    message TEXT,
+                    updated REAL,
+                    PRIMARY KEY (label, idx, training, rerun)
+                )""")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        # WAL lets workers read while another one is writing
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def register(self, label: str, index: int, training: bool, reruns: int):
+        """Add the reruns of a setting as pending. Existing rows keep their state."""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(label, index, int(training), rerun, PENDING, "", now) for rerun in range(reruns)])
+
+    def set_state(self, label: str, index: int, training: bool, state: str, rerun: int = None, message: str = ""):
+        """
+        Update the state of one rerun of a setting, or of all its reruns if rerun is None.
+        """
+        assert state in STATES, f"Unknown job state {state}"
+        query = "UPDATE jobs SET state = ?, message = ?, updated = ? WHERE label = ? AND idx = ? AND training = ?"
+        params = [state, message, time.time(), label, index, int(training)]
+        if rerun is not None:
+            query += " AND rerun = ?"
+            params.append(rerun)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(query, params)
+
+    def get_states(self, label: str, index: int, training: bool) -> dict:
+        """Return {rerun: state} for a setting."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT rerun, state FROM jobs WHERE label = ? AND idx = ? AND training = ?",
+                (label, index, int(training))).fetchall()
+        return dict(rows)
+
+    def incomplete_reruns(self, label: str, index: int, training: bool, retry_failed: bool = False) -> list:
+        """
+        Return the reruns of a setting that still have to run. Failed reruns are
+        final unless retry_failed is set.
+        """
+        done_states = [EXTRACTED] if retry_failed else [EXTRACTED, FAILED]
+        return sorted(rerun for rerun, state in self.get_states(label, index, training).items()
+                      if state not in done_states)
+
+    def is_complete(self, label: str, index: int, training: bool, retry_failed: bool = False) -> bool:
+        return len(self.incomplete_reruns(label, index, training, retry_failed)) == 0
+
+    def clear(self):
+        """Forget every job, e.g. when a campaign is restarted from scratch."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM jobs")
+
+    def summary(self) -> dict:
+        """Return {state: number of jobs}."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
@@ -2,6 +2,7 @@ import os
 import subprocess
 import multiprocessing
 import time
+import threading
 from datetime import datetime
 import signal
 
@@ -11,10 +12,20 @@ import vcdvcd
 from contextlib import redirect_stdout
 from io import StringIO
 
-from vcd_extract.workflows.workflow_utils import ROI, find_full_path, combine_ranges, copy_file, copy_folder, check_config_overlaps, get_next_available_path
+from vcd_extract.workflows.workflow_utils import ROI, find_full_path, combine_ranges, copy_file, copy_folder, check_config_overlaps, get_next_available_path, has_extracted_output
+from vcd_extract.workflows.workflow_utils import NestablePool
+from vcd_extract.workflows.scheduler import JobScheduler, init_worker, run_worker, get_scheduler, phase, combined_phase
+from vcd_extract.workflows.ledger import JobLedger, SIMULATED, EXTRACTED, FAILED
+from vcd_extract.workflows.build_cache import BuildCache, hash_sources
+from vcd_extract.workflows.bug_weaver import weave_mutants
+from vcd_extract.workflows.fsdb import get_fsdb_summary, get_time_window, get_signal_scopes, build_fsdb2vcd_cmd, release_fifo_reader
+from vcd_extract.utils.wave_store import write_wave_store, WAVE_STORE_EXTENSION
+from vcd_extract.utils.vcd_parser import VCDParser
+from vcd_extract.workflows.dump_scope import read_target_signals, get_dump_scopes, build_ucli_dump_script, install_dump_script, restore_dump_script
 
 from vcd_extract.llm.models import *
 from vcd_extract.llm.bugs.bug_insert import BugInserter
+from vcd_extract.llm.parsing.partition_store import PartitionStore
 from vcd_extract.evaluation import MutationLogger, MutationRecord
 
 import traceback
@@ -60,12 +71,40 @@ class OpenTitan:
         self.print_interval = self.sim_and_extract_config["print_interval"]
         self.additional_flags = self.sim_and_extract_config["additional_flags"]
 
+        # Format of the extracted signal activities: "txt", or "vcw" for the compressed wave store
+        extract_config = self.sim_and_extract_config["extract"]
+        self.output_format = extract_config["output_format"] if "output_format" in extract_config else "txt"
+        self.wave_store_chunk_rows = extract_config["wave_store_chunk_rows"] if "wave_store_chunk_rows" in extract_config else 1024
+        # VCD parser used for extraction: "vcdvcd", or "native" for the built-in parser with the same output
+        self.vcd_parser = extract_config["vcd_parser"] if "vcd_parser" in extract_config else "vcdvcd"
+        # Worker processes of the native parser for one VCD, chunks are only split off large dumps
+        self.vcd_parser_njobs = extract_config["vcd_parser_njobs"] if "vcd_parser_njobs" in extract_config else 1
+        # Cache the signal table of the native parser, shared by all seeds with the same VCD header
+        self.vcd_header_cache = extract_config["vcd_header_cache"] if "vcd_header_cache" in extract_config else False
+
+        # Compile and simulate separately, and reuse the build of a workspace while its sources do not change
+        self.split_build_and_run = self.sim_and_extract_config["split_build_and_run"] if "split_build_and_run" in self.sim_and_extract_config else False
+        build_cache_config = self.sim_and_extract_config["build_cache"] if "build_cache" in self.sim_and_extract_config else {}
+        self.use_build_cache = self.split_build_and_run and (
+            build_cache_config["enabled"] if "enabled" in build_cache_config else False)
+        # Extra build options for incremental compile, {cache_dir} is replaced by the workspace cache folder
+        self.incremental_build_opts = build_cache_config["incremental_build_opts"] if "incremental_build_opts" in build_cache_config else ""
+
+        # Dump only the scopes of the target signals during simulation. The UCLI script
+        # generated from the target signals replaces the run script of the workspace.
+        self.dump_scope_config = self.sim_and_extract_config["dump_scope"] if "dump_scope" in self.sim_and_extract_config else {}
+        self.dump_scope = self.dump_scope_config["enabled"] if "enabled" in self.dump_scope_config else False
+
         # Append the ip_name to data_path, bugdb_path, and target_signals_path
         self.data_path = f"{self.data_path}/{self.ip_name}"
         self.bugdb_path = f"{self.bugdb_path}/{self.ip_name}"
         self.target_signals_path = self.target_signals_path.replace(
             "target_signals", f"{self.ip_name}/target_signals")
 
+        # Caches kept with the data of the run, dot folders are skipped by the data processing
+        self.vcd_header_cache_dir = f"{self.data_path}/.vcd_header_cache" if self.vcd_header_cache else ""
+        self.llm_cache_dir = f"{self.data_path}/.llm_cache"
+
         if logger:
             self.logger = logger
         else:
@@ -74,6 +113,17 @@ class OpenTitan:
 
         # Generate GPT and BugInserter objects
         self.gpt = None
+        # LLM request limits and number of areas generated in parallel (set in generate_bugs)
+        self.llm_max_concurrency = 4
+        self.llm_requests_per_minute = 0
+        self.area_njobs = 1
+        self.llm_cache: ResponseCache = None  # type: ignore
+        # "mock" answers offline with MockLLM, to benchmark bug generation without API calls
+        self.llm_backend = "gpt"
+        self.mock_llm_latency = 0.0
+        # Ask for all the bugs of a try in batched requests (set in generate_bugs)
+        self.batch_bugs = False
+        self.partition_store: PartitionStore = None  # type: ignore
         self.bug_inserter = None
         self.bug_detected = True
         self.reload_bug_inserter = False
@@ -84,6 +134,9 @@ class OpenTitan:
         self.num_mutations = 0
         self.num_bug_scenarios = 0
 
+        # Job ledger of the insert_and_extract campaign (set in insert_and_extract)
+        self.ledger: JobLedger = None  # type: ignore
+
         mutation_log_file = get_next_available_path(
             f'data/{design_name}/bugs_{design_name}_{self.ip_name}.csv')
         self.mutation_logger = MutationLogger(
@@ -113,68 +166,60 @@ class OpenTitan:
         except Exception as e:
             return f"Error when opening and reading {self.target_signals_path}: {e}"
 
-        if extract_vcd_bool:
-            with StringIO() as buf, redirect_stdout(buf):
-                try:
+        # Parse the VCD once for both the signal activities and the signal list, so
+        # that it can also be read from a pipe (see stream_vcd)
+        with StringIO() as buf, redirect_stdout(buf):
+            try:
+                if self.vcd_parser == "native":
+                    with VCDParser(vcd_path, signals=target_signals, header_cache_dir=self.vcd_header_cache_dir) as parser:
+                        buf.write(parser.dumps(njobs=self.vcd_parser_njobs))
+                else:
                     vcdvcd.VCDVCD(vcd_path=vcd_path, callbacks=vcdvcd_callbacks,
                                   signals=target_signals)
-                except Exception as e:
-                    # Write to a file values from buf.getvalue()
-                    with open(f"{self.data_path}/{current_label}/error.txt", "w") as f:
-                        f.write(buf.getvalue())
-                    return f"Error: {e}. This bug causes an exception in the VCD extraction process, likely due to a mismatch between the target signals and the VCD file. Generate a different bug."
-                vcdvcd_output = buf.getvalue()
-                # split the output into two parts: the signal list and the signal activities (capture N events before failure)
-                # signal list is printed before =================, capture the entire signal list
-                signal_list_indices = [i for i, s in enumerate(
-                    vcdvcd_output.split("\n")) if "========" in s][0]
-
-                signal_activities = vcdvcd_output.split(
-                    "\n")[signal_list_indices+1:][:-1]
-
-                # Limit to N lines before failure
-                signal_activities = signal_activities[-line_limit:]
-
-                # Join the signal activities into a string
-                signal_activities = "\n".join(signal_activities)
+            except Exception as e:
+                # Write to a file values from buf.getvalue()
+                with open(f"{self.data_path}/{current_label}/error.txt", "w") as f:
+                    f.write(buf.getvalue())
+                return f"Error: {e}. This bug causes an exception in the VCD extraction process, likely due to a mismatch between the target signals and the VCD file. Generate a different bug."
+            vcdvcd_output = buf.getvalue().split("\n")
+            del buf
+
+        # split the output into two parts: the signal list and the signal activities (capture N events before failure)
+        # signal list is printed before =================, capture the entire signal list
+        signal_list_indices = [i for i, s in enumerate(
+            vcdvcd_output) if "========" in s][0]
 
-                # Combine the signal list and signal activities
-                final_output = f"{signal_activities}"
+        if extract_vcd_bool:
+            signal_activities = vcdvcd_output[signal_list_indices+1:][:-1]
 
-                # Delete the vcdvcd_output, signal_activities, and buf to save memory
-                del vcdvcd_output, signal_activities, buf
+            # Limit to N lines before failure
+            signal_activities = signal_activities[-line_limit:]
 
             # Write the file
             try:
-                final_output_path = f"{self.data_path}/{current_label}/{os.path.basename(vcd_path).replace('.vcd', '.txt')}"
-                print(f"Writing to {final_output_path}")
-                with open(final_output_path, "w") as f:
-                    f.write(final_output)
+                if self.output_format == "vcw":
+                    final_output_path = f"{self.data_path}/{current_label}/{os.path.basename(vcd_path).replace('.vcd', WAVE_STORE_EXTENSION)}"
+                    print(f"Writing to {final_output_path}")
+                    write_wave_store(final_output_path, signal_activities,
+                                     signal_list=vcdvcd_output[:signal_list_indices-2],
+                                     chunk_rows=self.wave_store_chunk_rows)
+                else:
+                    # Join the signal activities into a string
+                    final_output = "\n".join(signal_activities)
+                    final_output_path = f"{self.data_path}/{current_label}/{os.path.basename(vcd_path).replace('.vcd', '.txt')}"
+                    print(f"Writing to {final_output_path}")
+                    with open(final_output_path, "w") as f:
+                        f.write(final_output)
             except Exception as e:
                 return f"Error when extracting VCD, at final writing to file step: {e}"
 
-        if len(numbered_signal_list_path) > 0 or not extract_vcd_bool:
-            with StringIO() as buf, redirect_stdout(buf):
-                try:
-                    vcdvcd.VCDVCD(vcd_path=vcd_path, callbacks=vcdvcd_callbacks,
-                                  signals=target_signals)
-                except Exception as e:
-                    # Write to a file values from buf.getvalue()
-                    with open(f"{self.data_path}/{current_label}/error.txt", "w") as f:
-                        f.write(buf.getvalue())
-                    return f"Error: {e}. This bug causes an exception in the VCD extraction process, likely due to a mismatch between the target signals and the VCD file. Generate a different bug."
-                vcdvcd_output = buf.getvalue()
-                # split the output into two parts: the signal list and the signal activities (capture N events before failure)
-                # signal list is printed before =================, capture the entire signal list
-                signal_list_indices = [i for i, s in enumerate(
-                    vcdvcd_output.split("\n")) if "========" in s][0]
-
-                # Export the signal list to a file
-                with open(numbered_signal_list_path, "w") as f:
-                    f.write("\n".join(vcdvcd_output.split(
-                        "\n")[:signal_list_indices-2]))
-
-                del vcdvcd_output, buf
+        if len(numbered_signal_list_path) > 0:
+            # Export the signal list to a file
+            with open(numbered_signal_list_path, "w") as f:
+                f.write("\n".join(vcdvcd_output[:signal_list_indices-2]))
+
+        # Delete the vcdvcd_output to save memory
+        del vcdvcd_output
 
         # Delete the vcd file to save space
         os.remove(vcd_path)
@@ -182,13 +227,189 @@ class OpenTitan:
         # Return success message
         return "Successfully extracted VCD for {current_label}"
 
+    def convert_and_extract_folder(self,
+                                   failed_ip_log_path: str,
+                                   folder: str,
+                                   current_label: str,
+                                   extract_vcd_bool: bool = False,
+                                   extract_signal_list: bool = False
+                                   ):
+        """
+        Convert the fsdb of one failing seed to VCD and extract it. Each seed
+        only touches its own folder, so seeds of the same run can be handled
+        by separate processes.
+
+        Returns:
+            str: message from extract_vcd, or None if the folder has no waves
+        """
+        # Get fsdb and log files for the failed folder
+        fsdb_path = f"{failed_ip_log_path}/{folder}/waves.fsdb"
+        log_path = f"{failed_ip_log_path}/{folder}/run.log"
+
+        # Get test name
+        test_name = f"{folder.split('.')[0]}.{folder.split('.')[1]}"
+
+        # Rename fsdb file to replace waves.fsdb with test name
+        new_fsdb_path = fsdb_path.replace(
+            "waves.fsdb", f"{test_name}.fsdb")
+        os.rename(fsdb_path, new_fsdb_path)
+        fsdb_path = new_fsdb_path
+
+        # Extract settings
+        extract_config = self.sim_and_extract_config["extract"]
+        time_tag_before_failure_percent = extract_config["time_tag_before_failure_percent"]
+        time_tag_before_failure_min = extract_config["time_tag_before_failure_min"]
+        time_tag_before_failure_max = extract_config["time_tag_before_failure_max"]
+        scaling_adjustment = extract_config["scaling_adjustment"]
+        line_limit = extract_config["line_limit"]
+
+        if not os.path.exists(fsdb_path):
+            return None
+
+        vcd_path = fsdb_path.replace(".fsdb", ".vcd")
+
+        # Only convert the window before the failure and, optionally, the scopes of the target signals
+        convert_end_time = extract_config["convert_end_time"] if "convert_end_time" in extract_config else True
+        restrict_scopes = extract_config["restrict_scopes"] if "restrict_scopes" in extract_config else False
+        scope_flag = extract_config["scope_flag"] if "scope_flag" in extract_config else "-s"
+        scopes = []
+        # The signal list is exported from the whole design, so its conversion keeps every scope
+        if restrict_scopes and not extract_signal_list and os.path.exists(self.target_signals_path):
+            with open(self.target_signals_path, "r") as f:
+                scopes = get_signal_scopes(f.read().splitlines())
+
+        # Let fsdb2vcd write into a FIFO that extract_vcd reads while it is produced
+        stream_vcd = extract_config["stream_vcd"] if "stream_vcd" in extract_config else False
+        # Expected VCD size per MB of FSDB, the streamed VCD is never on disk to be measured
+        stream_vcd_size_ratio = extract_config["stream_vcd_size_ratio"] if "stream_vcd_size_ratio" in extract_config else 10
+        if extract_signal_list:
+            self.target_signal_path = f"{'/'.join(self.target_signals_path.split('/')[:-1])}/target_signals_all.txt"
+            numbered_signal_list_path = f"{'/'.join(self.target_signal_path.split('/')[:-1])}/numbered_signal_list.txt"
+        else:
+            numbered_signal_list_path = ""
+
+        if stream_vcd:
+            # Conversion and extraction overlap, so the job holds both phases with one memory reservation
+            fsdb_size_mb = os.path.getsize(fsdb_path) / (1024 * 1024)
+            with combined_phase({"convert": fsdb_size_mb, "extract": fsdb_size_mb * stream_vcd_size_ratio}):
+                fsdb_summary = get_fsdb_summary(fsdb_path, verbose=self.verbose)
+                begin_time_tag, end_time_tag = get_time_window(fsdb_summary,
+                                                               time_tag_before_failure_percent,
+                                                               time_tag_before_failure_min,
+                                                               time_tag_before_failure_max)
+                fsdb2vcd_cmd = build_fsdb2vcd_cmd(fsdb_path=fsdb_path,
+                                                  vcd_path=vcd_path,
+                                                  summary=fsdb_summary,
+                                                  begin_time_tag=begin_time_tag,
+                                                  end_time_tag=end_time_tag if convert_end_time else None,
+                                                  scaling_adjustment=scaling_adjustment,
+                                                  scopes=scopes,
+                                                  scope_flag=scope_flag)
+
+                if os.path.exists(vcd_path):
+                    os.remove(vcd_path)
+                os.mkfifo(vcd_path)
+
+                if self.verbose:
+                    print(f"Streaming VCD: {fsdb2vcd_cmd}")
+                converter = subprocess.Popen([fsdb2vcd_cmd], shell=True)
+                extraction_done = threading.Event()
+                watchdog = threading.Thread(target=release_fifo_reader,
+                                            args=(converter, vcd_path, extraction_done), daemon=True)
+                watchdog.start()
+                try:
+                    msg = self.extract_vcd(vcd_path=vcd_path,
+                                           current_label=current_label,
+                                           line_limit=line_limit,
+                                           extract_vcd_bool=extract_vcd_bool,
+                                           numbered_signal_list_path=numbered_signal_list_path)
+                finally:
+                    extraction_done.set()
+                    # The converter exits on its own once the reader closed the FIFO
+                    converter.wait()
+                    if os.path.exists(vcd_path):
+                        os.remove(vcd_path)
+
+            return msg
+
+        # Conversion and extraction are separate scheduler phases with their own slots
+        with phase("convert", input_path=fsdb_path):
+            # The parsed summary is cached next to the fsdb
+            fsdb_summary = get_fsdb_summary(fsdb_path, verbose=self.verbose)
+            begin_time_tag, end_time_tag = get_time_window(fsdb_summary,
+                                                           time_tag_before_failure_percent,
+                                                           time_tag_before_failure_min,
+                                                           time_tag_before_failure_max)
+
+            fsdb2vcd_cmd = build_fsdb2vcd_cmd(fsdb_path=fsdb_path,
+                                              vcd_path=vcd_path,
+                                              summary=fsdb_summary,
+                                              begin_time_tag=begin_time_tag,
+                                              end_time_tag=end_time_tag if convert_end_time else None,
+                                              scaling_adjustment=scaling_adjustment,
+                                              scopes=scopes,
+                                              scope_flag=scope_flag)
+
+            if self.verbose:
+                print(f"Extracting VCD: {fsdb2vcd_cmd}")
+            subprocess.run([fsdb2vcd_cmd], shell=True)
+
+        with phase("extract", input_path=vcd_path):
+            msg = self.extract_vcd(vcd_path=vcd_path,
+                                   current_label=current_label,
+                                   line_limit=line_limit,
+                                   extract_vcd_bool=extract_vcd_bool,
+                                   numbered_signal_list_path=numbered_signal_list_path)
+
+        return msg
+
+    def prepare_dump_scope(self, design_instance_path: str, full_design: bool = False):
+        """
+        Install the UCLI dump script generated from the target signals in the
+        workspace, or put back the original run script to dump the full design.
+        """
+        tcl_path = self.dump_scope_config["tcl_path"] if "tcl_path" in self.dump_scope_config else "hw/dv/tools/sim.tcl"
+        script_path = f"{design_instance_path}/{tcl_path}"
+        if not self.dump_scope or full_design:
+            restore_dump_script(script_path)
+            return
+
+        scopes = get_dump_scopes(read_target_signals(self.target_signals_path))
+        script = build_ucli_dump_script(scopes,
+                                        depth=self.dump_scope_config["depth"] if "depth" in self.dump_scope_config else 1,
+                                        begin_time=self.dump_scope_config["begin_time"] if "begin_time" in self.dump_scope_config else None,
+                                        end_time=self.dump_scope_config["end_time"] if "end_time" in self.dump_scope_config else None,
+                                        time_unit=self.dump_scope_config["time_unit"] if "time_unit" in self.dump_scope_config else "ns")
+        install_dump_script(script_path, script)
+        if self.verbose:
+            print(f"Dumping {len(scopes)} scopes of the target signals with {script_path}")
+
+    def run_dvsim(self, cmd: str):
+        if self.verbose:
+            print(f"Running simulation: {cmd}")
+        # Start the subprocess in a new process group
+        p = subprocess.Popen(
+            cmd,
+            shell=True,
+            preexec_fn=os.setsid  # Start new process group
+        )
+        try:
+            while p.poll() is None:
+                time.sleep(0.1)
+        except KeyboardInterrupt:
+            print("Interrupted. Killing process group...")
+            os.killpg(os.getpgid(p.pid), signal.SIGKILL)
+            raise
+
     def run_sim_and_extract(self,
                             design_instance_path: str,
                             current_label: str,
                             reruns: int = 1,
                             extract_vcd_bool: bool = False,
                             extract_signal_list: bool = False,
-                            generate_bugs_worker_mode: bool = False
+                            generate_bugs_worker_mode: bool = False,
+                            ledger_key: tuple = None,  # type: ignore
+                            extra_run_opts: str = ""
                             ):
 
         error = {"code": -1, "message": "Error", "failed_ip_log_path": None}
@@ -225,7 +446,8 @@ class OpenTitan:
 
             if self.verbose:
                 print(f"Running simulation: {quick_run_cmd}")
-            subprocess.run([quick_run_cmd], shell=True)
+            with phase("simulate"):
+                subprocess.run([quick_run_cmd], shell=True)
 
         # Find log folder name that contains ip_name in the logs_path
         try:
@@ -249,7 +471,8 @@ class OpenTitan:
 
             if self.verbose:
                 print(f"Running simulation: {quick_run_cmd}")
-            subprocess.run([quick_run_cmd], shell=True, check=True)
+            with phase("simulate"):
+                subprocess.run([quick_run_cmd], shell=True, check=True)
 
             # Try to find the log folder again
             try:
@@ -266,25 +489,50 @@ class OpenTitan:
                 error["message"] = f"Error: {e}"
                 return error
 
+        # Dump the whole design when the signal list is extracted, only the target scopes otherwise
+        try:
+            self.prepare_dump_scope(design_instance_path,
+                                    full_design=extract_signal_list or generate_bugs_worker_mode)
+        except Exception as e:
+            error["code"] = -1
+            error["message"] = f"Error when preparing the dump script: {e}"
+            return error
+
         # Run simulation
-        sim_cmd = f"{sim_path} {hjson_path} --proj-root {design_instance_path} -i {self.test_list_name} --reseed {reruns} --waves fsdb --print-interval {self.print_interval} --run-opts +UVM_MAX_QUIT_COUNT={self.nfailures_before_stop} {self.additional_flags}"
+        sim_cmd = f"{sim_path} {hjson_path} --proj-root {design_instance_path} -i {self.test_list_name} --reseed {reruns} --waves fsdb --print-interval {self.print_interval} --run-opts +UVM_MAX_QUIT_COUNT={self.nfailures_before_stop} {extra_run_opts} {self.additional_flags}"
 
-        if self.verbose:
-            print(f"Running simulation: {sim_cmd}")
+        # Build of this workspace, and the hash of the sources it was compiled from
+        build_cache_path = f"{design_instance_path}/build_cache"
+        build_cache = BuildCache(f"{build_cache_path}/stamp.json")
+        build_dir = f"{os.path.dirname(failed_ip_log_path)}/default" if failed_ip_log_path is not None else ""
+        source_hash = hash_sources(
+            [f"{design_instance_path}/hw/ip/{self.ip_name}/rtl"]) if self.use_build_cache else ""
+
+        build_cmd = f"{sim_cmd} --build-only"
+        if len(self.incremental_build_opts) > 0:
+            build_cmd = f"{build_cmd} --build-opts {self.incremental_build_opts.format(cache_dir=build_cache_path)}"
+
+        # Compile and simulate as separate scheduler phases so that compile slots
+        # are not tied up by long simulations (and vice versa)
         try:
-            # Start the subprocess in a new process group
-            p = subprocess.Popen(
-                sim_cmd,
-                shell=True,
-                preexec_fn=os.setsid  # Start new process group
-            )
-            try:
-                while p.poll() is None:
-                    time.sleep(0.1)
-            except KeyboardInterrupt:
-                print("Interrupted. Killing process group...")
-                os.killpg(os.getpgid(p.pid), signal.SIGKILL)
-                raise
+            if self.split_build_and_run:
+                if self.use_build_cache and build_cache.is_valid(source_hash, build_dir):
+                    print(f"Sources of {current_label} did not change since the last build. Reusing {build_dir}")
+                else:
+                    build_cache.invalidate()
+                    with phase("compile"):
+                        self.run_dvsim(build_cmd)
+                    if self.use_build_cache and not os.path.exists(f"{failed_ip_log_path}/default"):
+                        build_cache.record(source_hash, build_dir)
+                # Do not run the tests on top of a failed build
+                if failed_ip_log_path is not None and os.path.exists(f"{failed_ip_log_path}/default"):
+                    print(f"Build failed for {current_label}. Skipping simulation.")
+                else:
+                    with phase("simulate"):
+                        self.run_dvsim(f"{sim_cmd} --run-only")
+            else:
+                with phase("simulate"):
+                    self.run_dvsim(sim_cmd)
 
         except Exception as e:
             error["code"] = -1
@@ -296,100 +544,89 @@ class OpenTitan:
         error["message"] = "Simulation completed successfully"
         error["failed_ip_log_path"] = failed_ip_log_path
 
-        # if extract_vcd_bool:
-        for folder in os.listdir(failed_ip_log_path):
-            try:
-                # Get fsdb and log files for each failed folder
-                fsdb_path = f"{failed_ip_log_path}/{folder}/waves.fsdb"
-                log_path = f"{failed_ip_log_path}/{folder}/run.log"
-
-                # Get test name
-                test_name = f"{folder.split('.')[0]}.{folder.split('.')[1]}"
-
-                # Rename fsdb file to replace waves.fsdb with test name
-                new_fsdb_path = fsdb_path.replace(
-                    "waves.fsdb", f"{test_name}.fsdb")
-                os.rename(fsdb_path, new_fsdb_path)
-                fsdb_path = new_fsdb_path
-
-                # Extract settings
-                extract_config = self.sim_and_extract_config["extract"]
-                time_tag_before_failure_percent = extract_config["time_tag_before_failure_percent"]
-                time_tag_before_failure_min = extract_config["time_tag_before_failure_min"]
-                time_tag_before_failure_max = extract_config["time_tag_before_failure_max"]
-                scaling_adjustment = extract_config["scaling_adjustment"]
-                line_limit = extract_config["line_limit"]
-
-                if os.path.exists(fsdb_path):
-                    fsdb2vcd_summary_cmd = f"fsdb2vcd {fsdb_path} -summary"
-                    fsdb2vcd_cmd = f"fsdb2vcd {fsdb_path} -o {fsdb_path.replace('.fsdb', '.vcd')}"
-
-                    fsdb_summary = subprocess.run(
-                        [fsdb2vcd_summary_cmd], shell=True, check=True, capture_output=True)
-                    print(fsdb_summary.stderr.decode("utf-8"))
-
-                    # get line from stderr that contains "scale unit"
-                    scale_unit = [line for line in fsdb_summary.stderr.decode(
-                        "utf-8").split("\n") if "scale unit" in line][0]
-                    # Get the last two characters of the scale unit
-                    # example: scale unit              : 100ps then scale_unit = "ps"
-                    unit = scale_unit.split(":")[-1].strip()[-2:]
-
-                    # get line from stderr that contains "nmax xtag"
-                    nmax_xtag = [line for line in fsdb_summary.stderr.decode(
-                        "utf-8").split("\n") if "max xtag" in line][0]
-                    # get the max interval
-                    # example: max xtag		: (0 40964) then time_tag_max = 40964
-                    time_tag_max = int(nmax_xtag.split(
-                        ":")[-1].strip().split(" ")[-1].replace(")", ""))
-                    time_tag_interval = int(
-                        time_tag_max * time_tag_before_failure_percent / 100)
-                    time_tag_start = time_tag_max - time_tag_interval
-
-                    if time_tag_interval < time_tag_before_failure_min:
-                        final_interval = 0
-                    elif time_tag_interval < time_tag_before_failure_max:
-                        final_interval = time_tag_start
-                    else:
-                        final_interval = time_tag_max - time_tag_before_failure_max
-
-                    fsdb2vcd_cmd = f"{fsdb2vcd_cmd} -bt {final_interval * scaling_adjustment}{unit}"
+        # dvsim runs all reruns (seeds) of a setting at once
+        self.update_ledger(ledger_key, SIMULATED)
 
-                    if self.verbose:
-                        print(f"Extracting VCD: {fsdb2vcd_cmd}")
-                    subprocess.run([fsdb2vcd_cmd], shell=True)
+        # Extract settings
+        extract_config = self.sim_and_extract_config["extract"]
+        extract_njobs = extract_config["extract_njobs"] if "extract_njobs" in extract_config else 1
 
-                    vcd_path = fsdb_path.replace(".fsdb", ".vcd")
+        failed_folders = os.listdir(failed_ip_log_path)
 
-                    if extract_signal_list or generate_bugs_worker_mode:  # if we want to extract the signal list
-                        self.target_signal_path = f"{'/'.join(self.target_signals_path.split('/')[:-1])}/target_signals_all.txt"
-                        msg = self.extract_vcd(vcd_path=vcd_path,
-                                               current_label=current_label,
-                                               line_limit=line_limit,
-                                               extract_vcd_bool=extract_vcd_bool,
-                                               numbered_signal_list_path=f"{'/'.join(self.target_signal_path.split('/')[:-1])}/numbered_signal_list.txt")
+        # The signal list only needs to be extracted once, so keep it serial
+        if extract_signal_list or generate_bugs_worker_mode or extract_njobs <= 1 or len(failed_folders) <= 1:
+            for folder in failed_folders:
+                try:
+                    msg = self.convert_and_extract_folder(failed_ip_log_path=failed_ip_log_path,
+                                                          folder=folder,
+                                                          current_label=current_label,
+                                                          extract_vcd_bool=extract_vcd_bool,
+                                                          extract_signal_list=extract_signal_list or generate_bugs_worker_mode)
+                    if msg is None:
+                        continue
+
+                    if extract_signal_list or generate_bugs_worker_mode:
                         # exit the for loop since we only want to extract the signal list once
                         break
 
-                    else:  # if we want to do traditional vcd extraction
-                        msg = self.extract_vcd(vcd_path=vcd_path,
-                                               current_label=current_label,
-                                               line_limit=line_limit,
-                                               extract_vcd_bool=extract_vcd_bool)
-
                     if "error" in msg.lower():
                         error["code"] = -2
                         error["message"] = msg
                         return error
 
+                except Exception as e:
+                    print(f"Error: {e}")
+                    error["code"] = -2
+                    error["message"] = f"Error: {e}"
+                    return error
+
+            return error
+
+        # Convert and extract all failing seeds of this run concurrently
+        if self.verbose:
+            print(f"Extracting {len(failed_folders)} failed seeds with {min(extract_njobs, len(failed_folders))} jobs")
+        extract_pool = NestablePool(min(extract_njobs, len(failed_folders)),
+                                    initializer=init_worker, initargs=(self, get_scheduler()))
+        async_results = []
+        for folder in failed_folders:
+            async_results.append(extract_pool.apply_async(
+                run_worker, ("convert_and_extract_folder", failed_ip_log_path, folder, current_label, extract_vcd_bool)))
+        extract_pool.close()
+        extract_pool.join()
+
+        for folder, async_result in zip(failed_folders, async_results):
+            try:
+                msg = async_result.get()
             except Exception as e:
                 print(f"Error: {e}")
                 error["code"] = -2
                 error["message"] = f"Error: {e}"
-                return error
+                continue
+
+            if msg is not None and "error" in msg.lower():
+                print(f"Extraction failed for {folder}: {msg}")
+                error["code"] = -2
+                error["message"] = msg
 
         return error
 
+    def clean_ip_logs(self, failed_ip_log_path: str):
+        """Remove the logs of the last simulation. The build is kept when the build cache is used."""
+        if self.use_build_cache and failed_ip_log_path is not None:
+            ip_log_path = os.path.dirname(failed_ip_log_path)
+            subprocess.run(
+                f"find {ip_log_path} -mindepth 1 -maxdepth 1 ! -name default -exec rm -rf {{}} +", shell=True)
+        else:
+            subprocess.run(f"rm -rf {failed_ip_log_path}/../*", shell=True)
+
+    def update_ledger(self, ledger_key: tuple, state: str, rerun: int = None, message: str = ""):  # type: ignore
+        """Record the state of a (label, index, training) setting if a ledger is in use."""
+        if self.ledger is None or ledger_key is None:
+            return
+        label, index, training = ledger_key
+        self.ledger.set_state(label, index, training, state,
+                              rerun=rerun, message=message)
+
     def generator(self,
                   design_file,
                   output_dir,
@@ -410,6 +647,34 @@ class OpenTitan:
             self.reload_bug_inserter = False
 
         design_extension = design_file.split(".")[-1]
+        if self.batch_bugs:
+            # A batch may insert fewer bugs than asked, the caller undoes and logs only those
+            num_changes = len(self.bug_inserter.prev_mut_region)
+            try:
+                outpath = str(os.path.join(
+                    output_dir, design_name + f'.{design_extension}'))
+                _, mutation_descs = self.bug_inserter.insert_bugs_batch(
+                    num_bugs, out_file=outpath, mut_recs=self.current_bug)
+
+                for i, mutation_desc in enumerate(mutation_descs):
+                    mut_rec = self.current_bug[i]
+                    mut_rec.module_path = design_name
+                    for roi in self.rois:
+                        if roi.includes(mut_rec.line_number):
+                            mut_rec.in_roi = True
+                            mut_rec.roi_id = roi.id
+                            mut_rec.roi_size_lines = roi.length()
+
+                    print(f'-- Inserted bug {i+1}/{num_bugs} -> {mutation_desc}')
+            except Exception as e:
+                print(f"Bug Generation Error: {e}")
+                traceback.print_exc()
+                # Roll back the bugs applied before the error, the mutated file was not written
+                for _ in range(len(self.bug_inserter.prev_mut_region) - num_changes):
+                    self.bug_inserter.undo_mutation()
+                return 0
+            return len(mutation_descs)
+
         for i in range(num_bugs):
             try:
                 mut_rec = self.current_bug[i]
@@ -430,6 +695,7 @@ class OpenTitan:
                 print(f"Bug Generation Error: {e}")
                 traceback.print_exc()
                 continue
+        return num_bugs
 
     def generate_bugs_worker(self, label: str,
                              area_config: dict,
@@ -438,13 +704,24 @@ class OpenTitan:
                              overwrite=True,
                              clear_bug_inserter_cache=False):
         print('we are here')
-        # Hardcoded worker index for now
-        worker_index = 1
+        if self.area_njobs > 1:
+            # Areas are generated in parallel, each worker has its own design instance
+            process_name = multiprocessing.current_process().name
+            worker_index = process_name.split("-")[-1]
+            if self.gpt is None:
+                # The workers share the request rate
+                self.init_llm_model(requests_per_minute_share=self.area_njobs)
+                # save_to_csv rewrites the whole log, so every worker keeps its own
+                self.mutation_logger = MutationLogger(
+                    self.mutation_logger.get_worker_log_path(worker_index))
+        else:
+            worker_index = 1
 
         llm_dir_path = f"{self.root_path}/vcd_extract/llm"
         prompt_dir = f"{llm_dir_path}/prompts"
         self.bug_inserter = BugInserter(
-            self.gpt, prompt_dir, debug=True, clear_cache=clear_bug_inserter_cache)
+            self.gpt, prompt_dir, debug=True, clear_cache=clear_bug_inserter_cache,
+            partition_store=self.partition_store)
 
         # Original instance path
         original_instance_path = f"{self.root_path}/designs/{self.design_name}"
@@ -587,7 +864,7 @@ class OpenTitan:
                 # Generate bugs with LLMs
                 # Take the current_bug_filepath and add mutations to it
                 print(f"Try {curr_try+1} for {current_label}.")
-                bug_gen_results = self.generator(
+                num_inserted = self.generator(
                     design_file=current_bug_filepath,
                     output_dir=bugdb_label_path,
                     num_bugs=num_bugs_per_try,
@@ -595,6 +872,13 @@ class OpenTitan:
                     model="gpt",
                     debug=self.verbose)
 
+                if num_inserted == 0:
+                    print(f"No bug inserted for {current_label}")
+                    for mutation in self.current_bug:
+                        mutation.num_retries += 1
+                    curr_try += 1
+                    continue
+
                 val_t0 = time.time()
                 # Put the mutated file in the design instance path
                 copy_file(source_file=current_bug_filepath,
@@ -656,7 +940,7 @@ class OpenTitan:
                     elif len(os.listdir(failed_ip_log_path)) < self.acceptance_threshold or not os.path.exists(failed_ip_log_path):
                         print(f"Bug not detected for {current_label}")
                     else:
-                        for mutation in self.current_bug:
+                        for mutation in self.current_bug[:num_inserted]:
                             mutation.validation_passed = True
                             mutation.mutation_applied_successfully = curr_try == 0
                         self.bug_detected = True
@@ -671,14 +955,15 @@ class OpenTitan:
 
                 if not self.bug_detected:
                     print('Failed to detect bug. Rolling back mutation')
-                    for i in range(num_bugs_per_try):
+                    for _ in range(num_inserted):
                         self.bug_inserter.undo_mutation()
-                        self.current_bug[i].validation_passed = False
-                        self.current_bug[i].mutation_applied_successfully = False
-                        self.current_bug[i].num_retries += 1
+                    for mutation in self.current_bug:
+                        mutation.validation_passed = False
+                        mutation.mutation_applied_successfully = False
+                        mutation.num_retries += 1
 
                 # Remove failed_ip_log_path
-                subprocess.run(f"rm -rf {failed_ip_log_path}/../*", shell=True)
+                self.clean_ip_logs(failed_ip_log_path)
                 curr_try += 1
 
             # If bug not detected by the end, delete the current_bug_filepath and record the bug name to failed_to_insert_bug_names
@@ -690,7 +975,8 @@ class OpenTitan:
                 self.current_bug.clear()
 
             else:
-                for mutation in self.current_bug:
+                # Records past the bugs of the last try were not filled, or hold the bugs of an undone try
+                for mutation in self.current_bug[:num_inserted]:
                     mutation.validation_passed = True
                     mutation.timestamp_final_success = datetime.now()
                     self.mutation_logger.log_mutation(mutation)
@@ -709,8 +995,17 @@ class OpenTitan:
                                   area_config: dict,
                                   index: int,
                                   training: bool = True,
-                                  extract_signal_list: bool = False
+                                  extract_signal_list: bool = False,
+                                  bug_id: int = 0
                                   ):
+        """
+        Simulate one bug and extract its VCDs. With bug_id > 0, the workspace
+        already holds a woven source (see insert_and_extract_batch_worker) and
+        the bug is selected with +BUG_ID instead of being copied in.
+
+        Returns:
+            str: compile_error, syntax_error, not_detected or detected (None if skipped)
+        """
         # Get the worker index
         process_name = multiprocessing.current_process().name
         print(f"Process name: {process_name}")
@@ -767,13 +1062,18 @@ class OpenTitan:
             return
 
         # Inject bugs
-        copy_file(source_file=current_bug_filepath,
-                  target_file=instance_filepath)
+        if bug_id == 0:
+            with phase("inject"):
+                copy_file(source_file=current_bug_filepath,
+                          target_file=instance_filepath)
 
         # Run simulation
+        ledger_key = (label, index, training)
         result = self.run_sim_and_extract(design_instance_path=design_instance_path,
                                           current_label=current_label, reruns=reruns, extract_vcd_bool=True,
-                                          extract_signal_list=extract_signal_list
+                                          extract_signal_list=extract_signal_list,
+                                          ledger_key=ledger_key,
+                                          extra_run_opts=f"+BUG_ID={bug_id}" if bug_id > 0 else ""
                                           )
 
         if result is not None:
@@ -787,14 +1087,17 @@ class OpenTitan:
             print(f"Error: Simulation result is None for {current_label}")
 
         # Check result
+        status = None
         if result_code == -1:  # compilation error
             print(f"Compilation error for {current_label}")
+            status = "compile_error"
         elif isinstance(result, dict):
             failed_ip_log_path = result["failed_ip_log_path"]
             # If there is only default folder in the failed_ip_log_path
             if len(os.listdir(failed_ip_log_path)) == 1 and "default" in os.listdir(failed_ip_log_path):
                 print(
                     f"Syntax error for current iteration of {current_label}")
+                status = "syntax_error"
                 # Find the build.log in failed_ip_log_path
                 build_log_path = find_full_path(
                     root_path=f"{failed_ip_log_path}/default", filename="build.log")
@@ -809,33 +1112,159 @@ class OpenTitan:
                             break
             elif len(os.listdir(failed_ip_log_path)) < self.acceptance_threshold or not os.path.exists(failed_ip_log_path):
                 print(f"Bug not detected for {current_label}")
+                status = "not_detected"
             else:
                 print(f"Bug detected for {current_label}")
+                status = "detected"
+
+        # Only a detected bug with an extracted output file is complete, anything else is run again on resume
+        if status == "detected" and has_extracted_output(f"{self.data_path}/{current_label}", [".txt", WAVE_STORE_EXTENSION]):
+            self.update_ledger(ledger_key, EXTRACTED)
+        elif result is None:
+            self.update_ledger(ledger_key, FAILED, message="Simulation result is None")
+        elif result["code"] != 0:
+            self.update_ledger(ledger_key, FAILED, message=result["message"])
+        else:
+            self.update_ledger(ledger_key, FAILED,
+                               message=f"No extracted output ({status if status else 'unknown status'})")
 
         # Wait a 10 seconds for clean up between runs
         time.sleep(10)
 
         # Replace the file with the original file to remove the injected bugs
-        copy_file(source_file=original_filepath,
-                  target_file=instance_filepath)
+        # (a woven source is restored by the batch worker once all its bugs ran)
+        if bug_id == 0:
+            copy_file(source_file=original_filepath,
+                      target_file=instance_filepath)
 
         # Wait a 10 seconds for clean up between runs
         time.sleep(10)
 
         # Remove failed_ip_log_path
-        subprocess.run(f"rm -rf {failed_ip_log_path}/../*", shell=True)
+        self.clean_ip_logs(failed_ip_log_path)
+
+        return status
+
+    def insert_and_extract_batch_worker(self,
+                                        label: str,
+                                        area_config: dict,
+                                        settings: list,
+                                        extract_signal_list: bool = False
+                                        ):
+        """
+        Weave the mutants of several settings of the same file into one source
+        where +BUG_ID=k selects mutant k at runtime. The build cache then compiles
+        the woven source once and every bug only costs a simulation.
+
+        Mutants that cannot be woven, and all remaining ones if the woven build
+        fails, are simulated one at a time with insert_and_extract_worker.
+
+        Args:
+            settings (list): (index, training) pairs of the mutants to batch
+        """
+        # Get the worker index
+        process_name = multiprocessing.current_process().name
+        print(f"Process name: {process_name}")
+        worker_index = process_name.split("-")[-1]
+
+        # Original instance path
+        original_instance_path = f"{self.root_path}/designs/{self.design_name}"
+        original_instance_path_rtl = f"{original_instance_path}/hw/ip/{self.ip_name}/rtl"
+
+        # Design instance path
+        design_instance = f"{self.design_name}_{worker_index}"
+        design_instance_path = f"{self.root_path}/designs/{design_instance}"
+        design_instance_path_rtl = f"{design_instance_path}/hw/ip/{self.ip_name}/rtl"
+
+        # if the instance path does not exist, create it
+        if not os.path.exists(design_instance_path):
+            print(f"Creating workspace {design_instance_path}")
+            os.system(f"cp -r {original_instance_path} {design_instance_path}")
+            assert os.path.exists(
+                design_instance_path), f"Failed to create workspace {design_instance_path}"
+            print(f"Workspace {design_instance_path} is created successfully")
+
+        # Get path to file for injecting bugs
+        filename = area_config["filename"]
+        instance_filepath = find_full_path(
+            root_path=design_instance_path_rtl, filename=filename)
+        original_filepath = find_full_path(
+            root_path=original_instance_path_rtl, filename=filename)
+
+        # Load the mutants of this batch
+        with open(original_filepath, "r") as f:
+            original_lines = f.readlines()
+        mutants = []
+        for index, training in settings:
+            if training:
+                current_bug_filepath = f"{self.bugdb_path}/{label}/{filename.replace(f'.', f'_{index}.')}"
+            else:
+                current_bug_filepath = f"{self.bugdb_path}/{label}/{filename.replace(f'.', f'_{index}T.')}"
+            if not os.path.exists(current_bug_filepath):
+                print(f"{current_bug_filepath} does not exist. Skipping")
+                continue
+            with open(current_bug_filepath, "r") as f:
+                mutants.append(((index, training), f.readlines()))
+
+        woven_lines, woven_keys, fallback_settings = weave_mutants(
+            original_lines, mutants)
+
+        if woven_lines is not None:
+            print(
+                f"Woven {len(woven_keys)} mutants of {filename} into one build. {len(fallback_settings)} mutants will run separately.")
+            with phase("inject"):
+                with open(instance_filepath, "w") as f:
+                    f.writelines(woven_lines)
+
+            for position, (bug_id, (index, training)) in enumerate(woven_keys):
+                last_job = position == len(woven_keys) - 1 and len(fallback_settings) == 0
+                status = self.insert_and_extract_worker(label, area_config, index, training,
+                                                        extract_signal_list and last_job, bug_id=bug_id)
+                # A broken woven build breaks every bug in it
+                if status in ["compile_error", "syntax_error"]:
+                    print(
+                        f"Woven build of {filename} failed. Running the remaining mutants separately.")
+                    fallback_settings.extend(
+                        [key for _, key in woven_keys[position:]])
+                    break
+
+            # Remove the woven source
+            copy_file(source_file=original_filepath,
+                      target_file=instance_filepath)
+
+        for position, (index, training) in enumerate(fallback_settings):
+            last_job = position == len(fallback_settings) - 1
+            self.insert_and_extract_worker(label, area_config, index, training,
+                                           extract_signal_list and last_job)
 
     def generate_bugs(self, generate_bugs_config: dict):
         num_bugs_per_try = generate_bugs_config["bugs_per_try"]
         num_retries = generate_bugs_config["retry"]
         overwrite = generate_bugs_config["overwrite"]
         clear_bug_inserter_cache = generate_bugs_config["clear_bug_inserter_cache"]
+        # Module partitions are split by the LLM once, then shared across workers and campaigns
+        partition_store = generate_bugs_config["partition_store"] if "partition_store" in generate_bugs_config else False
+        partition_store_dir = generate_bugs_config["partition_store_dir"] if "partition_store_dir" in generate_bugs_config else ""
+        if partition_store:
+            self.partition_store = PartitionStore(partition_store_dir or f"{self.root_path}/.partition_store")
         bugs = generate_bugs_config["bugs"]
 
-        # initialize gpt and bug inserter
-        self.gpt = GPT(model_id="gpt-4o-mini")
-        self.gpt.initialize()
-
+        # Bug generation waits on the LLM, so independent requests run concurrently
+        # and areas can be generated in parallel, within the request limits
+        self.llm_max_concurrency = generate_bugs_config["llm_max_concurrency"] if "llm_max_concurrency" in generate_bugs_config else 4
+        self.llm_requests_per_minute = generate_bugs_config["llm_requests_per_minute"] if "llm_requests_per_minute" in generate_bugs_config else 0
+        area_njobs = generate_bugs_config["area_njobs"] if "area_njobs" in generate_bugs_config else 1
+        self.llm_backend = generate_bugs_config["llm_backend"] if "llm_backend" in generate_bugs_config else "gpt"
+        self.mock_llm_latency = generate_bugs_config["mock_llm_latency"] if "mock_llm_latency" in generate_bugs_config else 0.0
+        self.batch_bugs = generate_bugs_config["batch_bugs"] if "batch_bugs" in generate_bugs_config else False
+
+        # Responses to repeated prompts (module splitting, region labels) are reused across runs
+        llm_cache = generate_bugs_config["llm_cache"] if "llm_cache" in generate_bugs_config else False
+        llm_cache_max_mb = generate_bugs_config["llm_cache_max_mb"] if "llm_cache_max_mb" in generate_bugs_config else 256
+        if llm_cache:
+            self.llm_cache = ResponseCache(f"{self.llm_cache_dir}/responses.db", max_mb=llm_cache_max_mb)
+
+        areas = []
         for label, areas_config in bugs.items():
             # check if the training ranges in the area config overlap, if so, raise an error
             config_bool, config_overlaps = check_config_overlaps(
@@ -845,11 +1274,68 @@ class OpenTitan:
                 exit(1)
 
             for area_config in areas_config:
+                areas.append((label, area_config))
+
+        self.area_njobs = min(area_njobs, len(areas))
+        if self.area_njobs <= 1:
+            # initialize gpt and bug inserter
+            self.init_llm_model()
+            for label, area_config in areas:
                 self.generate_bugs_worker(
                     label, area_config, num_retries, num_bugs_per_try, overwrite, clear_bug_inserter_cache)
+            return
+
+        # The LLM client is created in each worker, it cannot be pickled
+        self.gpt = None
+        worker_pool = NestablePool(self.area_njobs, initializer=init_worker,
+                                   initargs=(self, None))
+        for label, area_config in areas:
+            worker_pool.apply_async(
+                run_worker, ("generate_bugs_worker", label, area_config, num_retries, num_bugs_per_try, overwrite, clear_bug_inserter_cache))
+
+        # Wait for worker to finish
+        worker_pool.close()
+        worker_pool.join()
+
+        # Gather the mutations of every worker in the campaign log
+        self.mutation_logger.merge_worker_logs()
+
+    def init_llm_model(self, requests_per_minute_share: int = 1):
+        """Create the LLM of the bug inserter, with this process' share of the request rate."""
+        if self.llm_backend == "mock":
+            gpt = MockLLM(latency=self.mock_llm_latency)
+        else:
+            gpt = GPT(model_id="gpt-4o-mini", cache=self.llm_cache)
+        gpt.initialize()
+        self.gpt = AsyncLLM(gpt, max_concurrency=self.llm_max_concurrency,
+                            requests_per_minute=self.llm_requests_per_minute / requests_per_minute_share)
 
     def insert_and_extract(self, insert_bugs_config: dict):
-        worker_pool = multiprocessing.Pool(self.njobs)
+        # Ledger of every setting, used to skip completed work when resuming
+        resume = insert_bugs_config["resume"] if "resume" in insert_bugs_config else False
+        retry_failed = insert_bugs_config["retry_failed"] if "retry_failed" in insert_bugs_config else False
+        self.ledger = JobLedger(f"{self.data_path}/job_ledger.db")
+        if not resume:
+            self.ledger.clear()
+
+        # Every phase of every job goes through one scheduler shared by all workers
+        scheduler_config = self.sim_and_extract_config["scheduler"] if "scheduler" in self.sim_and_extract_config else {}
+        extract_config = self.sim_and_extract_config["extract"]
+        extract_cpu_budget = extract_config["extract_cpu_budget"] if "extract_cpu_budget" in extract_config else None
+        scheduler = JobScheduler.from_config(scheduler_config, self.njobs, cpu_budget=extract_cpu_budget)
+
+        # Optionally weave several mutants of the same file into one build
+        batch_config = insert_bugs_config["batch_mutants"] if "batch_mutants" in insert_bugs_config else {}
+        batch_mutants = batch_config["enabled"] if "enabled" in batch_config else False
+        batch_size = batch_config["batch_size"] if "batch_size" in batch_config else 8
+        if batch_mutants and not self.use_build_cache:
+            print("Batching mutants needs split_build_and_run and the build cache. Running mutants separately.")
+            batch_mutants = False
+
+        # Workers may fan out to convert and extract failing seeds in parallel, so
+        # they must be allowed to have children
+        worker_pool = NestablePool(self.njobs, initializer=init_worker,
+                                   initargs=(self, scheduler))
         bugs = insert_bugs_config["bugs"]
         for label, areas_config in bugs.items():
             # check if the training ranges in the area config overlap, if so, raise an error
@@ -877,24 +1363,48 @@ class OpenTitan:
                 print(training_settings)
                 print(testing_settings)
                 combined_settings = training_settings + testing_settings
+
+                # Only schedule the settings that are not complete in the ledger
+                for _, _, index, training in combined_settings:
+                    reruns = area_config["training_reruns"] if training else area_config["testing_reruns"]
+                    self.ledger.register(label, index, training, reruns)
+                num_settings = len(combined_settings)
+                combined_settings = [setting for setting in combined_settings
+                                     if not self.ledger.is_complete(label, setting[2], setting[3], retry_failed)]
+                if resume and len(combined_settings) < num_settings:
+                    print(
+                        f"Resuming {label}: skipping {num_settings - len(combined_settings)} completed settings")
+
                 if len(combined_settings) == 0:
                     print(
                         f"No training or testing ranges found for {label}. Skipping...")
                     continue
                 last_setting = combined_settings[-1]
 
+                if batch_mutants:
+                    # One job per batch of mutants, the last batch extracts the signal list
+                    for start in range(0, len(combined_settings), batch_size):
+                        batch = [(setting[2], setting[3])
+                                 for setting in combined_settings[start:start + batch_size]]
+                        last_batch = start + batch_size >= len(combined_settings)
+                        worker_pool.apply_async(
+                            run_worker, ("insert_and_extract_batch_worker", label, area_config, batch, last_batch))
+                    continue
+
                 # Use apply_async for explicit worker process reset handling
                 for setting in combined_settings:
                     # if this is the last index of the combined ranges, extract the signal list
                     if setting == last_setting:
                         setting = tuple(setting + [True])
                         worker_pool.apply_async(
-                            self.insert_and_extract_worker, setting)
+                            run_worker, ("insert_and_extract_worker",) + setting)
                     else:
                         setting = tuple(setting + [False])
                         worker_pool.apply_async(
-                            self.insert_and_extract_worker, setting)
+                            run_worker, ("insert_and_extract_worker",) + setting)
 
         # Wait for worker to finish
         worker_pool.close()
         worker_pool.join()
+
+        print(f"Job ledger: {self.ledger.summary()}")
@@ -0,0 +1,211 @@
+import os
+import multiprocessing
+from contextlib import contextmanager
+
+# Phases of an insert_and_extract job, in the order they run
+PHASES = ["inject", "compile", "simulate", "convert", "extract"]
+
+
+def available_memory_mb():
+    """Return MemAvailable from /proc/meminfo in MB, or None if it cannot be read."""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class JobScheduler:
+    """
+    Admission control shared by all processes of an insert_and_extract run.
+
+    Every phase of a job (inject, compile, simulate, convert, extract) has its
+    own concurrency limit, so a few long conversions cannot hold the slots that
+    compiles are waiting for. On top of that, phases declare how much memory
+    they expect to use and are only admitted while the sum of reservations
+    fits the memory budget and the host still reports enough free memory.
+
+    The scheduler holds multiprocessing primitives, so it has to reach the
+    workers through the pool initializer (see init_worker), not as a task argument.
+    """
+
+    def __init__(self,
+                 phase_limits: dict = None,
+                 default_limit: int = 1,
+                 memory_budget_mb: float = 0,
+                 phase_memory_mb: dict = None,
+                 phase_memory_factor: dict = None,
+                 poll_interval: float = 1.0
+                 ):
+        phase_limits = phase_limits if phase_limits else {}
+        self.phase_limits = {phase: int(phase_limits[phase]) if phase in phase_limits else default_limit
+                             for phase in PHASES}
+        self.phase_slots = {phase: multiprocessing.BoundedSemaphore(limit)
+                            for phase, limit in self.phase_limits.items()}
+
+        # Fixed memory estimate of each phase, plus a multiple of the size of its input file
+        self.phase_memory_mb = phase_memory_mb if phase_memory_mb else {}
+        self.phase_memory_factor = phase_memory_factor if phase_memory_factor else {}
+
+        # Default to most of the memory available when the run starts
+        if memory_budget_mb <= 0:
+            available = available_memory_mb()
+            memory_budget_mb = available * 0.9 if available else 0
+        self.memory_budget_mb = memory_budget_mb
+        self.reserved_mb = multiprocessing.Value("d", 0.0, lock=False)
+        self.memory_condition = multiprocessing.Condition()
+        self.poll_interval = poll_interval
+
+    @classmethod
+    def from_config(cls, scheduler_config: dict, njobs: int, cpu_budget: int = None):  # type: ignore
+        """
+        Build a scheduler from the "scheduler" section of sim_and_extract. Phases
+        without a limit get njobs slots, which matches the old fixed pool. The
+        convert and extract phases replace the CPU budget shared by the seed
+        conversions (extract.extract_cpu_budget): without a limit of their own,
+        they get cpu_budget slots when it is given.
+        """
+        scheduler_config = scheduler_config if scheduler_config else {}
+        phase_limits = dict(scheduler_config["phase_limits"]) if "phase_limits" in scheduler_config else {}
+        if cpu_budget is not None:
+            for phase_name in ["convert", "extract"]:
+                if phase_name not in phase_limits:
+                    phase_limits[phase_name] = cpu_budget
+        memory_budget_gb = scheduler_config["memory_budget_gb"] if "memory_budget_gb" in scheduler_config else 0
+        phase_memory_gb = scheduler_config["phase_memory_gb"] if "phase_memory_gb" in scheduler_config else {}
+        phase_memory_factor = scheduler_config["phase_memory_factor"] if "phase_memory_factor" in scheduler_config else {}
+
+        return cls(phase_limits=phase_limits,
+                   default_limit=njobs,
+                   memory_budget_mb=memory_budget_gb * 1024,
+                   phase_memory_mb={phase: gb * 1024 for phase, gb in phase_memory_gb.items()},
+                   phase_memory_factor=phase_memory_factor)
+
+    def estimate_memory_mb(self, phase_name: str, input_path: str = None, input_size_mb: float = None):
+        """Estimate from the size of input_path, or from input_size_mb for inputs not on disk yet."""
+        memory_mb = self.phase_memory_mb[phase_name] if phase_name in self.phase_memory_mb else 0
+        if input_size_mb is None and input_path and os.path.exists(input_path):
+            input_size_mb = os.path.getsize(input_path) / (1024 * 1024)
+        if phase_name in self.phase_memory_factor and input_size_mb:
+            memory_mb += self.phase_memory_factor[phase_name] * input_size_mb
+        return memory_mb
+
+    def reserve_memory(self, memory_mb: float):
+        """
+        Block until memory_mb can be reserved. A job is always admitted when
+        nothing else holds a reservation so that oversized jobs still make progress.
+
+        Returns:
+            float: amount reserved, to be passed to release_memory
+        """
+        if memory_mb <= 0 or self.memory_budget_mb <= 0:
+            return 0
+        memory_mb = min(memory_mb, self.memory_budget_mb)
+
+        with self.memory_condition:
+            while True:
+                available = available_memory_mb()
+                fits_budget = self.reserved_mb.value + memory_mb <= self.memory_budget_mb
+                fits_host = available is None or memory_mb <= available
+                if self.reserved_mb.value == 0 or (fits_budget and fits_host):
+                    self.reserved_mb.value += memory_mb
+                    return memory_mb
+                # Wake up periodically since memory can also be freed outside the scheduler
+                self.memory_condition.wait(self.poll_interval)
+
+    def release_memory(self, memory_mb: float):
+        if memory_mb <= 0:
+            return
+        with self.memory_condition:
+            self.reserved_mb.value = max(0.0, self.reserved_mb.value - memory_mb)
+            self.memory_condition.notify_all()
+
+    @contextmanager
+    def phase(self, phase_name: str, input_path: str = None):
+        """Hold a slot of phase_name and its memory reservation for the duration of the block."""
+        with self.combined_phase({phase_name: self.estimate_memory_mb(phase_name, input_path)}):
+            yield
+
+    @contextmanager
+    def combined_phase(self, phase_memory: dict):
+        """
+        Hold phases that run at the same time (e.g. a conversion streaming into
+        the extraction) as one: a slot of each phase, taken in PHASES order, and
+        a single reservation of their summed memory. Reserving each phase in
+        turn would block a job on its own first reservation.
+
+        Args:
+            phase_memory (dict): phase name -> memory estimate in MB
+        """
+        phase_names = sorted(phase_memory, key=PHASES.index)
+        acquired_slots = []
+        try:
+            for phase_name in phase_names:
+                self.phase_slots[phase_name].acquire()
+                acquired_slots.append(self.phase_slots[phase_name])
+            reserved_mb = self.reserve_memory(sum(phase_memory.values()))
+            try:
+                yield
+            finally:
+                self.release_memory(reserved_mb)
+        finally:
+            for slot in reversed(acquired_slots):
+                slot.release()
+
+
+# Workflow object and scheduler installed in each pool worker by init_worker
+_workflow = None
+_scheduler = None
+
+
+def init_worker(workflow, scheduler: JobScheduler):
+    """
+    Pool initializer. The workflow is handed over once per worker instead of
+    being pickled with every task as part of a bound method.
+    """
+    global _workflow, _scheduler
+    _workflow = workflow
+    _scheduler = scheduler
+
+
+def get_workflow():
+    return _workflow
+
+
+def get_scheduler():
+    return _scheduler
+
+
+def run_worker(method_name: str, *args):
+    """Call a method of the workflow installed by init_worker."""
+    return getattr(_workflow, method_name)(*args)
+
+
+@contextmanager
+def phase(phase_name: str, input_path: str = None):
+    """Scheduler phase of the current process, or no limit if no scheduler is installed."""
+    if _scheduler is None:
+        yield
+        return
+    with _scheduler.phase(phase_name, input_path):
+        yield
+
+
+@contextmanager
+def combined_phase(phase_inputs: dict):
+    """
+    Phases of the current process that run at the same time, with a single
+    memory reservation, or no limit if no scheduler is installed.
+
+    Args:
+        phase_inputs (dict): phase name -> size in MB of its input
+    """
+    if _scheduler is None:
+        yield
+        return
+    with _scheduler.combined_phase({phase_name: _scheduler.estimate_memory_mb(phase_name, input_size_mb=input_size_mb)
+                                    for phase_name, input_size_mb in phase_inputs.items()}):
+        yield
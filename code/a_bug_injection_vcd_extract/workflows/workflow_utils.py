@@ -1,4 +1,6 @@
 import os, shutil, subprocess, time
+import multiprocessing
+import multiprocessing.pool
 from pathlib import Path
 from collections import Counter
 from dataclasses import dataclass
@@ -240,4 +242,39 @@ def get_next_available_path(base_path):
         candidate = base_path.with_name(f"{base_stem}_{suffix:02d}{base_path.suffix}")
         if not candidate.exists():
             return str(candidate)
-        suffix += 1
\ No newline at end of file
+        suffix += 1
+
+
+def has_extracted_output(label_path: str, extensions: list) -> bool:
+    """Return True if label_path holds an extracted output file (error.txt is not one)."""
+    if not os.path.isdir(label_path):
+        return False
+    return any(name != "error.txt" and any(name.endswith(extension) for extension in extensions)
+               for name in os.listdir(label_path))
+
+
+class NoDaemonProcess(multiprocessing.Process):
+    """Pool process that is allowed to start child processes of its own."""
+    @property
+    def daemon(self):
+        return False
+
+    @daemon.setter
+    def daemon(self, value):
+        pass
+
+
+class NoDaemonContext(type(multiprocessing.get_context())):
+    Process = NoDaemonProcess
+
+
+class NestablePool(multiprocessing.pool.Pool):
+    """
+    multiprocessing.Pool whose workers are not daemonic, so a worker
+    (e.g. insert_and_extract_worker) can start its own pool to convert
+    and extract several failing seeds at once.
+    """
+    def __init__(self, *args, **kwargs):
+        kwargs["context"] = NoDaemonContext()
+        super().__init__(*args, **kwargs)
+
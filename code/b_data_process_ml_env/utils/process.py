@@ -5,10 +5,12 @@ import pandas as pd
 import numpy as np
 import traceback
 import multiprocessing
+from io import StringIO
 
 from sktime.datatypes import check_raise, convert_to
 
 from b_data_process_ml_env.utils.hdf_store import read_hdf_wideDf, wideDf_to_hdf
+from a_bug_injection_vcd_extract.utils.wave_store import WaveStore, WAVE_STORE_EXTENSION
 
 
 def _make_gen(reader):
@@ -24,6 +26,22 @@ def _rawgencount(filename):
     return sum(buf.count(b'\n') for buf in f_gen)
 
 
+def _count_rows(raw_path):
+    # The wave store keeps its row count in the index
+    if raw_path.endswith(WAVE_STORE_EXTENSION):
+        with WaveStore(raw_path) as store:
+            return store.row_count
+    return _rawgencount(raw_path)
+
+
+def read_wave_store_dataframe(store_path, begin_time=None, end_time=None, signals=None):
+    """Load a .vcw wave store with the same column typing as the .txt output."""
+    with WaveStore(store_path) as store:
+        rows = store.read_rows(begin_time=begin_time,
+                               end_time=end_time, signals=signals)
+    return pd.read_csv(StringIO("\n".join(rows)), delim_whitespace=True, header=None, low_memory=False)
+
+
 def split_given_size(a, size):
     return np.split(a, np.arange(size, len(a), size))
 
@@ -60,10 +78,10 @@ def get_mean_length(raw_data_path, logger=None):
     for folder in raw_folders:
         folder_path = f"{raw_data_path}/{folder}"
         for file in os.listdir(folder_path):
-            if file.endswith('.txt'):
+            if file.endswith('.txt') or file.endswith(WAVE_STORE_EXTENSION):
                 txt_path = os.path.join(folder_path, file)
                 print(f"Processing file: {txt_path}")
-                file_length = _rawgencount(txt_path)
+                file_length = _count_rows(txt_path)
                 total_len += file_length
                 total_files += 1
 
@@ -78,10 +96,10 @@ def get_median_length(raw_data_path, logger=None):
     for folder in raw_folders:
         folder_path = f"{raw_data_path}/{folder}"
         for file in os.listdir(folder_path):
-            if file.endswith('.txt'):
+            if file.endswith('.txt') or file.endswith(WAVE_STORE_EXTENSION):
                 txt_path = os.path.join(folder_path, file)
                 print(f"Processing file: {txt_path}")
-                file_length = _rawgencount(txt_path)
+                file_length = _count_rows(txt_path)
                 lengths.append(file_length)
 
     median_length = np.median(lengths)
@@ -98,7 +116,7 @@ def raw_data_to_rough_data(raw_data_path,
                            ):
 
     raw_folder_path = f"{raw_data_path}/{folder_name}"
-    raw_files = [f for f in os.listdir(raw_folder_path) if f.endswith('.txt')]
+    raw_files = [f for f in os.listdir(raw_folder_path) if f.endswith('.txt') or f.endswith(WAVE_STORE_EXTENSION)]
 
     print("Files to process: " + str(raw_files))
 
@@ -118,20 +136,24 @@ def raw_data_to_rough_data(raw_data_path,
     for file in raw_files:
         txt_path = os.path.join(raw_folder_path, file)
 
-        file_delimiter_line = -1
-        # Go through file to find line with = delimiter
-        with open(txt_path, 'r') as f:
-            for line_num, line in enumerate(f):
-                if '=' in line:
-                    file_delimiter_line = line_num
-                    break
-
-        if file_delimiter_line == -1:
-            raw_dataframe = pd.read_csv(
-                txt_path, delim_whitespace=True, header=None, low_memory=False)
+        if file.endswith(WAVE_STORE_EXTENSION):
+            # Columns are typed over the whole file like the .txt, so read all rows before the tail
+            raw_dataframe = read_wave_store_dataframe(txt_path)
         else:
-            raw_dataframe = pd.read_csv(
-                txt_path, delim_whitespace=True, skiprows=file_delimiter_line+1, header=None, low_memory=False)
+            file_delimiter_line = -1
+            # Go through file to find line with = delimiter
+            with open(txt_path, 'r') as f:
+                for line_num, line in enumerate(f):
+                    if '=' in line:
+                        file_delimiter_line = line_num
+                        break
+
+            if file_delimiter_line == -1:
+                raw_dataframe = pd.read_csv(
+                    txt_path, delim_whitespace=True, header=None, low_memory=False)
+            else:
+                raw_dataframe = pd.read_csv(
+                    txt_path, delim_whitespace=True, skiprows=file_delimiter_line+1, header=None, low_memory=False)
 
         # Keep the last before_failure_timeframe rows
         raw_dataframe = raw_dataframe.tail(before_failure_timeframe)
@@ -175,7 +197,7 @@ def raw_data_to_rough_data(raw_data_path,
 
         # Export to hdf
         wideDf_to_hdf(os.path.join(
-            rough_data_path, file.replace(".txt", "_rough.h5")), raw_dataframe)
+            rough_data_path, f"{os.path.splitext(file)[0]}_rough.h5"), raw_dataframe)
 
 
 def rough_data_to_summarized_data(rough_data_path,
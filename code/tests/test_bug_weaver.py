@@ -0,0 +1,52 @@
+import os
+
+from a_bug_injection_vcd_extract.workflows.bug_weaver import (
+    BUG_ID_DECLARATION, find_module_header_ends, parse_statement, weave_mutants)
+
+AES_CIPHER_CONTROL = os.path.join(
+    os.path.dirname(__file__), "..", "a_bug_injection_vcd_extract", "bugdb",
+    "opentitan", "aes", "ACICON", "aes_cipher_control_81.sv")
+
+
+def read_lines(path):
+    with open(path, "r") as f:
+        return f.readlines()
+
+
+def test_header_end_skips_package_import():
+    # "module aes_cipher_control import aes_pkg::*;" then "#(" on the next line
+    lines = read_lines(AES_CIPHER_CONTROL)
+    header_ends = find_module_header_ends(lines)
+    assert len(header_ends) == 1
+    assert lines[header_ends[0]].strip() == ");"
+    assert any("import aes_pkg::*;" in line for line in lines[:header_ends[0]])
+
+
+def test_header_end_on_one_line():
+    lines = ["module m import a_pkg::*, b_pkg::*; import c_pkg::*; #(parameter int W = 1) (input logic [W-1:0] a);\n",
+             "endmodule\n",
+             "module n;\n",
+             "endmodule\n"]
+    assert find_module_header_ends(lines) == [0, 2]
+
+
+def test_weave_opentitan_mutant():
+    original_lines = read_lines(AES_CIPHER_CONTROL)
+    line_idx = next(i for i, line in enumerate(original_lines)
+                    if parse_statement(line) is not None and parse_statement(line)["assign"] is not None)
+    statement = parse_statement(original_lines[line_idx])
+    mutant_lines = list(original_lines)
+    mutant_lines[line_idx] = f"{statement['indent']}assign {statement['lhs']} = ~({statement['rhs']});\n"
+
+    woven_lines, woven_keys, rejected_keys = weave_mutants(
+        original_lines, [("mutant", mutant_lines)])
+
+    assert woven_keys == [(1, "mutant")] and rejected_keys == []
+    header_end = find_module_header_ends(original_lines)[0]
+    assert original_lines[header_end].strip() == ");"
+    # The selector is declared after the port list, not between the import and "#("
+    assert woven_lines[:header_end + 1] == original_lines[:header_end + 1]
+    declaration = [line.rstrip("\n") for line in woven_lines[header_end + 1:header_end + 1 + len(BUG_ID_DECLARATION)]]
+    assert declaration == BUG_ID_DECLARATION
+    woven_line = woven_lines[line_idx + len(BUG_ID_DECLARATION)]
+    assert f"(bug_id_sel == 1) ? (~({statement['rhs']}))" in woven_line
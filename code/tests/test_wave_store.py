@@ -0,0 +1,16 @@
+from a_bug_injection_vcd_extract.utils.wave_store import WaveStore, write_wave_store
+
+SIGNAL_LIST = ["0 time", "1 tb.dut.a", "2 tb.dut.gen_q[0].b[3:0]"]
+SIGNAL_ACTIVITIES = ["0 0 0000", "10 1 0000", "20 1 0101", "30 0 0101"]
+
+
+def test_read_signals_by_name(tmp_path):
+    # Imported through the a_bug_injection_vcd_extract package, as data processing does
+    store_path = str(tmp_path / "run.vcw")
+    write_wave_store(store_path, SIGNAL_ACTIVITIES, signal_list=SIGNAL_LIST, chunk_rows=2)
+
+    with WaveStore(store_path) as store:
+        assert store.signals == ["time", "tb.dut.a", "tb.dut.gen_q[0].b[3:0]"]
+        rows = store.read_rows(begin_time=10, end_time=20, signals=["tb.dut.gen_q[0].b[3:0]"])
+
+    assert [row.split() for row in rows] == [["10", "0000"], ["20", "0101"]]